@@ -3,6 +3,29 @@ ASGI config for animalesmasquefa project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Perfil de ejecución ASGI. En Heroku solo el proceso ``web`` recibe tráfico
+HTTP, así que este perfil no es un proceso aparte: el comando ``web`` del
+Procfile arranca::
+
+    gunicorn animalesmasquefa.asgi:application -k uvicorn_worker.UvicornWorker
+
+cuando la app tiene ``SERVIDOR_ASGI=True`` en su configuración, y el WSGI de
+siempre en caso contrario. El despliegue previsto son dos apps de Heroku
+con el mismo código y la misma base de datos:
+
+* La actual (WSGI): toda la API, el admin y los estáticos con WhiteNoise.
+* Una segunda app con ``SERVIDOR_ASGI=True`` y su propio dominio, al que el
+  frontend dirige las rutas ``/api/async/...`` (animales, noticias e hilos de
+  comentarios) y los eventos de comentarios. Son vistas asíncronas, así que
+  un worker atiende muchas conexiones lentas a la vez. WhiteNoise solo es
+  síncrono y aquí se desactiva: esta app no sirve los estáticos del admin.
+
+``/api/noticias/<id>/comentarios/eventos/`` (Server-Sent Events) solo
+funciona en la app ASGI. Los eventos se publican en memoria del proceso, así
+que las escrituras de ``/api/comentarios/`` que deban verse en directo tienen
+que llegar a ese mismo proceso: un solo dyno con ``WEB_CONCURRENCY=1`` que
+atienda también esas escrituras (o un enrutado por noticia).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -12,5 +35,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'animalesmasquefa.settings')
+os.environ.setdefault('SERVIDOR_ASGI', 'True')  # Ver MIDDLEWARE en settings.py
 
 application = get_asgi_application()
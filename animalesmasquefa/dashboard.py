@@ -16,9 +16,8 @@ from appmustafa.models import Adopcion, Comentario, Animal, Noticia
 # Modelo interno de Jet para manejar módulos por usuario
 from jet.dashboard.models import UserDashboardModule
 
-# Traducción: activamos el idioma español para el dashboard
+# Traducción: el dashboard se muestra en español (se activa al construirlo, no al importar el módulo)
 from django.utils import translation
-translation.activate('es')
 
 # ------------------ Clase personalizada para el dashboard ------------------
 
@@ -28,7 +27,10 @@ class CustomIndexDashboard(Dashboard):
 
     # Método que se ejecuta al cargar el dashboard con el contexto del usuario
     def init_with_context(self, context):
-        
+
+        # Activamos el idioma español para el dashboard
+        translation.activate('es')
+
         # Obtenemos el usuario que está viendo el dashboard
         user = context['request'].user
 
@@ -197,3 +199,15 @@ class CustomIndexDashboard(Dashboard):
                 ],
             )
         )
+
+        # ------------------ Módulo: Perfiles de rendimiento ------------------
+
+        self.children.append(
+            modules.LinkList(
+                title='🔬 Perfiles de rendimiento',
+                pre_content='<p style="font-size:18px;">Peticiones perfiladas con la cabecera X-Perfilar:</p>',
+                children=[
+                    {'title': 'Ver perfiles guardados', 'url': reverse('perfiles-admin')},
+                ],
+            )
+        )
@@ -65,16 +65,27 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Servir archivos estáticos en producción
+    'appmustafa.middleware.MetricasMiddleware',  # Latencias por vista para /metrics
     'corsheaders.middleware.CorsMiddleware',  # Middleware para CORS
     'django.middleware.security.SecurityMiddleware',
+    'appmustafa.middleware.InstrumentacionSQLMiddleware',  # Cuenta consultas SQL y registra las lentas
+    'appmustafa.middleware.AuditoriaBufferMiddleware',  # Escribe la auditoría de la petición en un solo INSERT
+    'appmustafa.middleware.ReplicaLecturaMiddleware',  # Lecturas del catálogo en las réplicas (si hay)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.middleware.locale.LocaleMiddleware',  # Soporte multilenguaje
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'appmustafa.middleware.PerfiladoMiddleware',  # Perfilado bajo demanda (cabecera X-Perfilar, solo staff)
 ]
 
+# En el perfil ASGI (ver asgi.py) se quita WhiteNoise, que solo es síncrono y obligaría a
+# ejecutar toda la cadena de middlewares en hilos; los estáticos los sirve la app WSGI.
+SERVIDOR_ASGI = os.environ.get('SERVIDOR_ASGI', 'False') == 'True'
+if SERVIDOR_ASGI:
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
 # Modelo de usuario personalizado
 AUTH_USER_MODEL = 'appmustafa.CustomUser'
 
@@ -113,6 +124,7 @@ TEMPLATES = [
 # ----------------------- WSGI -----------------------
 
 WSGI_APPLICATION = 'animalesmasquefa.wsgi.application'
+ASGI_APPLICATION = 'animalesmasquefa.asgi.application'
 
 # ----------------------- Base de datos -----------------------
 
@@ -122,6 +134,82 @@ DATABASES = {
     )  
 }
 
+# Réplicas de solo lectura (opcional), URLs separadas por comas. Las lecturas GET/HEAD de las vistas
+# públicas del catálogo se reparten entre ellas (ver appmustafa/db_router.py y ReplicaLecturaMiddleware).
+# Para probarlo en local basta con otra base SQLite: DATABASE_REPLICA_URLS=sqlite:////tmp/replica.sqlite3
+REPLICAS_BD = []
+for numero, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')), start=1):
+    DATABASES[f'replica_{numero}'] = {**dj_database_url.parse(url.strip()), 'TEST': {'MIRROR': 'default'}}
+    REPLICAS_BD.append(f'replica_{numero}')
+
+if REPLICAS_BD:
+    DATABASE_ROUTERS = ['appmustafa.db_router.RouterReplicas']
+
+REPLICA_ADHERENCIA_SEGUNDOS = int(os.environ.get('REPLICA_ADHERENCIA_SEGUNDOS', '10'))  # Tras escribir, se lee de la primaria
+REPLICA_REINTENTO_SEGUNDOS = int(os.environ.get('REPLICA_REINTENTO_SEGUNDOS', '30'))  # Espera antes de reintentar una réplica caída
+# Dominio de la cookie de adherencia (p. ej. .example.org) para que llegue también a la app ASGI (ver asgi.py)
+REPLICA_COOKIE_DOMINIO = os.environ.get('REPLICA_COOKIE_DOMINIO') or None
+
+# ----------------------- Caché -----------------------
+
+# 'default' (throttling) es local de cada proceso; 'portada' se guarda en disco para que los workers
+# de un mismo dyno compartan el JSON precalculado de api/inicio/ (ver appmustafa/utils/portada.py).
+# Cada escritura solo lo reconstruye en el dyno que la atiende: en los demás (y en la app ASGI)
+# caduca a los PORTADA_TIMEOUT segundos y la siguiente petición lo vuelve a construir.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'portada': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('PORTADA_CACHE_DIR', os.path.join(BASE_DIR, 'cache', 'portada')),
+        'TIMEOUT': int(os.environ.get('PORTADA_TIMEOUT', '60')),
+    },
+}
+PORTADA_TAMANO = int(os.environ.get('PORTADA_TAMANO', '6'))  # Animales y noticias que devuelve api/inicio/
+
+# ----------------------- Eventos de comentarios (SSE) -----------------------
+
+# api/noticias/<id>/comentarios/eventos/ (solo ASGI): cambios de comentarios publicados en memoria del proceso
+EVENTOS_BUFFER = int(os.environ.get('EVENTOS_BUFFER', '200'))  # Eventos por noticia que se guardan para reanudar con Last-Event-ID
+EVENTOS_LATIDO = float(os.environ.get('EVENTOS_LATIDO', '15'))  # Segundos entre comentarios de latido para mantener la conexión
+EVENTOS_REINTENTO_MS = int(os.environ.get('EVENTOS_REINTENTO_MS', '3000'))  # Espera que se indica al cliente antes de reconectar
+
+# ----------------------- Instrumentación SQL -----------------------
+
+# Consultas que tarden más que este umbral se registran en un fichero JSONL rotatorio
+SQL_LENTO_UMBRAL_MS = float(os.environ.get('SQL_LENTO_UMBRAL_MS', '200'))
+SQL_LENTO_LOG = os.environ.get('SQL_LENTO_LOG', os.path.join(BASE_DIR, 'logs', 'sql_lento.jsonl'))
+SQL_LENTO_LOG_MAX_BYTES = int(os.environ.get('SQL_LENTO_LOG_MAX_BYTES', 10 * 1024 * 1024))
+SQL_LENTO_LOG_BACKUPS = int(os.environ.get('SQL_LENTO_LOG_BACKUPS', '5'))
+
+# ----------------------- Métricas (Prometheus) -----------------------
+
+# IPs que pueden leer /metrics sin ser staff (por ejemplo, el servidor de Prometheus)
+METRICAS_IPS_PERMITIDAS = os.environ.get('METRICAS_IPS_PERMITIDAS', '').split(',') if os.environ.get('METRICAS_IPS_PERMITIDAS') else []
+
+# ----------------------- Perfilado bajo demanda -----------------------
+
+# Directorio donde se guardan los perfiles de CPU/memoria y número máximo que se conservan
+PERFILES_DIR = os.environ.get('PERFILES_DIR', os.path.join(BASE_DIR, 'perfiles'))
+PERFILES_MAX = int(os.environ.get('PERFILES_MAX', '50'))
+
+# ----------------------- Esquema OpenAPI -----------------------
+
+# Directorio con el esquema pregenerado (manage.py generar_esquema_api) que sirven /swagger/ y /redoc/
+ESQUEMA_API_DIR = os.environ.get('ESQUEMA_API_DIR', os.path.join(BASE_DIR, 'esquema_api'))
+
+# ----------------------- Retención de auditoría -----------------------
+
+# Las entradas de auditlog más antiguas que este número de días se archivan (manage.py archivar_auditoria)
+AUDITORIA_RETENCION_DIAS = int(os.environ.get('AUDITORIA_RETENCION_DIAS', '365'))
+AUDITORIA_ARCHIVO_DIR = os.environ.get('AUDITORIA_ARCHIVO_DIR', os.path.join(BASE_DIR, 'archivo_auditoria'))
+
+# ----------------------- Admin -----------------------
+
+# A partir de este número de filas, los listados del admin sin filtros usan el conteo estimado de PostgreSQL
+ADMIN_CONTEO_ESTIMADO_DESDE = int(os.environ.get('ADMIN_CONTEO_ESTIMADO_DESDE', '100000'))
+
 # ----------------------- Django REST Framework -----------------------
 
 REST_FRAMEWORK = {
@@ -139,6 +227,10 @@ REST_FRAMEWORK = {
     }
 }
 
+# Listados de animales, noticias y adopciones construidos desde values() sin instanciar modelos
+# (ver appmustafa/serializacion_rapida.py); el JSON es idéntico al de los serializers
+SERIALIZACION_RAPIDA = os.environ.get('SERIALIZACION_RAPIDA', 'False') == 'True'
+
 # ----------------------- JWT -----------------------
 
 SIMPLE_JWT = {
@@ -209,9 +301,50 @@ CLOUDINARY_STORAGE = {
 
 CLOUDINARY_BASE_URL = "https://res.cloudinary.com/dznk2nvh5/image/upload/"
 
+# ----------------------- Subidas de archivos -----------------------
+
+# Ningún fichero puede superar SUBIDA_MAX_BYTES: se descarta mientras se recibe (LimiteSubidaHandler)
+SUBIDA_MAX_BYTES = int(os.environ.get('SUBIDA_MAX_BYTES', 20 * 1024 * 1024))
+ADOPCION_PDF_MAX_BYTES = int(os.environ.get('ADOPCION_PDF_MAX_BYTES', 10 * 1024 * 1024))
+
+FILE_UPLOAD_HANDLERS = [
+    'appmustafa.utils.subidas.LimiteSubidaHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Subidas directas (api/subidas/): 'cloudinary' o 'local' (PUT a este mismo servidor, solo para desarrollo)
+SUBIDA_DIRECTA_BACKEND = os.environ.get('SUBIDA_DIRECTA_BACKEND', 'cloudinary')
+SUBIDA_DIRECTA_VALIDEZ = int(os.environ.get('SUBIDA_DIRECTA_VALIDEZ', '900'))  # Segundos que vale una autorización
+
+# ----------------------- Normalización de imágenes -----------------------
+
+# Las fotos de animales, noticias y perfiles se giran según su EXIF, se reducen y se recodifican antes de subirlas
+IMAGENES_NORMALIZAR = os.environ.get('IMAGENES_NORMALIZAR', 'True') == 'True'
+IMAGENES_LADO_MAXIMO = int(os.environ.get('IMAGENES_LADO_MAXIMO', '1600'))  # Píxeles del lado mayor
+IMAGENES_FORMATO = os.environ.get('IMAGENES_FORMATO', 'WEBP')  # WEBP o JPEG
+IMAGENES_CALIDAD = int(os.environ.get('IMAGENES_CALIDAD', '82'))
+IMAGENES_PROCESOS = int(os.environ.get('IMAGENES_PROCESOS', '2'))  # Procesos del pool por worker
+IMAGENES_TIMEOUT = float(os.environ.get('IMAGENES_TIMEOUT', '10'))  # Segundos; si se supera se sube el original
+
+# ----------------------- Importación de animales (admin) -----------------------
+
+# CSV con nombre, fecha_nacimiento, situacion e imagen, más un ZIP con las fotos (ver appmustafa/utils/importacion.py)
+IMPORTACION_MAX_FILAS = int(os.environ.get('IMPORTACION_MAX_FILAS', '500'))
+IMPORTACION_ZIP_MAX_BYTES = int(os.environ.get('IMPORTACION_ZIP_MAX_BYTES', 200 * 1024 * 1024))  # Sustituye a SUBIDA_MAX_BYTES en esa vista
+IMPORTACION_SUBIDAS_CONCURRENTES = int(os.environ.get('IMPORTACION_SUBIDAS_CONCURRENTES', '4'))  # Fotos que se suben a la vez
+# Subidas y alta en un hilo, fuera de la petición del admin (timeout de 30 s de gunicorn y del router de Heroku)
+IMPORTACION_EN_SEGUNDO_PLANO = os.environ.get('IMPORTACION_EN_SEGUNDO_PLANO', 'True') == 'True'
+
+# ----------------------- Bajas de cuentas -----------------------
+
+# api/usuarios/eliminar/ desactiva la cuenta en el acto y borra sus datos en un hilo aparte (ver utils/bajas.py);
+# las que no terminen las recoge el comando procesar_bajas
+BAJAS_EN_SEGUNDO_PLANO = os.environ.get('BAJAS_EN_SEGUNDO_PLANO', 'True') == 'True'
+BAJAS_LOTE = int(os.environ.get('BAJAS_LOTE', '500'))  # Filas por DELETE
+
 # ----------------------- Correo electrónico -----------------------
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'  
 EMAIL_HOST = os.environ.get('EMAIL_HOST')  
 EMAIL_PORT = int(os.environ.get('EMAIL_PORT'))  
 EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS')
@@ -219,6 +352,17 @@ EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.environ.get('EMAIL_HOST_USER')
 
+# Backend con conexiones SMTP reutilizadas y circuit breaker (appmustafa/utils/smtp.py): si el servidor
+# falla, el correo se guarda en la bandeja de salida y se reenvía al recuperarse (o con enviar_bandeja_salida)
+EMAIL_BACKEND = 'appmustafa.utils.smtp.SMTPPoolBackend'
+EMAIL_TIMEOUT = float(os.environ.get('EMAIL_TIMEOUT', '5'))  # Segundos máximos por operación SMTP
+EMAIL_POOL_MAX = int(os.environ.get('EMAIL_POOL_MAX', '2'))  # Conexiones abiertas que conserva cada proceso
+EMAIL_POOL_INACTIVIDAD = int(os.environ.get('EMAIL_POOL_INACTIVIDAD', '240'))  # Se cierran tras estos segundos sin uso
+EMAIL_POOL_COMPROBAR = int(os.environ.get('EMAIL_POOL_COMPROBAR', '30'))  # NOOP antes de reutilizar si llevan más sin uso
+EMAIL_CIRCUITO_FALLOS = int(os.environ.get('EMAIL_CIRCUITO_FALLOS', '3'))  # Fallos seguidos que abren el circuito
+EMAIL_CIRCUITO_ESPERA = int(os.environ.get('EMAIL_CIRCUITO_ESPERA', '60'))  # Segundos con el circuito abierto antes de reintentar
+EMAIL_BANDEJA_SALIDA_DIR = os.environ.get('EMAIL_BANDEJA_SALIDA_DIR', os.path.join(BASE_DIR, 'bandeja_salida'))
+
 print(EMAIL_HOST_PASSWORD)
 # ----------------------- Archivos estáticos en producción -----------------------
 
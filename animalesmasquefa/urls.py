@@ -10,11 +10,14 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 from rest_framework.permissions import IsAdminUser
 from django.shortcuts import redirect
+from django.http import FileResponse
 from django.contrib.auth.decorators import user_passes_test
+from functools import lru_cache
+from appmustafa.views import MetricasView
+from appmustafa.admin import perfiles_view, descargar_perfil_view
+from appmustafa.utils.esquema_api import FORMATOS_ESQUEMA, info_api, ruta_esquema
 
 
 def admin_required(view_func):
@@ -26,19 +29,39 @@ def admin_required(view_func):
     return decorated_view_func
 
 
-schema_view = get_schema_view(
-   openapi.Info(
-      title="API AnimalesMasquefa",
-      default_version='v1',
-      description="Solo para admins 👑",
-      contact=openapi.Contact(email="admin@masquefa.com"),
-      license=openapi.License(name="MIT"),
-   ),
-   public=True,
-   permission_classes=(permissions.AllowAny,),  # lo controlamos con decorador
-)
+# La maquinaria de drf_yasg es pesada: se importa y construye en la primera visita a la documentación
+@lru_cache(maxsize=None)
+def get_schema_ui_view(renderer):
+    from drf_yasg.views import get_schema_view
+
+    schema_view = get_schema_view(
+       info_api(),
+       public=True,
+       permission_classes=(permissions.AllowAny,),  # lo controlamos con decorador
+    )
+    return schema_view.with_ui(renderer, cache_timeout=0)
+
+
+# El esquema (?format=openapi, json o yaml) se sirve desde el fichero pregenerado con
+# manage.py generar_esquema_api; solo se introspecciona la API en vivo con ?regenerar=1
+# o si el fichero todavía no existe.
+def schema_ui_view(renderer):
+    def view(request, *args, **kwargs):
+        formato = FORMATOS_ESQUEMA.get(request.GET.get('format'))
+        if formato and not request.GET.get('regenerar'):
+            extension, content_type = formato
+            ruta = ruta_esquema(extension)
+            if ruta.is_file():
+                return FileResponse(open(ruta, 'rb'), content_type=content_type)
+        return get_schema_ui_view(renderer)(request, *args, **kwargs)
+    return view
+
 
 urlpatterns = [
+    # Perfiles de rendimiento guardados bajo demanda (dentro del admin, solo staff)
+    path('admin/perfiles/', admin.site.admin_view(perfiles_view), name='perfiles-admin'),
+    path('admin/perfiles/<str:nombre>', admin.site.admin_view(descargar_perfil_view), name='perfiles-admin-fichero'),
+
     # Ruta al panel de administración de Django
     path('admin/', admin.site.urls),
 
@@ -52,10 +75,13 @@ urlpatterns = [
     path('api/', include('appmustafa.urls')),
     
     # Swagger solo visible para admins
-    path('swagger/', admin_required(schema_view.with_ui('swagger', cache_timeout=0)), name='schema-swagger-ui'),
+    path('swagger/', admin_required(schema_ui_view('swagger')), name='schema-swagger-ui'),
 
     # Opcional: también Redoc
-    path('redoc/', admin_required(schema_view.with_ui('redoc', cache_timeout=0)), name='schema-redoc'),
+    path('redoc/', admin_required(schema_ui_view('redoc')), name='schema-redoc'),
+
+    # Métricas de Prometheus (solo staff o IPs permitidas)
+    path('metrics', MetricasView.as_view(), name='metricas'),
     
 ]
 
@@ -6,13 +6,151 @@ from .models import CustomUser  # Modelo de usuario personalizado
 from django import forms
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
+from django.contrib import messages
+from django.core.exceptions import PermissionDenied
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http import FileResponse, Http404
+from django.shortcuts import redirect, render
+from django.urls import path
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from cloudinary.exceptions import Error as ErrorCloudinary
+from .utils.exportacion import FORMATOS_EXPORTACION, respuesta_exportacion
+from .utils.importacion import COLUMNAS, ImportacionNoValida, importar_animales, lanzar_importacion, validar_importacion
+from .utils.paginacion import PaginadorEstimado
+from .utils.perfilado import listar_perfiles, ruta_fichero_perfil
+from .utils.subidas import LimiteSubidaHandler
 
 # Define la URL del sitio visible en el panel de administración (por ejemplo, para redirigir al frontend)
 admin.site.site_url = getattr(settings, 'FRONTEND_URL', '/')
 
+
+# Acciones del admin que exportan en streaming (CSV o JSONL) los registros seleccionados
+def accion_exportar(recurso, formato):
+    def exportar(modeladmin, request, queryset):
+        return respuesta_exportacion(recurso, formato, queryset)
+    exportar.short_description = f"Exportar seleccionados a {formato.upper()}"
+    exportar.__name__ = f'exportar_{formato}'
+    return exportar
+
+
+def acciones_exportar(recurso):
+    return [accion_exportar(recurso, formato) for formato in FORMATOS_EXPORTACION]
+
+
+# Opciones comunes para los listados de tablas que pueden crecer mucho
+class ListadoGrandeMixin:
+    paginator = PaginadorEstimado
+    show_full_result_count = False  # Evita un segundo COUNT(*) de toda la tabla al filtrar
+    list_per_page = 50
+
+
+class CustomUserAdmin(ListadoGrandeMixin, UserAdmin):  # Usa la interfaz estándar de Django para usuarios
+    list_filter = ('is_staff', 'is_active', 'recibir_novedades', 'frecuencia_novedades')
+    actions = acciones_exportar('usuarios')
+
+
+class ImportarAnimalesForm(forms.Form):
+    csv = forms.FileField(label="CSV de animales")
+    fotos = forms.FileField(label="ZIP de fotos", required=False)
+
+
+class AnimalAdmin(admin.ModelAdmin):
+    change_list_template = 'admin/appmustafa/animal/change_list.html'  # Añade el botón "Importar"
+
+    def get_urls(self):
+        @csrf_exempt
+        def importar(request):
+            # Antes de leer el cuerpo: el ZIP de fotos tiene su propio límite, mayor que SUBIDA_MAX_BYTES
+            request.upload_handlers = [
+                LimiteSubidaHandler(request, limite=settings.IMPORTACION_ZIP_MAX_BYTES),
+                TemporaryFileUploadHandler(request),
+            ]
+            return csrf_protect(self.importar_view)(request)
+
+        return [
+            path('importar/', self.admin_site.admin_view(importar), name='appmustafa_animal_importar'),
+        ] + super().get_urls()
+
+    # Alta masiva: se valida todo el CSV y el ZIP antes de crear nada
+    def importar_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        errores = []
+        form = ImportarAnimalesForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            zip_ = None
+            try:
+                filas, zip_ = validar_importacion(form.cleaned_data['csv'], form.cleaned_data['fotos'])
+                if settings.IMPORTACION_EN_SEGUNDO_PLANO:
+                    # Las subidas no caben en el timeout de la petición: se avisa por correo al terminar
+                    lanzar_importacion(filas, form.cleaned_data['fotos'], request.user)
+                    mensaje = f"Importando {len(filas)} animales en segundo plano; recibirás un correo al terminar."
+                else:
+                    mensaje = f"Se han importado {len(importar_animales(filas, zip_))} animales."
+            except ImportacionNoValida as error:
+                errores = error.errores
+            except ErrorCloudinary as error:
+                errores = [f"No se pudieron subir las fotos: {error}"]
+            else:
+                self.message_user(request, mensaje, messages.SUCCESS)
+                return redirect('admin:appmustafa_animal_changelist')
+            finally:
+                if zip_ is not None:
+                    zip_.close()
+
+        return render(request, 'admin/importar_animales.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Importar animales',
+            'opts': self.model._meta,
+            'form': form,
+            'errores': errores,
+            'columnas': COLUMNAS,
+        })
+
+
+class ComentarioAdmin(ListadoGrandeMixin, admin.ModelAdmin):
+    list_display = ('id', 'usuario', 'noticia', 'resumen', 'fecha_hora')
+    list_select_related = ('usuario', 'noticia')  # __str__ usa usuario.username
+    list_filter = ('fecha_hora',)
+    search_fields = ('=usuario__username', '^noticia__titulo')
+    ordering = ('-fecha_hora',)
+    raw_id_fields = ('noticia', 'usuario', 'parent')  # Sin <select> con todos los registros en el formulario
+    actions = acciones_exportar('comentarios')
+
+    @admin.display(description='Contenido')
+    def resumen(self, obj):
+        return obj.contenido[:60]
+
+
+class AdopcionAdmin(ListadoGrandeMixin, admin.ModelAdmin):
+    list_display = ('id', 'animal', 'usuario', 'aceptada', 'fecha_hora')
+    list_select_related = ('animal', 'usuario')  # __str__ usa animal.nombre y usuario.username
+    list_filter = ('aceptada', 'fecha_hora')
+    search_fields = ('=usuario__username', '^animal__nombre')
+    ordering = ('-fecha_hora',)
+    raw_id_fields = ('animal', 'usuario')
+    actions = acciones_exportar('adopciones')
+
+
 # Registro de modelos en el panel de administración
-admin.site.register(CustomUser, UserAdmin)  # Usa la interfaz estándar de Django para usuarios
-admin.site.register(Animal)
+admin.site.register(CustomUser, CustomUserAdmin)
+admin.site.register(Animal, AnimalAdmin)
 admin.site.register(Noticia)
-admin.site.register(Comentario)
-admin.site.register(Adopcion)
+admin.site.register(Comentario, ComentarioAdmin)
+admin.site.register(Adopcion, AdopcionAdmin)
+
+
+# Vistas del admin para consultar los perfiles de rendimiento guardados por PerfiladoMiddleware
+def perfiles_view(request):
+    return render(request, 'admin/perfiles.html', {
+        **admin.site.each_context(request),
+        'title': 'Perfiles de rendimiento',
+        'perfiles': listar_perfiles(),
+    })
+
+
+def descargar_perfil_view(request, nombre):
+    ruta = ruta_fichero_perfil(nombre)
+    if ruta is None:
+        raise Http404("Perfil no encontrado.")
+    return FileResponse(open(ruta, 'rb'), as_attachment=ruta.suffix == '.prof', filename=nombre)
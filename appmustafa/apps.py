@@ -19,3 +19,11 @@ class AppmustafaConfig(AppConfig):
 
         # Ejecuta el registro de modelos para que los cambios queden auditados automáticamente
         register_auditlog_models()
+
+        # Dentro de una petición, las entradas de auditoría se escriben juntas al final (ver AuditoriaBufferMiddleware)
+        from .audit import instalar_buffer_auditoria
+        instalar_buffer_auditoria()
+
+        # Mide las llamadas a Cloudinary (subidas y borrados) para las métricas de Prometheus
+        from .utils.metricas import instrumentar_cloudinary
+        instrumentar_cloudinary()
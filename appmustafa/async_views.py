@@ -0,0 +1,138 @@
+# Vistas asíncronas de solo lectura para el tráfico público (perfil ASGI, ver animalesmasquefa/asgi.py).
+# Devuelven exactamente el mismo JSON que las acciones list/retrieve de los ViewSets, pero consultan
+# con el ORM asíncrono para que un solo proceso atienda muchas conexiones lentas a la vez.
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_safe
+from rest_framework import status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.renderers import JSONRenderer
+
+from .db_router import lectura_en_replica
+from .models import Animal, Comentario, Noticia
+from .serializers import AnimalSerializer, ComentarioSerializer, NoticiaSerializer, agrupar_respuestas
+from .utils.eventos import canal_comentarios
+from .utils.portada import CLAVE as CLAVE_PORTADA, portada_json
+
+
+# Renderiza igual que el JSONRenderer por defecto de DRF
+def respuesta_json(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status_code)
+
+
+def no_encontrado():
+    return respuesta_json({'detail': NotFound.default_detail}, status.HTTP_404_NOT_FOUND)
+
+
+# Listado de animales (mismo orden que AnimalViewSet)
+@lectura_en_replica
+@require_safe
+async def animales_list(request):
+    animales = [animal async for animal in Animal.objects.all().order_by('-fecha_nacimiento')]
+    return respuesta_json(AnimalSerializer(animales, many=True, context={'request': request}).data)
+
+
+# Detalle de un animal
+@lectura_en_replica
+@require_safe
+async def animales_detail(request, pk):
+    animal = await Animal.objects.filter(pk=pk).afirst()
+    if animal is None:
+        return no_encontrado()
+    return respuesta_json(AnimalSerializer(animal, context={'request': request}).data)
+
+
+# Listado de noticias (mismo orden que NoticiaViewSet)
+@lectura_en_replica
+@require_safe
+async def noticias_list(request):
+    noticias = [noticia async for noticia in Noticia.objects.all().order_by('-fecha_publicacion')]
+    return respuesta_json(NoticiaSerializer(noticias, many=True, context={'request': request}).data)
+
+
+# Detalle de una noticia
+@lectura_en_replica
+@require_safe
+async def noticias_detail(request, pk):
+    noticia = await Noticia.objects.filter(pk=pk).afirst()
+    if noticia is None:
+        return no_encontrado()
+    return respuesta_json(NoticiaSerializer(noticia, context={'request': request}).data)
+
+
+# Hilo de comentarios de una noticia (equivalente a GET /api/comentarios/?noticia=<id>).
+# Se carga el hilo entero en una sola consulta y las respuestas se anidan en memoria.
+@lectura_en_replica
+@require_safe
+async def comentarios_noticia(request):
+    noticia_id = request.GET.get('noticia')
+    if not noticia_id or not noticia_id.isdigit():
+        return respuesta_json({'noticia': [ValidationError.default_detail]}, status.HTTP_400_BAD_REQUEST)
+
+    comentarios = [
+        comentario async for comentario in
+        Comentario.objects.filter(noticia_id=noticia_id)
+        .select_related('usuario', 'noticia', 'parent')
+        .order_by('-fecha_hora')
+    ]
+    context = {'request': request, 'respuestas_por_padre': agrupar_respuestas(comentarios)}
+    return respuesta_json(ComentarioSerializer(comentarios, many=True, context=context).data)
+
+
+# Portada: últimos animales disponibles y últimas noticias. El JSON se precalcula al cambiar
+# animales, noticias o adopciones (ver utils/portada.py), así que normalmente no se consulta la base de datos.
+# Sin lectura_en_replica: si hay que construirlo se lee de la primaria.
+@require_safe
+async def inicio(request):
+    contenido = await caches['portada'].aget(CLAVE_PORTADA)
+    if contenido is None:
+        contenido = await sync_to_async(portada_json)()
+    return HttpResponse(contenido, content_type='application/json')
+
+
+# Cambios de los comentarios de una noticia como Server-Sent Events (eventos creado, editado y eliminado).
+# Al reconectar, el navegador envía Last-Event-ID (o ?ultimo_id=) y recibe lo que se perdió; si ya no está
+# en el buffer se envía un evento "recargar" para que vuelva a pedir el hilo completo.
+@lectura_en_replica
+@require_safe
+async def comentarios_eventos(request, pk):
+    if not isinstance(request, ASGIRequest):
+        # En WSGI una respuesta infinita ocuparía un worker entero
+        return respuesta_json(
+            {'detail': "Los eventos de comentarios solo están disponibles en el perfil ASGI."},
+            status.HTTP_501_NOT_IMPLEMENTED,
+        )
+    if not await Noticia.objects.filter(pk=pk).aexists():
+        return no_encontrado()
+
+    ultimo_id = request.headers.get('Last-Event-ID') or request.GET.get('ultimo_id')
+    ultimo_id = int(ultimo_id) if ultimo_id and ultimo_id.isdigit() else None
+    response = StreamingHttpResponse(flujo_eventos(pk, ultimo_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Que el proxy no acumule los eventos
+    return response
+
+
+async def flujo_eventos(noticia_id, ultimo_id):
+    suscripcion, pendientes, recargar = canal_comentarios.suscribir(noticia_id, ultimo_id)
+    try:
+        yield f'retry: {settings.EVENTOS_REINTENTO_MS}\n\n'
+        if recargar is not None:
+            yield f'id: {recargar}\nevent: recargar\ndata: {{}}\n\n'
+        for evento in pendientes:
+            yield evento.formatear()
+        while True:
+            try:
+                evento = await asyncio.wait_for(suscripcion.cola.get(), timeout=settings.EVENTOS_LATIDO)
+            except asyncio.TimeoutError:
+                yield ': latido\n\n'
+                continue
+            yield evento.formatear()
+    finally:
+        # También al cancelarse la respuesta cuando el cliente se desconecta
+        canal_comentarios.cancelar(noticia_id, suscripcion)
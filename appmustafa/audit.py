@@ -1,6 +1,14 @@
 # appmustafa/audit.py
 
+import functools
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from django.db import router, transaction
+from django.db.models.signals import pre_save
+
 # Importa el objeto 'auditlog' que permite registrar modelos para auditoría
+from auditlog.models import LogEntry
 from auditlog.registry import auditlog
 
 # Importa los modelos de la aplicación que se desean auditar
@@ -10,6 +18,100 @@ from .models import Animal, Noticia, Comentario, Adopcion, CustomUser
 def register_auditlog_models():
     auditlog.register(Animal, exclude_fields=['imagen'])
     auditlog.register(Noticia, exclude_fields=['imagen'])
-    auditlog.register(Comentario)
+    # root, depth y path se derivan de parent
+    auditlog.register(Comentario, exclude_fields=['root', 'depth', 'path'])
     auditlog.register(Adopcion, exclude_fields=['contenido'])
-    auditlog.register(CustomUser, exclude_fields=['foto_perfil'])
\ No newline at end of file
+    # last_login cambia en cada inicio de sesión en el admin y la marca del resumen en cada envío: no aportan nada a la auditoría
+    auditlog.register(CustomUser, exclude_fields=['foto_perfil', 'last_login', 'resumen_ultimo_evento', 'resumen_enviado_en'])
+
+
+# ----------------------- Escritura en buffer -----------------------
+
+# Buffer de la petición en curso (None fuera de auditoria_en_buffer: se escribe al momento)
+_buffer_actual = ContextVar('buffer_auditoria', default=None)
+
+
+class BufferAuditoria:
+    """
+    Acumula las entradas de auditoría de una petición y las escribe con un solo
+    ``bulk_create``. Cada entrada se añade con ``on_commit``: si la transacción
+    en la que se hizo el cambio se deshace, su entrada se descarta igual que
+    ocurría con el INSERT síncrono de auditlog.
+    """
+
+    def __init__(self):
+        self.entradas = []
+
+    def anadir(self, entrada, using):
+        transaction.on_commit(lambda: self.entradas.append(entrada), using=using)
+
+    def volcar(self):
+        entradas, self.entradas = self.entradas, []
+        if entradas:
+            LogEntry.objects.bulk_create(entradas)
+
+    async def avolcar(self):
+        entradas, self.entradas = self.entradas, []
+        if entradas:
+            await LogEntry.objects.abulk_create(entradas)
+
+
+@contextmanager
+def auditoria_en_buffer():
+    """
+    Mientras dura el bloque, las entradas de auditlog se acumulan en memoria y
+    se escriben juntas al salir. Si ya hay un buffer activo se reutiliza.
+    """
+    if _buffer_actual.get() is not None:
+        yield _buffer_actual.get()
+        return
+
+    buffer = BufferAuditoria()
+    token = _buffer_actual.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _buffer_actual.reset(token)
+        buffer.volcar()
+
+
+# Versión asíncrona de auditoria_en_buffer para el perfil ASGI
+@asynccontextmanager
+async def aauditoria_en_buffer():
+    if _buffer_actual.get() is not None:
+        yield _buffer_actual.get()
+        return
+
+    buffer = BufferAuditoria()
+    token = _buffer_actual.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _buffer_actual.reset(token)
+        await buffer.avolcar()
+
+
+def instalar_buffer_auditoria():
+    """
+    Envuelve ``LogEntry.objects.create``, que es donde auditlog guarda cada
+    entrada, para que dentro de :func:`auditoria_en_buffer` la entrada se
+    prepare en memoria en lugar de insertarse. Es idempotente.
+    """
+    original = LogEntry.objects.create
+    if getattr(original, 'en_buffer', False):
+        return
+
+    @functools.wraps(original)
+    def create(**kwargs):
+        buffer = _buffer_actual.get()
+        if buffer is None:
+            return original(**kwargs)
+        entrada = LogEntry(**kwargs)
+        using = router.db_for_write(LogEntry, instance=entrada)
+        # bulk_create no envía pre_save: se lanza aquí para que set_actor (actor, IP) siga funcionando
+        pre_save.send(sender=LogEntry, instance=entrada, raw=False, using=using, update_fields=None)
+        buffer.anadir(entrada, using)
+        return entrada
+
+    create.en_buffer = True
+    LogEntry.objects.create = create
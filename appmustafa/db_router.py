@@ -0,0 +1,90 @@
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# Réplica elegida para las lecturas de la petición en curso (None: todo va a la primaria)
+_replica_actual = ContextVar('replica_lectura', default=None)
+
+# Réplicas que fallaron y hasta cuándo (time.monotonic) no se vuelven a intentar
+_caidas = {}
+_lock_caidas = threading.Lock()
+
+
+def lectura_en_replica(vista):
+    """Marca una vista de función cuyas lecturas GET/HEAD pueden ir a una réplica."""
+    vista.usar_replica = True
+    return vista
+
+
+def marcar_caida(alias):
+    with _lock_caidas:
+        _caidas[alias] = time.monotonic() + settings.REPLICA_REINTENTO_SEGUNDOS
+
+
+def replica_disponible(alias):
+    """
+    Comprueba que se puede conectar con la réplica. Si falla, queda marcada
+    como caída durante ``REPLICA_REINTENTO_SEGUNDOS`` y no se vuelve a probar
+    hasta entonces.
+    """
+    with _lock_caidas:
+        if _caidas.get(alias, 0) > time.monotonic():
+            return False
+        _caidas.pop(alias, None)
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError:
+        logger.warning("Réplica %s no disponible; las lecturas van a la primaria", alias)
+        marcar_caida(alias)
+        return False
+    return True
+
+
+def elegir_replica():
+    """Una réplica disponible al azar, o None si no hay ninguna."""
+    replicas = list(settings.REPLICAS_BD)
+    random.shuffle(replicas)
+    for alias in replicas:
+        if replica_disponible(alias):
+            return alias
+    return None
+
+
+def activar_replica(alias):
+    _replica_actual.set(alias)
+
+
+def desactivar_replica():
+    _replica_actual.set(None)
+
+
+class RouterReplicas:
+    """
+    Envía las lecturas a la réplica elegida por ``ReplicaLecturaMiddleware``
+    para la petición en curso; el resto de lecturas y todas las escrituras
+    van a la primaria. Dentro de una transacción de la primaria también se
+    lee de la primaria, para ver lo que se acaba de escribir.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _replica_actual.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplicas y primaria tienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,86 @@
+# appmustafa/management/commands/archivar_auditoria.py
+
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from auditlog.models import LogEntry
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Archiva en ficheros JSONL comprimidos las entradas de auditoría más antiguas que la "
+        "retención y después las borra en lotes pequeños"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.AUDITORIA_RETENCION_DIAS, help="Antigüedad mínima en días de las entradas a archivar")
+        parser.add_argument('--directorio', default=settings.AUDITORIA_ARCHIVO_DIR, help="Directorio donde se escriben los .jsonl.gz")
+        parser.add_argument('--lote', type=int, default=2000, help="Entradas leídas por consulta al archivar")
+        parser.add_argument('--lote-borrado', type=int, default=500, help="Entradas borradas por DELETE")
+        parser.add_argument('--pausa', type=float, default=0.05, help="Segundos de espera entre DELETE para no acaparar la base de datos")
+        parser.add_argument('--sin-borrar', action='store_true', help="Solo archiva; no borra las entradas")
+
+    def handle(self, *args, **options):
+        if options['dias'] < 1 or options['lote'] < 1 or options['lote_borrado'] < 1:
+            raise CommandError("--dias, --lote y --lote-borrado deben ser al menos 1.")
+
+        corte = timezone.now() - timedelta(days=options['dias'])
+        antiguas = LogEntry.objects.filter(timestamp__lt=corte)
+
+        directorio = Path(options['directorio'])
+        directorio.mkdir(parents=True, exist_ok=True)
+        destino = directorio / f"auditoria-hasta-{corte:%Y%m%d}-{timezone.now():%Y%m%d%H%M%S}.jsonl.gz"
+
+        archivadas, ultimo_pk = self.archivar(antiguas, destino, options['lote'])
+        if not archivadas:
+            self.stdout.write(self.style.SUCCESS(f"✅ No hay entradas anteriores a {corte:%Y-%m-%d}"))
+            return
+        self.stdout.write(self.style.SUCCESS(f"📦 {archivadas} entradas archivadas en {destino}"))
+
+        if options['sin_borrar']:
+            return
+
+        # Solo se borra lo que ya está en el fichero: hasta el último pk archivado
+        borradas = self.borrar(antiguas.filter(pk__lte=ultimo_pk), options['lote_borrado'], options['pausa'])
+        self.stdout.write(self.style.SUCCESS(f"🗑️  {borradas} entradas borradas"))
+
+    # Recorre las entradas por pk (keyset) en bloques y las escribe línea a línea en el gzip
+    def archivar(self, antiguas, destino, lote):
+        campos = [campo.attname for campo in LogEntry._meta.concrete_fields]
+        temporal = destino.with_name(destino.name + '.tmp')
+        archivadas = 0
+        ultimo_pk = 0
+
+        with gzip.open(temporal, 'wt', encoding='utf-8') as fichero:
+            while True:
+                bloque = list(antiguas.filter(pk__gt=ultimo_pk).order_by('pk').values(*campos)[:lote])
+                if not bloque:
+                    break
+                for fila in bloque:
+                    fichero.write(json.dumps(fila, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+                archivadas += len(bloque)
+                ultimo_pk = bloque[-1]['id']
+
+        if archivadas:
+            # El fichero solo aparece con su nombre final cuando está completo
+            os.replace(temporal, destino)
+        else:
+            temporal.unlink()
+        return archivadas, ultimo_pk
+
+    def borrar(self, archivadas, lote, pausa):
+        borradas = 0
+        while True:
+            pks = list(archivadas.order_by('pk').values_list('pk', flat=True)[:lote])
+            if not pks:
+                return borradas
+            borradas += LogEntry.objects.filter(pk__in=pks).delete()[0]
+            time.sleep(pausa)
@@ -0,0 +1,194 @@
+# appmustafa/management/commands/benchmark_endpoints.py
+
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from appmustafa.models import CustomUser, Noticia
+from appmustafa.utils.rendimiento import resumen_latencias
+
+# Métricas que se comparan contra el baseline para detectar regresiones
+METRICAS_COMPARADAS = ['p50_ms', 'p95_ms', 'p99_ms', 'consultas']
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la latencia (p50/p95/p99), el número de consultas SQL y el tamaño de respuesta "
+        "de los endpoints principales contra la base de datos actual y lo compara con un baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteraciones', type=int, default=50, help="Peticiones medidas por endpoint")
+        parser.add_argument('--calentamiento', type=int, default=3, help="Peticiones previas sin medir por endpoint")
+        parser.add_argument('--usuario', help="Username con el que se piden los endpoints autenticados (por defecto, el primer superusuario)")
+        parser.add_argument('--noticia', type=int, help="ID de la noticia para /api/comentarios/ (por defecto, la más comentada)")
+        parser.add_argument('--salida', default='benchmarks/resultado.json', help="Fichero JSON donde se escriben los resultados")
+        parser.add_argument('--baseline', default='benchmarks/baseline.json', help="Fichero JSON con el baseline a comparar")
+        parser.add_argument('--umbral', type=float, default=20.0, help="Porcentaje de empeoramiento a partir del cual se marca regresión")
+        parser.add_argument('--guardar-baseline', action='store_true', help="Guarda los resultados como nuevo baseline")
+        parser.add_argument('--no-fallar', action='store_true', help="No termina con error aunque haya regresiones")
+
+    def handle(self, *args, **options):
+        if options['iteraciones'] < 1:
+            raise CommandError("--iteraciones debe ser al menos 1.")
+
+        # Permite usar el cliente de pruebas (host 'testserver', emails en memoria) sin tocar la configuración
+        try:
+            setup_test_environment()
+            entorno_propio = True
+        except RuntimeError:
+            entorno_propio = False
+
+        try:
+            resultados = self.medir(options)
+        finally:
+            if entorno_propio:
+                teardown_test_environment()
+
+        salida = Path(options['salida'])
+        salida.parent.mkdir(parents=True, exist_ok=True)
+        salida.write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f"📄 Resultados guardados en {salida}"))
+
+        baseline = Path(options['baseline'])
+        if options['guardar_baseline']:
+            baseline.parent.mkdir(parents=True, exist_ok=True)
+            baseline.write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding='utf-8')
+            self.stdout.write(self.style.SUCCESS(f"📌 Baseline actualizado en {baseline}"))
+            return
+
+        if not baseline.exists():
+            self.stdout.write(self.style.WARNING(f"⚠️  No hay baseline en {baseline}; usa --guardar-baseline para crearlo."))
+            return
+
+        regresiones = comparar_con_baseline(
+            resultados, json.loads(baseline.read_text(encoding='utf-8')), options['umbral']
+        )
+        for regresion in regresiones:
+            self.stdout.write(self.style.ERROR(
+                f"❌ {regresion['endpoint']} {regresion['metrica']}: "
+                f"{regresion['baseline']} → {regresion['actual']} (+{regresion['variacion_pct']}%)"
+            ))
+        if not regresiones:
+            self.stdout.write(self.style.SUCCESS(f"✅ Sin regresiones por encima del {options['umbral']}%"))
+        elif not options['no_fallar']:
+            raise CommandError(f"{len(regresiones)} regresiones por encima del {options['umbral']}%")
+
+    # Construye la lista de endpoints a medir con el cliente que corresponda a cada uno
+    def endpoints(self, options):
+        anonimo = Client()
+        autenticado = None
+
+        if options['usuario']:
+            usuario = CustomUser.objects.filter(username=options['usuario']).first()
+            if usuario is None:
+                raise CommandError(f"No existe el usuario '{options['usuario']}'.")
+        else:
+            usuario = CustomUser.objects.filter(is_superuser=True, is_active=True).order_by('pk').first()
+
+        if usuario is not None:
+            autenticado = Client()
+            autenticado.force_login(usuario)  # Sesión para el admin
+            autenticado.cookies['access_token'] = str(RefreshToken.for_user(usuario).access_token)  # JWT para la API
+
+        noticia_id = options['noticia']
+        if noticia_id is None:
+            noticia_id = (
+                Noticia.objects.annotate(total=Count('comentarios'))
+                .order_by('-total', 'pk')
+                .values_list('pk', flat=True)
+                .first()
+            )
+
+        lista = [('animales', '/api/animales/', anonimo)]
+        if noticia_id is not None:
+            lista.append(('comentarios_noticia', f'/api/comentarios/?noticia={noticia_id}', anonimo))
+        else:
+            self.stdout.write(self.style.WARNING("⚠️  No hay noticias: se omite /api/comentarios/?noticia="))
+
+        if autenticado is not None:
+            lista.append(('adopciones', '/api/adopciones/', autenticado))
+            if usuario.is_staff:
+                lista.append(('admin_dashboard', '/admin/', autenticado))
+        else:
+            self.stdout.write(self.style.WARNING("⚠️  No hay usuario para los endpoints autenticados: se omiten adopciones y admin"))
+        return lista
+
+    def medir(self, options):
+        resultados = {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'iteraciones': options['iteraciones'],
+            'base_de_datos': settings.DATABASES['default'].get('ENGINE'),
+            'endpoints': {},
+        }
+
+        for nombre, url, cliente in self.endpoints(options):
+            for _ in range(options['calentamiento']):
+                cliente.get(url)
+
+            latencias = []
+            consultas = 0
+            tamano = 0
+            estado = None
+            for _ in range(options['iteraciones']):
+                with CaptureQueriesContext(connection) as capturadas:
+                    inicio = time.perf_counter()
+                    respuesta = cliente.get(url)
+                    contenido = b''.join(respuesta.streaming_content) if respuesta.streaming else respuesta.content
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+                consultas = max(consultas, len(capturadas))
+                tamano = max(tamano, len(contenido))
+                estado = respuesta.status_code
+
+            if estado != 200:
+                self.stdout.write(self.style.WARNING(f"⚠️  {url} respondió {estado}"))
+
+            resultados['endpoints'][nombre] = {
+                'url': url,
+                'status': estado,
+                **resumen_latencias(latencias),
+                'consultas': consultas,
+                'bytes': tamano,
+            }
+            metricas = resultados['endpoints'][nombre]
+            self.stdout.write(
+                f"⏱️  {nombre:<22} p50={metricas['p50_ms']}ms p95={metricas['p95_ms']}ms "
+                f"p99={metricas['p99_ms']}ms consultas={consultas} bytes={tamano}"
+            )
+
+        return resultados
+
+
+def comparar_con_baseline(actual, baseline, umbral):
+    """
+    Compara dos resultados de benchmark y devuelve las métricas que han
+    empeorado más de ``umbral`` por ciento respecto al baseline.
+    """
+    regresiones = []
+    for nombre, metricas in actual['endpoints'].items():
+        anteriores = baseline.get('endpoints', {}).get(nombre)
+        if not anteriores:
+            continue
+        for metrica in METRICAS_COMPARADAS:
+            valor, referencia = metricas.get(metrica), anteriores.get(metrica)
+            if valor is None or referencia is None:
+                continue
+            if valor > referencia * (1 + umbral / 100):
+                variacion = ((valor - referencia) / referencia * 100) if referencia else float('inf')
+                regresiones.append({
+                    'endpoint': nombre,
+                    'metrica': metrica,
+                    'baseline': referencia,
+                    'actual': valor,
+                    'variacion_pct': round(variacion, 1),
+                })
+    return regresiones
@@ -0,0 +1,20 @@
+# appmustafa/management/commands/enviar_bandeja_salida.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from appmustafa.utils.smtp import vaciar_bandeja
+
+
+class Command(BaseCommand):
+    help = "Envía los correos guardados en la bandeja de salida mientras el servidor SMTP no estaba disponible"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max', type=int, help="Número máximo de correos a enviar en esta ejecución")
+
+    def handle(self, *args, **options):
+        enviados, pendientes = vaciar_bandeja(maximo=options['max'])
+        self.stdout.write(self.style.SUCCESS(f"📤 {enviados} correos enviados desde la bandeja de salida"))
+        if pendientes and options['max'] is None:
+            raise CommandError(f"Quedan {pendientes} correos pendientes: el servidor SMTP sigue sin responder.")
+        if pendientes:
+            self.stdout.write(self.style.WARNING(f"⚠️  Quedan {pendientes} correos pendientes"))
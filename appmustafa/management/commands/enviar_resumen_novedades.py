@@ -0,0 +1,98 @@
+# appmustafa/management/commands/enviar_resumen_novedades.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from appmustafa.models import CustomUser, EventoNovedad
+from appmustafa.signals import DEFAULT_IMAGEN_ANIMAL, DEFAULT_IMAGEN_NOTICIA
+from appmustafa.utils.email import enviar_email_html
+
+# Cada cuánto toca resumen; lo que entra en él es todo lo pendiente desde la marca de agua del usuario
+PERIODOS = {
+    'diaria': timedelta(days=1),
+    'semanal': timedelta(days=7),
+}
+# Holgura para que una ejecución diaria del cron que llegue un poco antes no se salte a nadie
+MARGEN = timedelta(hours=1)
+# Los eventos se conservan este tiempo aunque falten ejecuciones del cron; lo más antiguo ya no se envía
+RETENCION = timedelta(days=30)
+
+
+class Command(BaseCommand):
+    help = (
+        "Envía a cada suscriptor con resumen diario o semanal un solo correo con los animales y noticias "
+        "nuevos desde su último resumen. Pensado para ejecutarse una vez al día (cron); repetirlo no reenvía nada"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--frecuencia', choices=[*PERIODOS, 'todas'], default='todas', help="Resúmenes que se envían")
+        parser.add_argument('--forzar', action='store_true', help="Envía aunque no haya pasado el periodo desde el último resumen")
+
+    def handle(self, *args, **options):
+        ahora = timezone.now()
+        frecuencias = PERIODOS if options['frecuencia'] == 'todas' else [options['frecuencia']]
+        for frecuencia in frecuencias:
+            enviados = self.enviar(frecuencia, ahora, options['forzar'])
+            self.stdout.write(self.style.SUCCESS(f"📬 {enviados} resúmenes con frecuencia {frecuencia}"))
+
+        borrados, _ = EventoNovedad.objects.filter(fecha__lt=ahora - RETENCION).delete()
+        if borrados:
+            self.stdout.write(f"🧹 {borrados} eventos antiguos borrados")
+
+    def enviar(self, frecuencia, ahora, forzar):
+        periodo = PERIODOS[frecuencia]
+        # Las novedades que se conservan se cargan una vez para todos los suscriptores
+        eventos = list(
+            EventoNovedad.objects.filter(fecha__gte=ahora - RETENCION)
+            .select_related('animal', 'noticia').order_by('pk')
+        )
+        if not eventos:
+            return 0
+
+        usuarios = CustomUser.objects.filter(
+            recibir_novedades=True, is_active=True, frecuencia_novedades=frecuencia,
+            resumen_ultimo_evento__lt=eventos[-1].pk,
+        )
+        if not forzar:
+            # El periodo solo decide a quién le toca, no qué novedades entran
+            usuarios = usuarios.filter(Q(resumen_enviado_en__isnull=True) | Q(resumen_enviado_en__lte=ahora - periodo + MARGEN))
+
+        enviados = 0
+        for usuario in usuarios.iterator():
+            # Todo lo posterior a su marca de agua, aunque el cron se haya saltado días. El primer resumen
+            # de un suscriptor se limita a su periodo para no mandarle todo lo que se conserva
+            desde = ahora - periodo - MARGEN if usuario.resumen_enviado_en is None else ahora - RETENCION
+            pendientes = [
+                evento for evento in eventos
+                if evento.pk > usuario.resumen_ultimo_evento and evento.fecha >= desde
+            ]
+            if not pendientes:
+                continue
+            enviar_email_html(
+                destinatario=usuario.email,
+                asunto="🐾 Tu resumen de novedades de Animalistes Masquefa",
+                plantilla="email/resumen_novedades.html",
+                contexto={
+                    'usuario': usuario,
+                    'frecuencia': frecuencia,
+                    'animales': [self.item(evento.animal, DEFAULT_IMAGEN_ANIMAL) for evento in pendientes if evento.animal],
+                    'noticias': [self.item(evento.noticia, DEFAULT_IMAGEN_NOTICIA) for evento in pendientes if evento.noticia],
+                    'frontend_url': settings.FRONTEND_URL,
+                },
+            )
+            # Marca de agua tras cada envío: si el comando se corta, al repetirlo no se reenvía a nadie
+            CustomUser.objects.filter(pk=usuario.pk).update(
+                resumen_ultimo_evento=pendientes[-1].pk, resumen_enviado_en=ahora,
+            )
+            enviados += 1
+        return enviados
+
+    def item(self, objeto, imagen_por_defecto):
+        return {
+            'objeto': objeto,
+            'imagen_url': f"{settings.CLOUDINARY_BASE_URL}{getattr(objeto.imagen, 'public_id', imagen_por_defecto)}.jpg",
+        }
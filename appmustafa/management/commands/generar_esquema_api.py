@@ -0,0 +1,49 @@
+# appmustafa/management/commands/generar_esquema_api.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from appmustafa.utils.esquema_api import codificar_esquema, generar_esquema, ruta_esquema
+
+EXTENSIONES = ['json', 'yaml']
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera el esquema OpenAPI de la API en ficheros JSON y YAML versionados "
+        "(ESQUEMA_API_DIR), que es lo que sirven /swagger/ y /redoc/"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--comprobar', action='store_true',
+            help="No escribe nada; termina con error si los ficheros no coinciden con la API actual",
+        )
+
+    def handle(self, *args, **options):
+        esquema = generar_esquema()
+        desactualizados = []
+
+        for extension in EXTENSIONES:
+            ruta = ruta_esquema(extension)
+            contenido = codificar_esquema(esquema, extension)
+            actual = ruta.read_bytes() if ruta.exists() else None
+
+            if options['comprobar']:
+                if actual != contenido:
+                    desactualizados.append(str(ruta))
+                continue
+
+            if actual == contenido:
+                self.stdout.write(f"= {ruta} sin cambios")
+                continue
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            ruta.write_bytes(contenido)
+            self.stdout.write(self.style.SUCCESS(f"📄 Esquema escrito en {ruta}"))
+
+        if desactualizados:
+            raise CommandError(
+                "El esquema pregenerado no coincide con la API; ejecuta manage.py generar_esquema_api: "
+                + ", ".join(desactualizados)
+            )
+        if options['comprobar']:
+            self.stdout.write(self.style.SUCCESS("✅ El esquema pregenerado está al día"))
@@ -0,0 +1,67 @@
+# appmustafa/management/commands/limpiar_media_huerfana.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from appmustafa.utils.media_huerfana import (
+    CuotaAgotada, OrigenCloudinary, OrigenLocal, borrar_huerfanos, buscar_huerfanos, referencias,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra los ficheros de las carpetas de la aplicación (Cloudinary o MEDIA_ROOT) que ya no "
+        "referencia ningún animal, noticia, usuario ni adopción"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Solo lista los huérfanos, sin borrar nada")
+        parser.add_argument(
+            '--origen', choices=['cloudinary', 'local'],
+            default='local' if settings.SUBIDA_DIRECTA_BACKEND == 'local' else 'cloudinary',
+            help="Dónde buscar los ficheros (por defecto, según SUBIDA_DIRECTA_BACKEND)",
+        )
+        parser.add_argument('--horas', type=int, default=24, help="Solo ficheros subidos hace al menos estas horas (los recientes pueden estar aún sin guardar en su modelo)")
+        parser.add_argument('--max', type=int, default=None, help="Máximo de ficheros borrados por carpeta en esta ejecución")
+        parser.add_argument('--pausa', type=float, default=0.5, help="Segundos de espera entre llamadas a la API de Cloudinary o entre lotes de borrado")
+        parser.add_argument('--reserva', type=int, default=50, help="Para al quedar estas llamadas de la cuota horaria de la API de administración de Cloudinary")
+
+    def handle(self, *args, **options):
+        if options['horas'] < 0 or options['pausa'] < 0 or options['reserva'] < 0:
+            raise CommandError("--horas, --pausa y --reserva no pueden ser negativos.")
+        if options['max'] is not None and options['max'] < 1:
+            raise CommandError("--max debe ser al menos 1.")
+
+        if options['origen'] == 'local':
+            origen = OrigenLocal(pausa=options['pausa'])
+        else:
+            origen = OrigenCloudinary(pausa=options['pausa'], reserva=options['reserva'])
+
+        # Antes de listar: lo que se suba después queda cubierto por --horas
+        referenciados = referencias()
+        self.stdout.write(f"🔗 {len(referenciados)} ficheros referenciados en la base de datos")
+
+        total = 0
+        try:
+            huerfanos = buscar_huerfanos(origen, referenciados, timedelta(hours=options['horas']))
+            for (resource_type, prefijo), public_ids in huerfanos.items():
+                if not public_ids:
+                    continue
+                if options['dry_run']:
+                    for public_id in public_ids:
+                        self.stdout.write(f"   {public_id}")
+                    self.stdout.write(f"🔍 {prefijo}: {len(public_ids)} huérfanos")
+                    total += len(public_ids)
+                    continue
+                borrados = borrar_huerfanos(origen, resource_type, public_ids, options['max'])
+                self.stdout.write(f"🗑️  {prefijo}: {borrados} de {len(public_ids)} huérfanos borrados")
+                total += borrados
+        except CuotaAgotada as error:
+            self.stdout.write(self.style.WARNING(f"⚠️  {error} Se para aquí; vuelve a lanzarlo en la próxima hora."))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"✅ {total} huérfanos encontrados (dry-run: no se ha borrado nada)"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ {total} huérfanos borrados de {origen.nombre}"))
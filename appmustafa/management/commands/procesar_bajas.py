@@ -0,0 +1,38 @@
+# appmustafa/management/commands/procesar_bajas.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from appmustafa.models import CustomUser
+from appmustafa.utils.bajas import procesar_baja
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra por lotes los datos de las cuentas con baja solicitada que no se terminaron en segundo plano "
+        "(por ejemplo, porque se reinició el servidor a mitad)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=settings.BAJAS_LOTE, help="Filas borradas por DELETE")
+        parser.add_argument('--minutos', type=int, default=10, help="Solo bajas solicitadas hace al menos estos minutos (las recientes las está procesando el servidor)")
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1 or options['minutos'] < 0:
+            raise CommandError("--lote debe ser al menos 1 y --minutos no puede ser negativo.")
+
+        limite = timezone.now() - timedelta(minutes=options['minutos'])
+        pendientes = list(
+            CustomUser.objects.filter(baja_solicitada__lte=limite).order_by('baja_solicitada').values_list('pk', flat=True)
+        )
+        for usuario_id in pendientes:
+            resultado = procesar_baja(usuario_id, options['lote'])
+            if resultado is not None:
+                self.stdout.write(
+                    f"🗑️  Usuario {usuario_id}: {resultado['comentarios']} comentarios, "
+                    f"{resultado['adopciones']} adopciones y {resultado['pdfs']} PDF"
+                )
+        self.stdout.write(self.style.SUCCESS(f"✅ {len(pendientes)} bajas procesadas"))
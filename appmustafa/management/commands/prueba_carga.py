@@ -0,0 +1,109 @@
+# appmustafa/management/commands/prueba_carga.py
+
+import json
+import uuid
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from appmustafa.models import Animal, CustomUser, Noticia
+from appmustafa.utils.carga import ESCENARIOS, dobles_locales, ejecutar_carga, servidor_local
+
+PREFIJO_CUENTAS = 'carga_'
+PASSWORD_CUENTAS = 'Carga12345'
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga por escenarios (catálogo, hilos, login, comentar, adoptar) con usuarios virtuales "
+        "concurrentes. Por defecto arranca la aplicación en este proceso con correo en memoria y Cloudinary "
+        "local; informa del throughput y de los percentiles de latencia de cada paso"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=20, help="Usuarios virtuales concurrentes")
+        parser.add_argument('--duracion', type=float, default=30, help="Segundos que dura la prueba")
+        parser.add_argument('--escenarios', default=','.join(ESCENARIOS), help=f"Escenarios separados por comas ({', '.join(ESCENARIOS)})")
+        parser.add_argument('--pausa', type=float, default=0.0, help="Pausa máxima (segundos, al azar) entre escenarios de un usuario")
+        parser.add_argument('--url', help="Servidor ya arrancado contra la misma base de datos (por defecto se arranca uno local)")
+        parser.add_argument('--sin-limites', action='store_true', help="Desactiva el throttling en el servidor local")
+        parser.add_argument('--semilla', type=int, help="Semilla para repetir la misma secuencia de escenarios")
+        parser.add_argument('--salida', default='benchmarks/carga.json', help="Fichero JSON donde se escriben los resultados")
+        parser.add_argument('--conservar-cuentas', action='store_true', help="No borra las cuentas de prueba (ni sus comentarios y adopciones)")
+
+    def handle(self, *args, **options):
+        escenarios = [nombre.strip() for nombre in options['escenarios'].split(',') if nombre.strip()]
+        desconocidos = set(escenarios) - set(ESCENARIOS)
+        if desconocidos:
+            raise CommandError(f"Escenarios desconocidos: {', '.join(sorted(desconocidos))}")
+        if options['usuarios'] < 1 or options['duracion'] <= 0:
+            raise CommandError("--usuarios y --duracion deben ser positivos.")
+
+        datos = {
+            'animales': list(Animal.objects.values_list('pk', flat=True)),
+            'noticias': list(Noticia.objects.values_list('pk', flat=True)),
+        }
+        if not datos['animales'] or not datos['noticias']:
+            raise CommandError("Hacen falta animales y noticias en la base de datos (por ejemplo, manage.py seed_real_data).")
+
+        with ExitStack() as pila:
+            if options['url']:
+                base = options['url']
+            else:
+                pila.enter_context(dobles_locales(sin_limites=options['sin_limites']))
+                base = pila.enter_context(servidor_local())
+
+            cuentas = self.preparar_cuentas(options['usuarios'])
+            if options['conservar_cuentas']:
+                self.stdout.write(f"👤 Cuentas de prueba: {cuentas[0].username.rsplit('_', 1)[0]}_*")
+            try:
+                self.stdout.write(f"🚀 {options['usuarios']} usuarios virtuales durante {options['duracion']}s contra {base}")
+                resumen = ejecutar_carga(
+                    base, cuentas, PASSWORD_CUENTAS, datos, options['duracion'],
+                    escenarios, options['pausa'], options['semilla'],
+                )
+            finally:
+                if not options['conservar_cuentas']:
+                    # Solo las creadas en esta ejecución, nunca cuentas reales que empiecen igual
+                    CustomUser.objects.filter(pk__in=[cuenta.pk for cuenta in cuentas]).delete()
+
+        resultados = {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'usuarios': options['usuarios'],
+            'escenarios': escenarios,
+            **resumen,
+        }
+        self.informar(resultados)
+
+        salida = Path(options['salida'])
+        salida.parent.mkdir(parents=True, exist_ok=True)
+        salida.write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f"📄 Resultados guardados en {salida}"))
+
+    # Una cuenta nueva por usuario virtual, todas con la misma contraseña (se hashea una sola vez). El
+    # prefijo es aleatorio en cada ejecución para no tocar nunca una cuenta que ya exista
+    def preparar_cuentas(self, total):
+        password = make_password(PASSWORD_CUENTAS)
+        prefijo = f'{PREFIJO_CUENTAS}{uuid.uuid4().hex[:8]}_'
+        nombres = [f'{prefijo}{numero}' for numero in range(total)]
+        if CustomUser.objects.filter(username__in=nombres).exists():
+            raise CommandError(f"Ya existen cuentas {prefijo}*; vuelve a lanzar la prueba.")
+        CustomUser.objects.bulk_create([
+            CustomUser(username=nombre, email=f'{nombre}@carga.invalid', password=password)
+            for nombre in nombres
+        ])
+        return list(CustomUser.objects.filter(username__in=nombres).order_by('pk'))
+
+    def informar(self, resultados):
+        self.stdout.write(f"{'paso':<26}{'n':>7}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'errores':>9}")
+        for paso, metricas in resultados['pasos'].items():
+            self.stdout.write(
+                f"{paso:<26}{metricas['peticiones']:>7}{metricas['rps']:>9}{metricas['p50_ms']:>9}"
+                f"{metricas['p95_ms']:>9}{metricas['p99_ms']:>9}{metricas['errores']:>9}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {resultados['peticiones']} peticiones en {resultados['duracion_s']}s ({resultados['rps']} rps)"
+        ))
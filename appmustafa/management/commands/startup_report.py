@@ -0,0 +1,103 @@
+# appmustafa/management/commands/startup_report.py
+
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Script que se ejecuta en un intérprete limpio con -X importtime. Separa en stderr
+# las importaciones de django.setup() de las del URLconf y devuelve los tiempos en stdout.
+SCRIPT_ARRANQUE = """
+import json, os, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', {settings_module!r})
+inicio = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter() - inicio
+sys.stderr.write('@@fase urlconf\\n')
+inicio = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urlconf = time.perf_counter() - inicio
+sys.stdout.write(json.dumps({{'setup': setup, 'urlconf': urlconf}}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el tiempo de django.setup() y de la importación del URLconf en un proceso nuevo "
+        "y desglosa el tiempo de importación por módulo (-X importtime)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help="Número de módulos y paquetes a mostrar por fase")
+        parser.add_argument('--json', action='store_true', help="Muestra el informe completo en JSON")
+
+    def handle(self, *args, **options):
+        script = SCRIPT_ARRANQUE.format(settings_module=os.environ.get('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE))
+        proceso = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            capture_output=True, text=True, cwd=settings.BASE_DIR,
+        )
+        if proceso.returncode != 0:
+            raise CommandError(f"El arranque falló:\n{proceso.stderr[-2000:]}")
+
+        tiempos = json.loads(proceso.stdout.strip().splitlines()[-1])
+        fases = analizar_importtime(proceso.stderr)
+        informe = {
+            'setup_ms': round(tiempos['setup'] * 1000, 1),
+            'urlconf_ms': round(tiempos['urlconf'] * 1000, 1),
+            'fases': {
+                nombre: {
+                    'paquetes': top(datos['paquetes'], options['top']),
+                    'modulos': top(datos['modulos'], options['top']),
+                }
+                for nombre, datos in fases.items()
+            },
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(informe, indent=2, ensure_ascii=False))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"🚀 django.setup(): {informe['setup_ms']} ms · URLconf: {informe['urlconf_ms']} ms"
+        ))
+        for nombre, datos in informe['fases'].items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{nombre}: paquetes (tiempo propio acumulado)"))
+            for paquete, ms in datos['paquetes']:
+                self.stdout.write(f"  {ms:>9.1f} ms  {paquete}")
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{nombre}: módulos (tiempo acumulado)"))
+            for modulo, ms in datos['modulos']:
+                self.stdout.write(f"  {ms:>9.1f} ms  {modulo}")
+
+
+def analizar_importtime(salida):
+    """
+    Agrupa las líneas de ``-X importtime`` por fase. Para cada fase devuelve el
+    tiempo propio sumado por paquete raíz y el tiempo acumulado de los módulos
+    importados directamente (primer nivel), en milisegundos.
+    """
+    fases = {}
+    actual = fases.setdefault('django.setup()', {'paquetes': defaultdict(float), 'modulos': {}})
+    for linea in salida.splitlines():
+        if linea.startswith('@@fase '):
+            actual = fases.setdefault('URLconf', {'paquetes': defaultdict(float), 'modulos': {}})
+            continue
+        if not linea.startswith('import time:') or 'self [us]' in linea:
+            continue
+        propio, acumulado, nombre = linea[len('import time:'):].split('|')
+        modulo = nombre.strip()
+        actual['paquetes'][modulo.split('.')[0]] += int(propio) / 1000
+        # Los módulos sin sangría extra son los que se importaron directamente en esta fase
+        if not nombre.startswith('  '):
+            actual['modulos'][modulo] = int(acumulado) / 1000
+    return fases
+
+
+def top(valores, n):
+    return [(nombre, round(ms, 1)) for nombre, ms in sorted(valores.items(), key=lambda x: -x[1])[:n]]
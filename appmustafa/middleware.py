@@ -0,0 +1,334 @@
+import json
+import logging
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .audit import aauditoria_en_buffer, auditoria_en_buffer
+from .authentication import CookieJWTAuthentication
+from .db_router import activar_replica, desactivar_replica, elegir_replica
+from .utils.metricas import PETICIONES_DURACION
+
+# Número máximo de frames propios que se guardan con cada consulta lenta
+FRAMES_STACK_SQL_LENTO = 8
+
+_lock_logger = threading.Lock()
+
+# Medidor de la petición en curso. Al ser una ContextVar, también llega a los hilos en los que
+# sync_to_async ejecuta el ORM cuando la vista es asíncrona.
+_medidor_actual = ContextVar('medidor_sql', default=None)
+
+
+class MiddlewareSyncAsync:
+    """
+    Base para los middlewares del proyecto: funcionan tanto en la cadena
+    síncrona (WSGI) como en la asíncrona (ASGI) sin que Django tenga que
+    adaptarlos con hilos. Las subclases implementan ``__call__`` y ``__acall__``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+
+# Devuelve el logger de consultas lentas, que escribe una línea JSON por consulta en un fichero rotatorio
+def _logger_sql_lento():
+    ruta = Path(settings.SQL_LENTO_LOG)
+    logger = logging.getLogger('appmustafa.sql_lento')
+    with _lock_logger:
+        if getattr(logger, 'ruta_fichero', None) != ruta:
+            for manejador in list(logger.handlers):
+                logger.removeHandler(manejador)
+                manejador.close()
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            manejador = RotatingFileHandler(
+                ruta,
+                maxBytes=settings.SQL_LENTO_LOG_MAX_BYTES,
+                backupCount=settings.SQL_LENTO_LOG_BACKUPS,
+                encoding='utf-8',
+            )
+            manejador.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(manejador)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.ruta_fichero = ruta
+    return logger
+
+
+# Stack de la consulta limitado a los frames del propio proyecto (sin Django ni librerías)
+def _stack_recortado():
+    base = str(settings.BASE_DIR)
+    frames = [
+        f"{frame.filename[len(base) + 1:]}:{frame.lineno} en {frame.name}"
+        for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(base) and 'site-packages' not in frame.filename
+    ]
+    return frames[-FRAMES_STACK_SQL_LENTO:]
+
+
+# Wrapper instalado de forma permanente en cada conexión; solo mide si hay una petición en curso
+def _medir_consulta(execute, sql, params, many, context):
+    medidor = _medidor_actual.get()
+    if medidor is None:
+        return execute(sql, params, many, context)
+    return medidor(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def _instalar_medicion(sender, connection, **kwargs):
+    if _medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir_consulta)
+
+
+class MedidorSQL:
+    """
+    Wrapper para ``connection.execute_wrapper`` que cuenta las consultas de una
+    petición, acumula su duración y registra las que superan el umbral.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.consultas = 0
+        self.duracion = 0.0
+        self.umbral = settings.SQL_LENTO_UMBRAL_MS / 1000
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.consultas += 1
+            self.duracion += duracion
+            if duracion >= self.umbral:
+                self.registrar_lenta(sql, duracion, context)
+
+    def registrar_lenta(self, sql, duracion, context):
+        resolver_match = getattr(self.request, 'resolver_match', None)
+        _logger_sql_lento().info(json.dumps({
+            'fecha': timezone.now().isoformat(),
+            'duracion_ms': round(duracion * 1000, 3),
+            'base_de_datos': context['connection'].alias,
+            'vista': resolver_match.view_name if resolver_match else None,
+            'metodo': self.request.method,
+            'ruta': self.request.path,
+            'sql': sql,
+            'stack': _stack_recortado(),
+        }, ensure_ascii=False, default=str))
+
+
+class InstrumentacionSQLMiddleware(MiddlewareSyncAsync):
+    """
+    Mide las consultas SQL de cada petición. Al personal (staff) le devuelve el
+    número de consultas y el tiempo en base de datos en la cabecera
+    ``Server-Timing``; las consultas lentas se registran siempre en
+    ``SQL_LENTO_LOG``.
+    """
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+
+        # Conexiones abiertas antes de cargar este módulo (las nuevas pasan por connection_created)
+        for conexion in connections.all(initialized_only=True):
+            _instalar_medicion(None, conexion)
+
+        medidor = MedidorSQL(request)
+        token = _medidor_actual.set(medidor)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _medidor_actual.reset(token)
+
+        # request.user ya es el usuario autenticado por DRF si la vista es de la API
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            self.anadir_server_timing(response, medidor, time.perf_counter() - inicio)
+        return response
+
+    async def __acall__(self, request):
+        medidor = MedidorSQL(request)
+        token = _medidor_actual.set(medidor)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medidor_actual.reset(token)
+
+        user = await request.auser() if hasattr(request, 'auser') else None
+        if user is not None and user.is_staff:
+            self.anadir_server_timing(response, medidor, time.perf_counter() - inicio)
+        return response
+
+    def anadir_server_timing(self, response, medidor, total):
+        response['Server-Timing'] = (
+            f'db;dur={medidor.duracion * 1000:.2f};desc="{medidor.consultas} consultas", '
+            f'total;dur={total * 1000:.2f}'
+        )
+
+
+class MetricasMiddleware(MiddlewareSyncAsync):
+    """
+    Registra la latencia de cada petición en el histograma de Prometheus,
+    etiquetada con la vista (y la acción, en los ViewSets de DRF), el método y
+    el código de estado.
+    """
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        inicio = time.perf_counter()
+        response = self.get_response(request)
+        self.observar(request, response, time.perf_counter() - inicio)
+        return response
+
+    async def __acall__(self, request):
+        inicio = time.perf_counter()
+        response = await self.get_response(request)
+        self.observar(request, response, time.perf_counter() - inicio)
+        return response
+
+    def observar(self, request, response, duracion):
+        vista, accion = 'sin_resolver', ''
+        resolver_match = getattr(request, 'resolver_match', None)
+        if resolver_match is not None:
+            view_func = resolver_match.func
+            clase = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+            vista = clase.__name__ if clase is not None else getattr(view_func, '__name__', 'desconocida')
+            # Los ViewSets exponen el mapeo método -> acción (list, retrieve, create...)
+            acciones = getattr(view_func, 'actions', None) or {}
+            accion = acciones.get(request.method.lower(), '')
+        PETICIONES_DURACION.labels(
+            vista=vista,
+            accion=accion,
+            metodo=request.method,
+            estado=str(response.status_code),
+        ).observe(duracion)
+
+
+class PerfiladoMiddleware(MiddlewareSyncAsync):
+    """
+    Perfila bajo demanda una petición concreta cuando un usuario staff envía la
+    cabecera ``X-Perfilar: cpu``, ``memoria`` o ``cpu,memoria``. El resultado se
+    guarda en ``PERFILES_DIR`` y se lista en el admin; el identificador del
+    perfil se devuelve en la cabecera ``X-Perfil``. El resto de peticiones no se
+    ven afectadas. En el perfil ASGI no se perfila: el ORM se ejecuta en otros
+    hilos y cProfile no lo vería.
+    """
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.get_response(request)
+
+        cabecera = request.headers.get('X-Perfilar')
+        if not cabecera:
+            return self.get_response(request)
+
+        # cProfile, pstats y tracemalloc solo se importan si de verdad se pide un perfil
+        from .utils.perfilado import MODOS_PERFILADO, perfilar
+
+        modos = {modo.strip().lower() for modo in cabecera.split(',')} & MODOS_PERFILADO
+        usuario = self.usuario_staff(request)
+        if not modos or usuario is None:
+            return self.get_response(request)
+
+        response, identificador = perfilar(self.get_response, request, modos, usuario)
+        response['X-Perfil'] = identificador or 'ocupado'
+        return response
+
+    # Usuario staff de la petición, ya sea por sesión (admin) o por el JWT en cookie (API)
+    def usuario_staff(self, request):
+        usuario = getattr(request, 'user', None)
+        if usuario is None or not usuario.is_authenticated:
+            autenticado = CookieJWTAuthentication().authenticate(request)
+            usuario = autenticado[0] if autenticado else None
+        if usuario is not None and usuario.is_active and usuario.is_staff:
+            return usuario
+        return None
+
+
+class AuditoriaBufferMiddleware(MiddlewareSyncAsync):
+    """
+    Acumula las entradas de auditlog generadas durante la petición y las
+    escribe con un único ``bulk_create`` al terminar, en lugar de un INSERT
+    por cada ``save()`` auditado.
+    """
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        with auditoria_en_buffer():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        async with aauditoria_en_buffer():
+            return await self.get_response(request)
+
+
+class ReplicaLecturaMiddleware(MiddlewareSyncAsync):
+    """
+    Envía a una réplica (``REPLICAS_BD``) las lecturas de las peticiones
+    GET/HEAD a vistas marcadas con ``usar_replica``. Tras una escritura con
+    éxito, la cookie ``COOKIE_PRIMARIA`` mantiene al usuario en la primaria
+    durante ``REPLICA_ADHERENCIA_SEGUNDOS`` para que vea sus propios cambios
+    aunque la réplica vaya con retraso. Sin réplicas configuradas no hace nada.
+    """
+
+    COOKIE_PRIMARIA = 'bd_primaria'
+    METODOS_LECTURA = ('GET', 'HEAD')
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            desactivar_replica()
+        return self.adherir(request, response)
+
+    async def __acall__(self, request):
+        try:
+            response = await self.get_response(request)
+        finally:
+            desactivar_replica()
+        return self.adherir(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.REPLICAS_BD or request.method not in self.METODOS_LECTURA:
+            return None
+        if request.COOKIES.get(self.COOKIE_PRIMARIA):
+            return None
+        clase = getattr(view_func, 'cls', None)
+        if getattr(clase, 'usar_replica', False) or getattr(view_func, 'usar_replica', False):
+            alias = elegir_replica()
+            if alias is not None:
+                activar_replica(alias)
+        return None
+
+    def adherir(self, request, response):
+        if settings.REPLICAS_BD and request.method not in self.METODOS_LECTURA + ('OPTIONS',) and response.status_code < 400:
+            # Como las cookies del JWT: el frontend está en otro sitio y con Lax no la mandaría en sus XHR
+            response.set_cookie(
+                self.COOKIE_PRIMARIA, '1',
+                max_age=settings.REPLICA_ADHERENCIA_SEGUNDOS,
+                domain=settings.REPLICA_COOKIE_DOMINIO,
+                httponly=True,
+                samesite='None',
+                secure=True,
+            )
+        return response
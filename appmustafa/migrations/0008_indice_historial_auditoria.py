@@ -0,0 +1,32 @@
+from django.db import migrations
+
+INDICE = 'auditlog_logentry_historial_idx'
+
+
+# Índice para el historial por objeto (content_type + object_pk ordenado por fecha) que consulta
+# el admin. En PostgreSQL se crea con CONCURRENTLY para no bloquear la tabla mientras se construye.
+def crear_indice(apps, schema_editor):
+    concurrente = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    schema_editor.execute(
+        f'CREATE INDEX {concurrente}IF NOT EXISTS {INDICE} '
+        'ON auditlog_logentry (content_type_id, object_pk, timestamp)'
+    )
+
+
+def borrar_indice(apps, schema_editor):
+    concurrente = 'CONCURRENTLY ' if schema_editor.connection.vendor == 'postgresql' else ''
+    schema_editor.execute(f'DROP INDEX {concurrente}IF EXISTS {INDICE}')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('appmustafa', '0007_alter_customuser_foto_perfil'),
+        ('auditlog', '0017_add_actor_email'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
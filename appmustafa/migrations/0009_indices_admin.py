@@ -0,0 +1,21 @@
+# Generated by Django 5.1.3 on 2026-10-19 13:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appmustafa', '0008_indice_historial_auditoria'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='adopcion',
+            index=models.Index(fields=['aceptada', 'fecha_hora'], name='adopcion_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comentario',
+            index=models.Index(fields=['fecha_hora'], name='comentario_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.3 on 2026-10-19 13:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+LOTE = 1000
+
+
+# Rellena root, depth y path de los comentarios existentes nivel a nivel: los de primer nivel
+# ya tienen los valores por defecto; después, las respuestas de cada nivel a partir del anterior.
+def rellenar_posicion(apps, schema_editor):
+    Comentario = apps.get_model('appmustafa', 'Comentario')
+    padres = list(Comentario.objects.filter(parent__isnull=True).values_list('pk', 'root_id', 'path'))
+    depth = 0
+    while padres:
+        depth += 1
+        siguientes = []
+        for inicio in range(0, len(padres), LOTE):
+            posicion = {
+                pk: (root_id or pk, path + f'{pk:010d}/')
+                for pk, root_id, path in padres[inicio:inicio + LOTE]
+            }
+            respuestas = list(Comentario.objects.filter(parent_id__in=posicion).only('pk', 'parent_id'))
+            for respuesta in respuestas:
+                respuesta.root_id, respuesta.path = posicion[respuesta.parent_id]
+                respuesta.depth = depth
+                siguientes.append((respuesta.pk, respuesta.root_id, respuesta.path))
+            Comentario.objects.bulk_update(respuestas, ['root', 'depth', 'path'], batch_size=LOTE)
+        padres = siguientes
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appmustafa', '0009_indices_admin'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comentario',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comentario',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='comentario',
+            name='root',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='appmustafa.comentario'),
+        ),
+        migrations.AddIndex(
+            model_name='comentario',
+            index=models.Index(fields=['root', 'depth'], name='comentario_hilo_idx'),
+        ),
+        migrations.RunPython(rellenar_posicion, migrations.RunPython.noop),
+    ]
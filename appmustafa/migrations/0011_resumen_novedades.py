@@ -0,0 +1,42 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appmustafa', '0010_comentario_ruta_hilo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='frecuencia_novedades',
+            field=models.CharField(choices=[('inmediata', 'Inmediata'), ('diaria', 'Resumen diario'), ('semanal', 'Resumen semanal')], default='inmediata', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='resumen_enviado_en',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='resumen_ultimo_evento',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='EventoNovedad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('animal', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='appmustafa.animal')),
+                ('noticia', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='appmustafa.noticia')),
+            ],
+            options={
+                'verbose_name': 'Evento de novedades',
+                'verbose_name_plural': 'Eventos de novedades',
+            },
+        ),
+    ]
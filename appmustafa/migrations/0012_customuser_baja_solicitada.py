@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appmustafa', '0011_resumen_novedades'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='baja_solicitada',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
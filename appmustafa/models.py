@@ -1,19 +1,16 @@
 # Importaciones necesarias de Django, librerías de terceros y utilidades
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.utils import timezone
 from datetime import date
 from django.core.exceptions import ValidationError
-from auditlog.registry import auditlog  # Para registrar auditorías (si se usa)
 from django.contrib.auth.models import AbstractUser  # Modelo base para usuarios personalizados
 from django.conf import settings  
-from PIL import Image  # Pillow, para procesar imágenes
-from io import BytesIO
-from django.core.files.base import ContentFile  # Para crear archivos desde memoria
 
-# Librerías de Cloudinary
-import cloudinary
-from cloudinary_storage.storage import RawMediaCloudinaryStorage
+# Librerías de Cloudinary (el storage raw se carga en su primer uso, ver storage.py)
 from cloudinary.models import CloudinaryField
+from .storage import RawMediaCloudinaryStoragePerezoso
 
 # ==============================
 # Modelo Animal
@@ -82,13 +79,70 @@ class Comentario(models.Model):
     fecha_hora = models.DateTimeField(auto_now_add=True)  # Fecha y hora de creación
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='respuestas')  # Comentario padre para hilos
 
+    # Posición en el hilo, calculada a partir del padre al guardar (ver save):
+    # root es el comentario de primer nivel del hilo (None si es él mismo), depth
+    # el nivel (0 = primer nivel) y path los ids de sus ascendientes, de la raíz
+    # al padre, con ancho fijo ("0000000012/0000000034/").
+    root = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='+', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    path = models.CharField(max_length=255, blank=True, default='', db_index=True, editable=False)
+
     class Meta:
         verbose_name = 'Comentario'
         verbose_name_plural = 'Comentarios'
+        indexes = [
+            models.Index(fields=['fecha_hora'], name='comentario_fecha_idx'),  # Filtro y orden por fecha en el admin
+            models.Index(fields=['root', 'depth'], name='comentario_hilo_idx'),  # Hilo completo o un nivel de un hilo
+        ]
 
     def __str__(self):
         return f'{self.usuario.username} - {self.contenido[:20]}'
 
+    @staticmethod
+    def segmento_path(pk):
+        return f'{pk:010d}/'
+
+    # Prefijo del path que comparten todas las respuestas (a cualquier nivel) de este comentario
+    @property
+    def prefijo_respuestas(self):
+        return self.path + self.segmento_path(self.pk)
+
+    def _calcular_posicion(self):
+        parent = self.parent
+        if parent is None:
+            self.root_id, self.depth, self.path = None, 0, ''
+        else:
+            self.root_id = parent.root_id or parent.pk
+            self.depth = parent.depth + 1
+            self.path = parent.prefijo_respuestas
+
+    # Todas las respuestas del comentario, a cualquier nivel, con una sola consulta por rango del índice de path
+    def descendientes(self):
+        return Comentario.objects.filter(path__startswith=self.prefijo_respuestas)
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self._calcular_posicion()
+            return super().save(*args, **kwargs)
+
+        antiguo = Comentario.objects.filter(pk=self.pk).values('parent_id', 'path').first()
+        if antiguo is None or antiguo['parent_id'] == self.parent_id:
+            return super().save(*args, **kwargs)
+
+        # Cambio de padre: se recoloca el comentario y se mueve con él todo su subárbol
+        prefijo_antiguo = antiguo['path'] + self.segmento_path(self.pk)
+        depth_antiguo = len(antiguo['path']) // len(self.segmento_path(0))
+        self._calcular_posicion()
+        if self.parent_id == self.pk or (self.parent_id is not None and self.parent.path.startswith(prefijo_antiguo)):
+            raise ValidationError("Un comentario no puede responder a una de sus propias respuestas.")
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(Comentario, instance=self)):
+            super().save(*args, **kwargs)
+            Comentario.objects.filter(path__startswith=prefijo_antiguo).update(
+                root_id=self.root_id or self.pk,
+                depth=F('depth') + (self.depth - depth_antiguo),
+                path=Concat(Value(self.prefijo_respuestas), Substr('path', len(prefijo_antiguo) + 1)),
+            )
+
     # Calcula cuánto tiempo ha pasado desde que se creó el comentario
     def tiempo_transcurrido(self):
         delta = timezone.now() - self.fecha_hora
@@ -109,9 +163,35 @@ class Comentario(models.Model):
 # ==============================
 # Validación y path para PDF en adopciones
 # ==============================
+MAGIA_PDF = b'%PDF-'
+
 def validate_pdf(file):
     if not file.name.lower().endswith('.pdf'):
         raise ValidationError("Solo se permiten archivos PDF.")
+    # Un fichero ya guardado no se vuelve a descargar para validarlo
+    if getattr(file, '_committed', False):
+        return
+
+    maximo = settings.ADOPCION_PDF_MAX_BYTES
+    tamano = getattr(file, 'size', None)
+    if tamano is not None and tamano > maximo:
+        raise ValidationError(f"El PDF no puede superar los {maximo // (1024 * 1024)} MB.")
+
+    # La cabecera %PDF- debe estar en el primer KB (así lo admiten los lectores de PDF).
+    # Solo se lee ese trozo salvo que no se conozca el tamaño, que se mide leyendo por bloques.
+    file.seek(0)
+    try:
+        if MAGIA_PDF not in file.read(1024):
+            raise ValidationError("El archivo no es un PDF válido.")
+        if tamano is None:
+            file.seek(0)
+            leidos = 0
+            for trozo in file.chunks():
+                leidos += len(trozo)
+                if leidos > maximo:
+                    raise ValidationError(f"El PDF no puede superar los {maximo // (1024 * 1024)} MB.")
+    finally:
+        file.seek(0)
 
 # Define el path de subida del PDF usando el ID del usuario
 def pdf_upload_path(instance, filename):
@@ -135,13 +215,16 @@ class Adopcion(models.Model):
     # PDF con formulario o info en Cloudinary como recurso raw
     contenido = models.FileField(
         upload_to=pdf_upload_path,
-        storage=RawMediaCloudinaryStorage(),
+        storage=RawMediaCloudinaryStoragePerezoso(),
         validators=[validate_pdf]
     )
 
     class Meta:
         verbose_name = 'Adopcion'
         verbose_name_plural = 'Adopciones'
+        indexes = [
+            models.Index(fields=['aceptada', 'fecha_hora'], name='adopcion_estado_fecha_idx'),  # Filtro por estado ordenado por fecha
+        ]
 
     def __str__(self):
         return f"{self.animal.nombre} por {self.usuario.username}"
@@ -177,5 +260,35 @@ class CustomUser(AbstractUser):
         )
     recibir_novedades = models.BooleanField(default=False)  # Boletín de novedades, etc.
 
+    # Cómo recibe las novedades: un correo por cada una o un resumen (comando enviar_resumen_novedades)
+    FRECUENCIAS_NOVEDADES = [
+        ('inmediata', 'Inmediata'),
+        ('diaria', 'Resumen diario'),
+        ('semanal', 'Resumen semanal'),
+    ]
+    frecuencia_novedades = models.CharField(max_length=10, choices=FRECUENCIAS_NOVEDADES, default='inmediata')
+    # Marca de agua del resumen: último EventoNovedad incluido y cuándo se envió
+    resumen_ultimo_evento = models.BigIntegerField(default=0, editable=False)
+    resumen_enviado_en = models.DateTimeField(null=True, blank=True, editable=False)
+    # Cuenta desactivada a petición del usuario; sus datos los borra procesar_baja en segundo plano
+    baja_solicitada = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+
     def __str__(self):
         return self.username
+
+
+# ==============================
+# Modelo EventoNovedad
+# ==============================
+# Cada animal o noticia nuevos, pendientes de incluir en los resúmenes diarios y semanales
+class EventoNovedad(models.Model):
+    animal = models.ForeignKey(Animal, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    noticia = models.ForeignKey(Noticia, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    fecha = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Evento de novedades'
+        verbose_name_plural = 'Eventos de novedades'
+
+    def __str__(self):
+        return f"{self.animal or self.noticia} ({self.fecha:%d/%m/%Y})"
@@ -1,5 +1,6 @@
 # Importa las clases base para permisos desde Django REST Framework
 from rest_framework import permissions
+from django.conf import settings
 
 class IsAdminOrReadOnly(permissions.BasePermission):
     """
@@ -16,3 +17,16 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         # Para métodos de escritura (POST, PUT, DELETE, etc.), se requiere que el usuario sea staff
         # `request.user` debe existir y `is_staff` debe ser True
         return request.user and request.user.is_staff
+
+
+class IsStaffOIPPermitida(permissions.BasePermission):
+    """
+    Permiso para endpoints internos (como /metrics):
+    - Acceso a usuarios staff autenticados.
+    - Acceso sin autenticar desde las IPs de ``METRICAS_IPS_PERMITIDAS`` (por ejemplo, el servidor de Prometheus).
+    """
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        return request.META.get('REMOTE_ADDR') in settings.METRICAS_IPS_PERMITIDAS
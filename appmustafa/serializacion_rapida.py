@@ -0,0 +1,134 @@
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.relations import PKOnlyObject, RelatedField
+from rest_framework.response import Response
+
+
+class ConstructorFilas:
+    """
+    Convierte las filas de ``queryset.values(*columnas)`` en el mismo JSON que
+    produciría el serializer, sin instanciar modelos. El plan (qué columna
+    alimenta cada campo y cómo se representa) se compila una vez por petición a
+    partir de los campos ya enlazados del serializer; por fila solo se llama al
+    ``to_representation`` de cada campo de DRF, así que el formato de fechas,
+    choices, ficheros o Cloudinary es exactamente el mismo.
+    """
+
+    def __init__(self, plan, columnas):
+        self.plan = plan
+        self.columnas = columnas
+
+    def __call__(self, fila):
+        return {nombre: representar(fila) for nombre, representar in self.plan}
+
+    def construir(self, filas):
+        return [self(fila) for fila in filas]
+
+
+def compilar(serializer, prefijo=''):
+    """
+    Compila el constructor de filas de ``serializer`` o devuelve ``None`` si
+    tiene algún campo que no se puede sacar de ``values()`` (métodos,
+    relaciones múltiples, fuentes con puntos...).
+    """
+    modelo = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    if modelo is None:
+        return None
+    plan = []
+    columnas = []
+
+    for campo in serializer._readable_fields:
+        if len(campo.source_attrs) != 1:
+            return None
+        try:
+            campo_modelo = modelo._meta.get_field(campo.source)
+        except FieldDoesNotExist:
+            return None
+        columna = prefijo + campo.source
+
+        if isinstance(campo, serializers.BaseSerializer):
+            # Serializer anidado de una FK (p. ej. AnimalSlimSerializer): sus columnas van con join
+            if isinstance(campo, serializers.ListSerializer) or not campo_modelo.many_to_one:
+                return None
+            anidado = compilar(campo, prefijo=columna + '__')
+            if anidado is None:
+                return None
+            plan.append((campo.field_name, _anidado(anidado, columna + '__' + campo_modelo.target_field.attname)))
+            columnas += anidado.columnas + [columna + '__' + campo_modelo.target_field.attname]
+        elif isinstance(campo, serializers.ModelField):
+            # ModelField (CloudinaryField) lee el valor del objeto con value_from_object
+            plan.append((campo.field_name, _campo_modelo(campo, columna, campo_modelo.attname)))
+            columnas.append(columna)
+        elif isinstance(campo, RelatedField):
+            if not campo.use_pk_only_optimization():
+                return None
+            plan.append((campo.field_name, _clave_primaria(campo, columna)))
+            columnas.append(columna)
+        elif isinstance(campo, serializers.FileField):
+            plan.append((campo.field_name, _fichero(campo, columna, campo_modelo)))
+            columnas.append(columna)
+        elif isinstance(campo, (serializers.SerializerMethodField, serializers.HiddenField)) or campo_modelo.is_relation:
+            return None
+        else:
+            plan.append((campo.field_name, _simple(campo, columna)))
+            columnas.append(columna)
+
+    return ConstructorFilas(plan, list(dict.fromkeys(columnas)))
+
+
+def _simple(campo, columna):
+    def representar(fila):
+        valor = fila[columna]
+        return None if valor is None else campo.to_representation(valor)
+    return representar
+
+
+def _clave_primaria(campo, columna):
+    def representar(fila):
+        valor = fila[columna]
+        return None if valor is None else campo.to_representation(PKOnlyObject(pk=valor))
+    return representar
+
+
+def _campo_modelo(campo, columna, attname):
+    def representar(fila):
+        return campo.to_representation(SimpleNamespace(**{attname: fila[columna]}))
+    return representar
+
+
+def _fichero(campo, columna, campo_modelo):
+    def representar(fila):
+        return campo.to_representation(campo_modelo.attr_class(None, campo_modelo, fila[columna]))
+    return representar
+
+
+def _anidado(constructor, columna_pk):
+    def representar(fila):
+        return None if fila[columna_pk] is None else constructor(fila)
+    return representar
+
+
+class ListadoRapidoMixin:
+    """
+    Mixin para ViewSets de solo lectura en el listado: si ``SERIALIZACION_RAPIDA``
+    está activo y el serializer se puede compilar, ``list`` consulta con
+    ``values()`` y construye el JSON con :class:`ConstructorFilas`. En otro caso
+    se usa el ``list`` normal de DRF.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not settings.SERIALIZACION_RAPIDA:
+            return super().list(request, *args, **kwargs)
+
+        constructor = compilar(self.get_serializer())
+        if constructor is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset()).values(*constructor.columnas)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(constructor.construir(page))
+        return Response(constructor.construir(queryset))
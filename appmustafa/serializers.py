@@ -29,6 +29,13 @@ class NoticiaSerializer(serializers.ModelSerializer):
         model = Noticia
         fields = '__all__'  # Serializa todos los campos del modelo
 
+# --------------- SERIALIZADOR RESUMIDO DE NOTICIAS (slim) ------------------
+
+class NoticiaSlimSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Noticia
+        fields = ['id', 'titulo', 'fecha_publicacion', 'imagen']  # Lo necesario para la portada
+
 # --------------------- SERIALIZADOR DE COMENTARIOS --------------------------
 
 MAX_NIVEL_RESPUESTA = 3  # Límite de profundidad en respuestas anidadas
@@ -53,22 +60,27 @@ class ComentarioSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         # Controla que no se exceda el máximo de niveles de respuestas permitidos
+        # (depth ya viene guardado en el padre: no hace falta recorrer sus ascendientes)
         parent = data.get('parent')
-        nivel = 1
-        while parent:
-            nivel += 1
-            if nivel > MAX_NIVEL_RESPUESTA:
-                raise serializers.ValidationError(
-                    f"No se permite responder más allá del nivel {MAX_NIVEL_RESPUESTA}."
-                )
-            parent = parent.parent
+        if parent is not None and parent.depth + 2 > MAX_NIVEL_RESPUESTA:
+            raise serializers.ValidationError(
+                f"No se permite responder más allá del nivel {MAX_NIVEL_RESPUESTA}."
+            )
         return data
 
     # Retorna las respuestas al comentario actual (anidamiento)
     def get_respuestas(self, obj):
-        if obj.respuestas.exists():
-            return ComentarioSerializer(obj.respuestas.all().order_by('fecha_hora'), many=True).data
-        return []
+        # Si el hilo ya viene cargado en memoria (ver agrupar_respuestas), no se consulta la base de datos
+        respuestas_por_padre = self.context.get('respuestas_por_padre')
+        if respuestas_por_padre is None:
+            # Si no, se carga todo el subárbol del comentario de una vez por su path
+            respuestas_por_padre = agrupar_respuestas(
+                obj.descendientes().select_related('usuario', 'noticia', 'parent')
+            )
+        return ComentarioSerializer(
+            respuestas_por_padre.get(obj.id, []), many=True,
+            context={'respuestas_por_padre': respuestas_por_padre}
+        ).data
 
     # Obtiene el nombre de usuario del autor
     def get_usuario_username(self, obj):
@@ -97,6 +109,14 @@ class ComentarioSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("El comentario no puede estar vacío.")
         return value
 
+# Agrupa los comentarios ya cargados de un hilo por su padre, ordenando las respuestas por fecha
+def agrupar_respuestas(comentarios):
+    respuestas_por_padre = {}
+    for comentario in sorted(comentarios, key=lambda c: (c.fecha_hora, c.id)):
+        if comentario.parent_id is not None:
+            respuestas_por_padre.setdefault(comentario.parent_id, []).append(comentario)
+    return respuestas_por_padre
+
 # --------------- SERIALIZADOR RESUMIDO DE ANIMALES (slim) ------------------
 
 class AnimalSlimSerializer(serializers.ModelSerializer):
@@ -133,12 +153,13 @@ class UsuarioSerializer(serializers.ModelSerializer):
         model = User
         fields = [
             'id', 'username', 'email', 'first_name', 'last_name',
-            'password', 'foto_perfil', 'recibir_novedades', 'is_staff'
+            'password', 'foto_perfil', 'recibir_novedades', 'frecuencia_novedades', 'is_staff'
         ]
         read_only_fields = ['is_staff']
         extra_kwargs = {
             'password': {'write_only': True},
             'recibir_novedades': {'required': False},
+            'frecuencia_novedades': {'required': False},
             'foto_perfil': {'required': False},
         }
 
@@ -222,3 +243,30 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
         if not any(c.isdigit() for c in value):
             raise serializers.ValidationError("La contraseña debe contener al menos un número.")
         return value
+
+# ------------------ SERIALIZADORES DE SUBIDA DIRECTA ------------------
+
+# Para pedir la autorización de una subida directa al almacenamiento
+class FirmarSubidaSerializer(serializers.Serializer):
+    destino = serializers.ChoiceField(choices=['animal', 'usuario', 'adopcion'])
+    id = serializers.IntegerField(required=False)  # Objeto al que se adjunta (animal o adopción existentes)
+    animal_id = serializers.IntegerField(required=False)  # Nueva solicitud de adopción para este animal
+
+    def validate(self, data):
+        if 'animal_id' in data and data['destino'] != 'adopcion':
+            raise serializers.ValidationError("animal_id solo se usa con destino adopcion.")
+        if data['destino'] == 'usuario' and 'id' in data:
+            raise serializers.ValidationError("La foto de perfil es siempre la del usuario autenticado: no indiques id.")
+        if data['destino'] == 'animal' and 'id' not in data:
+            raise serializers.ValidationError("Indica el id del animal.")
+        if data['destino'] == 'adopcion' and ('id' in data) == ('animal_id' in data):
+            raise serializers.ValidationError("Indica el id de la adopción o el animal_id de una nueva solicitud.")
+        return data
+
+# Para confirmar la subida con la respuesta firmada del almacenamiento
+class ConfirmarSubidaSerializer(serializers.Serializer):
+    token = serializers.CharField()
+    public_id = serializers.CharField()
+    version = serializers.CharField()
+    signature = serializers.CharField()
+    format = serializers.CharField(required=False)  # Solo imágenes
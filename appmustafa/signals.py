@@ -1,9 +1,14 @@
 from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.conf import settings
+from django.db import transaction
 from django.contrib.auth import get_user_model
-from .models import Animal, Noticia, Adopcion
+from .models import Animal, Noticia, Adopcion, Comentario, EventoNovedad
+from .serializers import ComentarioSerializer
 from appmustafa.utils.email import enviar_email_html
+from appmustafa.utils.imagenes import normalizar_campo
+from appmustafa.utils.eventos import canal_comentarios
+from appmustafa.utils.portada import programar_reconstruccion
 import cloudinary.uploader
 
 User = get_user_model()
@@ -12,6 +17,21 @@ DEFAULT_IMAGEN_ANIMAL = 'pexels-leonardo-de-oliveira-872270-1770918_yp2wtl'
 DEFAULT_IMAGEN_USUARIO = 'default_wtx8r7'
 DEFAULT_IMAGEN_NOTICIA = 'pexels-bekka419-804475_gpv7j8'
 
+# -----------------------------
+# NORMALIZACIÓN DE IMÁGENES
+# -----------------------------
+# Se conectan antes que el resto de pre_save: la imagen ya está reducida cuando CloudinaryField la sube
+@receiver(pre_save, sender=Animal)
+@receiver(pre_save, sender=Noticia)
+def normalizar_imagen_subida(sender, instance, **kwargs):
+    normalizar_campo(instance, 'imagen')
+
+
+@receiver(pre_save, sender=User)
+def normalizar_foto_perfil(sender, instance, **kwargs):
+    normalizar_campo(instance, 'foto_perfil')
+
+
 # -----------------------------
 # MANEJO DE ARCHIVOS OBSOLETOS
 # -----------------------------
@@ -91,6 +111,54 @@ def eliminar_pdf_adopcion(sender, instance, **kwargs):
         cloudinary.uploader.destroy(public_id, resource_type='raw', invalidate=True)
 
 
+# --------------------------------
+# PORTADA PRECALCULADA (api/inicio/)
+# --------------------------------
+# Las adopciones cuentan porque una adopción aceptada saca al animal de la portada
+@receiver(post_save, sender=Animal)
+@receiver(post_delete, sender=Animal)
+@receiver(post_save, sender=Noticia)
+@receiver(post_delete, sender=Noticia)
+@receiver(post_save, sender=Adopcion)
+@receiver(post_delete, sender=Adopcion)
+def actualizar_portada(sender, instance, **kwargs):
+    programar_reconstruccion()
+
+
+# --------------------------------
+# EVENTOS DE COMENTARIOS (SSE)
+# --------------------------------
+# Se publican al confirmar la transacción, para no anunciar cambios que luego se deshacen
+def publicar_eventos(noticia_id):
+    # Los streams solo se sirven en el perfil ASGI; en los workers WSGI nadie leería el buffer
+    return settings.SERVIDOR_ASGI and canal_comentarios.tiene_interes(noticia_id)
+
+
+@receiver(post_save, sender=Comentario)
+def publicar_comentario_guardado(sender, instance, created, **kwargs):
+    if not publicar_eventos(instance.noticia_id):
+        return
+
+    def publicar():
+        comentario = Comentario.objects.select_related('usuario', 'noticia', 'parent').filter(pk=instance.pk).first()
+        if comentario is None:
+            return
+        # Las respuestas llegan en sus propios eventos
+        datos = ComentarioSerializer(comentario, context={'respuestas_por_padre': {}}).data
+        datos.pop('respuestas')
+        canal_comentarios.publicar(instance.noticia_id, 'creado' if created else 'editado', datos)
+
+    transaction.on_commit(publicar)
+
+
+@receiver(post_delete, sender=Comentario)
+def publicar_comentario_eliminado(sender, instance, **kwargs):
+    if not publicar_eventos(instance.noticia_id):
+        return
+    datos = {'id': instance.pk, 'parent': instance.parent_id}
+    transaction.on_commit(lambda: canal_comentarios.publicar(instance.noticia_id, 'eliminado', datos))
+
+
 # --------------------------------
 # NOTIFICACIONES POR CORREO
 # --------------------------------
@@ -164,7 +232,9 @@ def notificar_adopcion_admin(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Animal)
 def notificar_nuevo_animal(sender, instance, created, **kwargs):
     if created:
-        usuarios = User.objects.filter(recibir_novedades=True)
+        # Para los resúmenes diarios y semanales; el correo inmediato solo a quien lo prefiere
+        EventoNovedad.objects.create(animal=instance)
+        usuarios = User.objects.filter(recibir_novedades=True, frecuencia_novedades='inmediata')
 
         imagen_url = (
             f"{settings.CLOUDINARY_BASE_URL}{instance.imagen.public_id}.jpg"
@@ -193,7 +263,8 @@ def notificar_nuevo_animal(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Noticia)
 def notificar_nueva_noticia(sender, instance, created, **kwargs):
     if created:
-        usuarios = User.objects.filter(recibir_novedades=True)
+        EventoNovedad.objects.create(noticia=instance)
+        usuarios = User.objects.filter(recibir_novedades=True, frecuencia_novedades='inmediata')
 
         imagen_url = (
             f"{settings.CLOUDINARY_BASE_URL}{instance.imagen.public_id}.jpg"
@@ -0,0 +1,22 @@
+from django.utils.functional import LazyObject
+
+
+class RawMediaCloudinaryStoragePerezoso(LazyObject):
+    """
+    ``RawMediaCloudinaryStorage`` que no importa ``cloudinary_storage`` (y con
+    él ``requests``) hasta que se usa por primera vez, para que arrancar un
+    worker o un comando no pague ese coste. Sube los ficheros por trozos (ver
+    cloudinary_streaming.py).
+    """
+
+    def _setup(self):
+        from .utils.cloudinary_streaming import RawMediaCloudinaryStorageStreaming
+        self._wrapped = RawMediaCloudinaryStorageStreaming()
+
+    # FileField evalúa ``storage or default_storage``: sin esto se cargaría al definir el modelo
+    def __bool__(self):
+        return True
+
+    # Para las migraciones es el mismo storage de siempre, así que no generan cambios
+    def deconstruct(self):
+        return ('cloudinary_storage.storage.RawMediaCloudinaryStorage', (), {})
@@ -1,13 +1,48 @@
 # Importaciones necesarias para pruebas, autenticación y manejo de archivos
+import asyncio
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
-from datetime import date
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+import gzip
+import json
+import os
+import shutil
+import smtplib
+import socketserver
+import tempfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+from unittest import mock
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import get_connection, send_mail
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+from auditlog.models import LogEntry
+from django.db import connection, transaction
+from django.db.models.signals import pre_save
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 # Modelos del sistema relacionados con animales, adopciones, comentarios y noticias
-from .models import Animal, Adopcion, Comentario, Noticia
+from .models import Animal, Adopcion, Comentario, EventoNovedad, Noticia
+from .audit import auditoria_en_buffer
+from .db_router import RouterReplicas, _caidas, activar_replica, desactivar_replica, marcar_caida
+from .middleware import ReplicaLecturaMiddleware
+from .serializers import ComentarioSerializer
+from .utils.carga import _call_api_local
+from .utils.eventos import canal_comentarios
+from .utils.imagenes import normalizar_imagen
+from .utils.portada import construir_portada
+from .utils.smtp import _circuito, _pool, guardar_en_bandeja, vaciar_bandeja
 
 # Obtener el modelo de usuario activo del proyecto
 User = get_user_model()
@@ -71,7 +106,7 @@ class AnimalesMasquefaTests(APITestCase):
     def test_prevenir_adopcion_duplicada(self):
         # Verifica que un usuario no pueda enviar dos solicitudes de adopción para el mismo animal
         url = reverse('adopcion-list')
-        contenido = SimpleUploadedFile("testfile.pdf", b"file_content", content_type="application/pdf")
+        contenido = SimpleUploadedFile("testfile.pdf", b"%PDF-1.4 file_content", content_type="application/pdf")
 
         data = {
             'animal_id': self.animal.id,
@@ -85,7 +120,7 @@ class AnimalesMasquefaTests(APITestCase):
         self.assertEqual(response1.status_code, status.HTTP_201_CREATED)
 
         # Segundo intento con otro archivo PDF para el mismo animal y usuario: debe fallar
-        contenido2 = SimpleUploadedFile("testfile2.pdf", b"otro_contenido", content_type="application/pdf")
+        contenido2 = SimpleUploadedFile("testfile2.pdf", b"%PDF-1.4 otro_contenido", content_type="application/pdf")
         data['contenido'] = contenido2
         response2 = self.client.post(url, data, format='multipart', **self.auth_header)
         print("Segunda respuesta:", response2.data)
@@ -114,3 +149,1179 @@ class AnimalesMasquefaTests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, {'detail': 'Login exitoso'})
+
+
+# Pruebas del comando de benchmark de endpoints
+class BenchmarkEndpointsTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='Admin1234')
+        Animal.objects.create(nombre='Pelusa', fecha_nacimiento=date(2020, 1, 1), situacion='En acogida')
+        noticia = Noticia.objects.create(titulo='Noticia', contenido='Contenido', fecha_publicacion=date.today())
+        Comentario.objects.create(noticia=noticia, usuario=self.admin, contenido='Hola')
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+
+    def test_genera_resultados_y_detecta_regresiones(self):
+        salida = os.path.join(self.directorio, 'resultado.json')
+        baseline = os.path.join(self.directorio, 'baseline.json')
+        opciones = {'iteraciones': 2, 'calentamiento': 0, 'salida': salida, 'baseline': baseline, 'stdout': StringIO()}
+
+        call_command('benchmark_endpoints', guardar_baseline=True, **opciones)
+        with open(salida, encoding='utf-8') as f:
+            resultados = json.load(f)
+        self.assertEqual(
+            set(resultados['endpoints']),
+            {'animales', 'comentarios_noticia', 'adopciones', 'admin_dashboard'}
+        )
+        for metricas in resultados['endpoints'].values():
+            self.assertEqual(metricas['status'], 200)
+            self.assertGreater(metricas['bytes'], 0)
+
+        # Un baseline con menos consultas obliga a marcar la regresión
+        resultados['endpoints']['animales']['consultas'] = 0
+        resultados['endpoints']['animales']['p50_ms'] = 0.0001
+        with open(baseline, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f)
+        with self.assertRaises(CommandError):
+            call_command('benchmark_endpoints', **opciones)
+
+
+# Pruebas del middleware de instrumentación SQL
+class InstrumentacionSQLTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='Admin1234')
+        Animal.objects.create(nombre='Pelusa', fecha_nacimiento=date(2020, 1, 1), situacion='En acogida')
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+
+    def test_server_timing_solo_para_staff(self):
+        response = self.client.get(reverse('animal-list'))
+        self.assertNotIn('Server-Timing', response)
+
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.admin).access_token)
+        response = self.client.get(reverse('animal-list'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ consultas", total;dur=[\d.]+$')
+
+    def test_consultas_lentas_en_jsonl(self):
+        ruta = os.path.join(self.directorio, 'sql_lento.jsonl')
+        with self.settings(SQL_LENTO_UMBRAL_MS=0, SQL_LENTO_LOG=ruta):
+            self.client.get(reverse('animal-list'))
+
+        with open(ruta, encoding='utf-8') as f:
+            entradas = [json.loads(linea) for linea in f]
+        self.assertTrue(entradas)
+        self.assertEqual(entradas[0]['vista'], 'animal-list')
+        self.assertIn('appmustafa_animal', entradas[0]['sql'])
+
+
+# Pruebas del endpoint de métricas de Prometheus
+class MetricasTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='Admin1234')
+
+    def test_metricas_restringidas(self):
+        self.client.get(reverse('animal-list'))
+
+        response = self.client.get(reverse('metricas'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.admin).access_token)
+        response = self.client.get(reverse('metricas'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(
+            'appmustafa_peticion_duracion_segundos_count{accion="list",estado="200",metodo="GET",vista="AnimalViewSet"}',
+            response.content.decode()
+        )
+
+    def test_metricas_desde_ip_permitida(self):
+        with self.settings(METRICAS_IPS_PERMITIDAS=['127.0.0.1']):
+            response = self.client.get(reverse('metricas'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+# Pruebas del perfilado bajo demanda
+class PerfiladoTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='Admin1234')
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+
+    def test_perfila_solo_peticiones_de_staff(self):
+        with self.settings(PERFILES_DIR=self.directorio, PERFILES_MAX=1):
+            response = self.client.get(reverse('animal-list'), HTTP_X_PERFILAR='cpu')
+            self.assertNotIn('X-Perfil', response)
+
+            self.client.cookies['access_token'] = str(RefreshToken.for_user(self.admin).access_token)
+            self.client.get(reverse('animal-list'), HTTP_X_PERFILAR='cpu')
+            response = self.client.get(reverse('animal-list'), HTTP_X_PERFILAR='cpu,memoria')
+            identificador = response['X-Perfil']
+
+            # Solo se conserva el perfil más reciente
+            self.assertEqual(
+                sorted(os.listdir(self.directorio)),
+                sorted(f'{identificador}.{extension}' for extension in ['json', 'prof', 'cpu.txt', 'memoria.txt'])
+            )
+
+            self.client.force_login(self.admin)
+            response = self.client.get(reverse('perfiles-admin'))
+            self.assertContains(response, f'{identificador}.prof')
+            response = self.client.get(reverse('perfiles-admin-fichero', args=[f'{identificador}.cpu.txt']))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+# Pruebas de las vistas asíncronas de lectura
+class LecturaAsyncTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='lector', email='lector@example.com', password='Lector1234')
+        Animal.objects.create(nombre='Pelusa', fecha_nacimiento=date(2020, 1, 1), situacion='En acogida')
+        Animal.objects.create(nombre='Tizón', fecha_nacimiento=date(2018, 5, 3), situacion='En la protectora')
+        self.noticia = Noticia.objects.create(titulo='Noticia', contenido='Contenido', fecha_publicacion=date.today())
+        raiz = Comentario.objects.create(noticia=self.noticia, usuario=self.user, contenido='Primero')
+        respuesta = Comentario.objects.create(noticia=self.noticia, usuario=self.user, contenido='Respuesta', parent=raiz)
+        Comentario.objects.create(noticia=self.noticia, usuario=self.user, contenido='Otra', parent=respuesta)
+
+    def test_mismo_json_que_los_viewsets(self):
+        animal = Animal.objects.first()
+        pares = [
+            (reverse('animal-list'), reverse('async-animal-list')),
+            (reverse('animal-detail', args=[animal.id]), reverse('async-animal-detail', args=[animal.id])),
+            (reverse('noticia-list'), reverse('async-noticia-list')),
+            (reverse('noticia-detail', args=[self.noticia.id]), reverse('async-noticia-detail', args=[self.noticia.id])),
+            (
+                reverse('comentario-list') + f'?noticia={self.noticia.id}',
+                reverse('async-comentario-list') + f'?noticia={self.noticia.id}',
+            ),
+        ]
+        for url_sync, url_async in pares:
+            esperado = self.client.get(url_sync)
+            obtenido = self.client.get(url_async)
+            self.assertEqual(obtenido.status_code, status.HTTP_200_OK)
+            self.assertEqual(obtenido.content, esperado.content)
+
+        self.assertEqual(self.client.get(reverse('async-animal-detail', args=[0])).status_code, status.HTTP_404_NOT_FOUND)
+
+
+# Pruebas del esquema OpenAPI pregenerado
+class EsquemaApiTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', email='admin@example.com', password='Admin1234', is_staff=True)
+
+    def test_esquema_versionado_al_dia(self):
+        call_command('generar_esquema_api', '--comprobar', stdout=StringIO())
+
+    def test_swagger_sirve_el_fichero_pregenerado(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        with self.settings(ESQUEMA_API_DIR=directorio):
+            with open(os.path.join(directorio, 'openapi-v1.json'), 'w') as fichero:
+                fichero.write('{"pregenerado": true}')
+
+            # Sin sesión de staff redirige al login del admin
+            self.assertEqual(self.client.get('/swagger/?format=openapi').status_code, status.HTTP_302_FOUND)
+
+            self.client.force_login(self.admin)
+            response = self.client.get('/swagger/?format=openapi')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(json.loads(b''.join(response.streaming_content)), {'pregenerado': True})
+
+            # ?regenerar=1 introspecciona la API en vivo
+            response = self.client.get('/swagger/?format=openapi&regenerar=1')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn('/api/animales/', json.loads(response.content)['paths'])
+
+
+# Pruebas del listado rápido con values()
+class SerializacionRapidaTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='rapido', email='rapido@example.com', password='Rapido1234')
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.user).access_token)
+        pelusa = Animal.objects.create(nombre='Pelusa', fecha_nacimiento=date(2020, 1, 1), situacion='En acogida')
+        tizon = Animal.objects.create(nombre='Tizón', fecha_nacimiento=date(2018, 5, 3), situacion='En la protectora')
+        Noticia.objects.create(titulo='Noticia', contenido='Contenido', fecha_publicacion=date.today())
+        Adopcion.objects.create(animal=pelusa, usuario=self.user, contenido='adopciones/pdfs/solicitud.pdf')
+        Adopcion.objects.create(animal=tizon, usuario=self.user, contenido='adopciones/pdfs/otra.pdf', aceptada='Aceptada')
+
+    def test_mismo_json_que_los_serializers(self):
+        for url in [reverse('animal-list'), reverse('noticia-list'), reverse('adopcion-list')]:
+            with self.settings(SERIALIZACION_RAPIDA=False):
+                esperado = self.client.get(url)
+            with self.settings(SERIALIZACION_RAPIDA=True):
+                obtenido = self.client.get(url)
+            self.assertEqual(obtenido.status_code, status.HTTP_200_OK)
+            self.assertTrue(json.loads(obtenido.content))
+            self.assertEqual(obtenido.content, esperado.content)
+
+
+# Pruebas de la escritura de auditoría en buffer
+class AuditoriaBufferTests(APITestCase):
+
+    def test_entradas_en_un_solo_insert_al_final(self):
+
+        with CaptureQueriesContext(connection) as consultas:
+            with auditoria_en_buffer():
+                with self.captureOnCommitCallbacks(execute=True):
+                    animal = Animal.objects.create(nombre='Pelusa', fecha_nacimiento=date(2020, 1, 1), situacion='En acogida')
+                    animal.nombre = 'Pelusa II'
+                    animal.save()
+                # Un cambio cuya transacción se deshace no deja entrada
+                with self.assertRaises(ValueError), transaction.atomic():
+                    Noticia.objects.create(titulo='Borrador', contenido='-', fecha_publicacion=date.today())
+                    raise ValueError
+                self.assertFalse(LogEntry.objects.exists())
+
+        inserts = [q['sql'] for q in consultas.captured_queries if q['sql'].startswith('INSERT INTO "auditlog_logentry"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(LogEntry.objects.filter(object_pk=str(animal.pk)).count(), 2)
+        self.assertEqual(LogEntry.objects.count(), 2)
+
+    def test_last_login_no_se_audita(self):
+
+        user = User.objects.create_user(username='auditado', email='auditado@example.com', password='Auditado1234')
+        total = LogEntry.objects.count()
+        user.last_login = timezone.now()
+        user.save(update_fields=['last_login'])
+        self.assertEqual(LogEntry.objects.count(), total)
+
+
+# Pruebas del archivado de auditoría
+class ArchivarAuditoriaTests(APITestCase):
+
+    def test_archiva_y_borra_solo_las_antiguas(self):
+        for nombre in ['Antiguo 1', 'Antiguo 2', 'Reciente']:
+            Animal.objects.create(nombre=nombre, fecha_nacimiento=date(2020, 1, 1), situacion='En acogida')
+        LogEntry.objects.exclude(object_repr='Reciente').update(timestamp=timezone.now() - timedelta(days=400))
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+
+        call_command('archivar_auditoria', '--dias', '365', '--directorio', directorio, '--lote', '1', '--pausa', '0', stdout=StringIO())
+
+        ficheros = os.listdir(directorio)
+        self.assertEqual(len(ficheros), 1)
+        with gzip.open(os.path.join(directorio, ficheros[0]), 'rt', encoding='utf-8') as fichero:
+            archivadas = [json.loads(linea) for linea in fichero]
+        self.assertEqual(sorted(e['object_repr'] for e in archivadas), ['Antiguo 1', 'Antiguo 2'])
+        self.assertEqual(list(LogEntry.objects.values_list('object_repr', flat=True)), ['Reciente'])
+
+
+# Pruebas de la exportación en streaming
+class ExportacionTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='Admin1234')
+        self.user = User.objects.create_user(username='lector', email='lector@example.com', password='Lector1234')
+        noticia = Noticia.objects.create(titulo='Noticia', contenido='Contenido', fecha_publicacion=date.today())
+        Comentario.objects.create(noticia=noticia, usuario=self.user, contenido='Hola, "mundo"')
+        Comentario.objects.create(noticia=noticia, usuario=self.admin, contenido='Otro')
+
+    def test_exportacion_csv_y_jsonl(self):
+        url = reverse('exportar', args=['comentarios'])
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.user).access_token)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.admin).access_token)
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        lineas = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lineas[0], 'id,noticia_id,noticia,usuario_id,usuario,parent_id,fecha_hora,contenido')
+        self.assertIn('lector,,', lineas[1])
+        self.assertTrue(lineas[1].endswith(',"Hola, ""mundo"""'))
+
+        response = self.client.get(url, {'formato': 'jsonl'})
+        filas = [json.loads(linea) for linea in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([fila['usuario'] for fila in filas], ['lector', 'admin'])
+
+        self.assertEqual(self.client.get(url, {'formato': 'xml'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse('exportar', args=['animales'])).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_accion_del_admin_exporta_la_seleccion(self):
+        self.client.force_login(self.admin)
+        seleccion = Comentario.objects.filter(contenido='Otro').values_list('pk', flat=True)
+        response = self.client.post(reverse('admin:appmustafa_comentario_changelist'), {
+            'action': 'exportar_jsonl', '_selected_action': list(seleccion),
+        })
+        filas = [json.loads(linea) for linea in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([fila['contenido'] for fila in filas], ['Otro'])
+
+
+# Pruebas de los listados del admin
+class AdminListadosTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='Admin1234')
+        self.noticia = Noticia.objects.create(titulo='Noticia', contenido='Contenido', fecha_publicacion=date.today())
+        self.client.force_login(self.admin)
+
+    def crear_registros(self, cantidad):
+        for _ in range(cantidad):
+            usuario = User.objects.create_user(username=f'usuario{User.objects.count()}', password='Usuario1234')
+            animal = Animal.objects.create(nombre='Pelusa', fecha_nacimiento=date(2020, 1, 1), situacion='En acogida')
+            Comentario.objects.create(noticia=self.noticia, usuario=usuario, contenido='Comentario')
+            Adopcion.objects.create(animal=animal, usuario=usuario, contenido='adopciones/pdfs/solicitud.pdf')
+
+    def consultas_listado(self, url, params=None):
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get(url, params or {}).status_code, status.HTTP_200_OK)
+        return len(consultas)
+
+    def test_consultas_constantes_en_los_listados(self):
+        listados = [
+            (reverse('admin:appmustafa_comentario_changelist'), None),
+            (reverse('admin:appmustafa_adopcion_changelist'), {'aceptada__exact': 'Pendiente'}),
+        ]
+        self.crear_registros(2)
+        pocas = [self.consultas_listado(url, params) for url, params in listados]
+        self.crear_registros(8)
+        muchas = [self.consultas_listado(url, params) for url, params in listados]
+        self.assertEqual(muchas, pocas)
+
+
+# Servidor SMTP mínimo para las pruebas del backend con pool
+class _ManejadorSMTP(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        self.server.conexiones += 1
+        self.wfile.write(b'220 prueba\r\n')
+        while linea := self.rfile.readline():
+            comando = linea[:4].upper()
+            if comando == b'DATA':
+                self.wfile.write(b'354 fin con .\r\n')
+                datos = b''
+                while (linea := self.rfile.readline()) not in (b'.\r\n', b''):
+                    datos += linea
+                self.server.mensajes.append(datos)
+            elif comando == b'QUIT':
+                self.wfile.write(b'221 adios\r\n')
+                return
+            self.wfile.write(b'250 ok\r\n')
+
+
+class _ServidorSMTPPrueba(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _ManejadorSMTP)
+        self.conexiones = 0
+        self.mensajes = []
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def parar(self):
+        self.shutdown()
+        self.server_close()
+
+
+# Pruebas del backend SMTP con pool, circuit breaker y bandeja de salida
+class SMTPPoolTests(APITestCase):
+
+    def setUp(self):
+        self.bandeja = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.bandeja, ignore_errors=True)
+        _pool.vaciar()
+        _circuito.reiniciar()
+        self.addCleanup(_pool.vaciar)
+        self.addCleanup(_circuito.reiniciar)
+
+    def ajustes(self, puerto, **extra):
+        return self.settings(
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=puerto, EMAIL_USE_TLS=False, EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='', EMAIL_TIMEOUT=2, EMAIL_BANDEJA_SALIDA_DIR=self.bandeja, **extra
+        )
+
+    def enviar(self):
+        send_mail('Asunto', 'Cuerpo', 'web@example.com', ['alguien@example.com'],
+                  connection=get_connection('appmustafa.utils.smtp.SMTPPoolBackend'))
+
+    def test_reutiliza_la_conexion(self):
+        servidor = _ServidorSMTPPrueba()
+        self.addCleanup(servidor.parar)
+        with self.ajustes(servidor.server_address[1]):
+            self.enviar()
+            self.enviar()
+        self.assertEqual(len(servidor.mensajes), 2)
+        self.assertEqual(servidor.conexiones, 1)
+
+    def test_bandeja_de_salida_con_el_servidor_caido(self):
+        caido = _ServidorSMTPPrueba()
+        puerto = caido.server_address[1]
+        caido.parar()
+
+        with self.ajustes(puerto, EMAIL_CIRCUITO_FALLOS=2, EMAIL_CIRCUITO_ESPERA=0):
+            for _ in range(3):
+                self.enviar()  # No lanza excepción: el correo queda en la bandeja
+            self.assertEqual(len(os.listdir(self.bandeja)), 3)
+            self.assertEqual(_circuito.estado, _circuito.ABIERTO)
+
+        servidor = _ServidorSMTPPrueba()
+        self.addCleanup(servidor.parar)
+        with self.ajustes(servidor.server_address[1], EMAIL_CIRCUITO_ESPERA=0):
+            call_command('enviar_bandeja_salida', stdout=StringIO())
+        self.assertEqual(os.listdir(self.bandeja), [])
+        self.assertEqual(len(servidor.mensajes), 3)
+        self.assertEqual(_circuito.estado, _circuito.CERRADO)
+
+    def test_el_intento_semiabierto_siempre_sale_de_semiabierto(self):
+        conexion = mock.Mock()
+        conexion.sendmail.side_effect = smtplib.SMTPRecipientsRefused({'alguien@example.com': (550, b'No existe')})
+        with self.ajustes(1, EMAIL_CIRCUITO_ESPERA=0), mock.patch.object(_pool, 'obtener', return_value=conexion), \
+                mock.patch('appmustafa.utils.smtp.vaciar_bandeja') as vaciar_bandeja:
+            for _ in range(3):
+                _circuito.fallo()
+            with self.assertRaises(smtplib.SMTPRecipientsRefused):
+                self.enviar()  # El intento semiabierto: el servidor responde aunque rechace al destinatario
+            self.assertEqual(_circuito.estado, _circuito.CERRADO)
+            self.assertTrue(_circuito.permite())
+
+            for _ in range(3):
+                _circuito.fallo()
+            conexion.sendmail.side_effect = ValueError('inesperado')
+            with self.assertRaises(ValueError):
+                self.enviar()
+            self.assertEqual(_circuito.estado, _circuito.ABIERTO)  # Vuelve a abrirse en lugar de quedarse bloqueado
+        self.assertEqual(vaciar_bandeja.call_count, 1)
+
+    def test_no_envia_los_mensajes_reclamados_por_otro_proceso(self):
+        servidor = _ServidorSMTPPrueba()
+        self.addCleanup(servidor.parar)
+        with self.ajustes(servidor.server_address[1]):
+            for destinatario in ('uno', 'dos', 'tres'):
+                guardar_en_bandeja('web@example.com', [f'{destinatario}@example.com'], b'Subject: Hola\r\n\r\nCuerpo')
+            primero, segundo, _ = sorted(Path(self.bandeja).iterdir())
+            os.rename(primero, primero.with_suffix('.enviando'))  # Otro worker lo está enviando ahora
+            caducado = segundo.with_suffix('.enviando')
+            os.rename(segundo, caducado)  # Reclamado por un proceso que murió hace rato
+            antiguo = time.time() - 3600
+            os.utime(caducado, (antiguo, antiguo))
+
+            self.assertEqual(vaciar_bandeja(), (2, 0))
+        self.assertEqual([p.name for p in Path(self.bandeja).iterdir()], [primero.with_suffix('.enviando').name])
+        self.assertEqual(len(servidor.mensajes), 2)
+
+
+# Pruebas de la posición de los comentarios en su hilo (root, depth y path)
+class HilosComentariosTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='hilo', email='hilo@example.com', password='Hilo1234')
+        self.noticia = Noticia.objects.create(titulo='Noticia', contenido='Contenido', fecha_publicacion=date.today())
+        self.raiz = self.comentar('Raíz')
+        self.respuesta = self.comentar('Respuesta', self.raiz)
+        self.nieto = self.comentar('Nieto', self.respuesta)
+
+    def comentar(self, contenido, parent=None):
+        return Comentario.objects.create(noticia=self.noticia, usuario=self.user, contenido=contenido, parent=parent)
+
+    def test_posicion_calculada_al_crear(self):
+        self.assertEqual((self.raiz.root_id, self.raiz.depth, self.raiz.path), (None, 0, ''))
+        self.assertEqual(self.nieto.root_id, self.raiz.id)
+        self.assertEqual(self.nieto.depth, 2)
+        self.assertEqual(self.nieto.path, f'{self.raiz.id:010d}/{self.respuesta.id:010d}/')
+        with self.assertNumQueries(1):
+            self.assertEqual(list(self.raiz.descendientes().order_by('pk')), [self.respuesta, self.nieto])
+
+    def test_nivel_maximo_sin_recorrer_ascendientes(self):
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.user).access_token)
+        url = reverse('comentario-list')
+        response = self.client.post(url, {'noticia': self.noticia.id, 'contenido': 'Demasiado', 'parent': self.nieto.id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('nivel', str(response.content))
+
+        serializer = ComentarioSerializer(data={'noticia': self.noticia.id, 'contenido': 'Vale', 'parent': self.respuesta.id})
+        self.assertTrue(serializer.is_valid())
+        self.assertEqual(serializer.save(usuario=self.user).depth, 2)
+
+    def test_cambio_de_padre_mueve_el_subarbol(self):
+        otra_raiz = self.comentar('Otra raíz')
+        self.respuesta.parent = otra_raiz
+        self.respuesta.save()
+        self.nieto.refresh_from_db()
+        self.assertEqual(self.nieto.root_id, otra_raiz.id)
+        self.assertEqual(self.nieto.depth, 2)
+        self.assertEqual(self.nieto.path, f'{otra_raiz.id:010d}/{self.respuesta.id:010d}/')
+        self.assertEqual(list(self.raiz.descendientes()), [])
+
+
+# Pruebas de la normalización de imágenes antes de subirlas
+class NormalizacionImagenesTests(APITestCase):
+
+    def foto_movil(self, ancho=3000, alto=2000):
+        from PIL import Image
+        imagen = Image.new('RGB', (ancho, alto), (200, 120, 40))
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientación EXIF: girada 90º
+        salida = BytesIO()
+        imagen.save(salida, format='JPEG', quality=98, exif=exif)
+        return SimpleUploadedFile('foto.jpg', salida.getvalue(), content_type='image/jpeg')
+
+    @override_settings(IMAGENES_LADO_MAXIMO=800, IMAGENES_FORMATO='WEBP')
+    def test_gira_reduce_y_recodifica(self):
+        from PIL import Image
+        original = self.foto_movil()
+        normalizada = normalizar_imagen(original)
+        self.assertEqual(normalizada.name, 'foto.webp')
+        self.assertLess(normalizada.size, original.size)
+        imagen = Image.open(normalizada)
+        self.assertEqual(imagen.format, 'WEBP')
+        self.assertEqual(imagen.size, (533, 800))
+
+    def test_signal_sustituye_la_subida(self):
+        animal = Animal(nombre='Pelusa', fecha_nacimiento=date(2020, 1, 1), situacion='En acogida', imagen=self.foto_movil())
+        pre_save.send(sender=Animal, instance=animal, raw=False, using='default', update_fields=None)
+        self.assertTrue(animal.imagen.name.endswith('.webp'))
+
+    def test_si_no_es_imagen_se_sube_el_original(self):
+        archivo = SimpleUploadedFile('foto.jpg', b'no es una imagen', content_type='image/jpeg')
+        self.assertIs(normalizar_imagen(archivo), archivo)
+
+
+# Pruebas de la validación por bloques de los PDF de adopción y de su subida por trozos
+class SubidaPdfTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()  # Throttling de creación de adopciones
+        self.user = User.objects.create_user(username='adoptante', email='adoptante@example.com', password='Adoptante1234')
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.user).access_token)
+        self.animal = Animal.objects.create(nombre='Pelusa', fecha_nacimiento=date(2020, 1, 1), situacion='En acogida')
+
+    def solicitar(self, datos, nombre='solicitud.pdf'):
+        contenido = SimpleUploadedFile(nombre, datos, content_type='application/pdf')
+        return self.client.post(reverse('adopcion-list'), {'animal_id': self.animal.id, 'contenido': contenido}, format='multipart')
+
+    # Todas se rechazan antes de llegar al storage (que necesitaría conexión con Cloudinary)
+    def test_pdf_falso_rechazado(self):
+        response = self.solicitar(b'MZ\x90\x00 esto no es un pdf')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('contenido', response.data)
+
+    @override_settings(ADOPCION_PDF_MAX_BYTES=1024)
+    def test_pdf_demasiado_grande(self):
+        response = self.solicitar(b'%PDF-1.4\n' + b'0' * 2048)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('MB', str(response.data['contenido']))
+
+    @override_settings(SUBIDA_MAX_BYTES=1024)
+    def test_subida_descartada_mientras_se_recibe(self):
+        response = self.solicitar(b'%PDF-1.4\n' + b'0' * 4096)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('contenido', response.data)
+        self.assertFalse(Adopcion.objects.exists())
+
+    def test_storage_sube_por_trozos(self):
+        from .utils.cloudinary_streaming import RawMediaCloudinaryStorageStreaming
+        trozos = []
+
+        def upload_large_part(archivo, http_headers=None, **options):
+            trozos.append((archivo[1], http_headers['Content-Range']))
+            return {'public_id': f"{options['folder']}/solicitud.pdf"}
+
+        datos = b'%PDF-1.4\n' + b'0' * 2500
+        with mock.patch('cloudinary.uploader.upload_large_part', upload_large_part), \
+                mock.patch('appmustafa.utils.cloudinary_streaming.TAMANO_TROZO', 1024):
+            nombre = RawMediaCloudinaryStorageStreaming().save('adopciones/1/solicitud.pdf', SimpleUploadedFile('solicitud.pdf', datos))
+
+        self.assertEqual(nombre, 'media/adopciones/1/solicitud.pdf')
+        self.assertEqual(b''.join(trozo for trozo, _ in trozos), datos)
+        self.assertEqual([rango for _, rango in trozos], ['bytes 0-1023/2509', 'bytes 1024-2047/2509', 'bytes 2048-2508/2509'])
+
+
+# Pruebas de las subidas directas al almacenamiento (firma, subida y confirmación)
+@override_settings(SUBIDA_DIRECTA_BACKEND='local')
+class SubidaDirectaTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.user = User.objects.create_user(username='directo', email='directo@example.com', password='Directo1234')
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.user).access_token)
+        self.animal = Animal.objects.create(nombre='Pelusa', fecha_nacimiento=date(2020, 1, 1), situacion='En acogida')
+
+    def subir(self, datos_firma, contenido):
+        firma = self.client.post(reverse('subida-firmar'), datos_firma)
+        self.assertEqual(firma.status_code, status.HTTP_200_OK)
+        self.assertEqual(firma.data['metodo'], 'PUT')
+        with self.settings(MEDIA_ROOT=self.media):
+            subida = self.client.put(firma.data['url'], contenido, content_type='application/octet-stream')
+        return firma.data['token'], subida
+
+    def test_foto_de_perfil(self):
+        token, subida = self.subir({'destino': 'usuario'}, b'imagen')
+        self.assertEqual(subida.status_code, 200)
+        respuesta = subida.json()
+        self.assertTrue(os.path.exists(os.path.join(self.media, respuesta['public_id'])))
+
+        confirmacion = self.client.post(reverse('subida-confirmar'), {'token': token, 'format': 'webp', **respuesta})
+        self.assertEqual(confirmacion.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.foto_perfil.public_id, respuesta['public_id'])
+
+    def test_nueva_adopcion_con_pdf(self):
+        token, subida = self.subir({'destino': 'adopcion', 'animal_id': self.animal.id}, b'%PDF-1.4 solicitud')
+        respuesta = subida.json()
+        self.assertTrue(respuesta['public_id'].startswith(f'media/adopciones/{self.user.id}/'))
+
+        confirmacion = self.client.post(reverse('subida-confirmar'), {'token': token, **respuesta})
+        self.assertEqual(confirmacion.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Adopcion.objects.get(usuario=self.user).contenido.name, respuesta['public_id'])
+
+        # El mismo animal no se puede volver a pedir
+        self.assertEqual(
+            self.client.post(reverse('subida-firmar'), {'destino': 'adopcion', 'animal_id': self.animal.id}).status_code,
+            status.HTTP_403_FORBIDDEN,
+        )
+
+    def test_pdf_falso_rechazado_al_subir(self):
+        _, subida = self.subir({'destino': 'adopcion', 'animal_id': self.animal.id}, b'no es un pdf')
+        self.assertEqual(subida.status_code, 400)
+
+    def test_firma_no_valida(self):
+        token, subida = self.subir({'destino': 'usuario'}, b'imagen')
+        respuesta = {**subida.json(), 'signature': '0' * 40}
+        confirmacion = self.client.post(reverse('subida-confirmar'), {'token': token, 'format': 'webp', **respuesta})
+        self.assertEqual(confirmacion.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_solo_el_personal_cambia_animales(self):
+        response = self.client.post(reverse('subida-firmar'), {'destino': 'animal', 'id': self.animal.id})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_campos_que_no_corresponden_al_destino(self):
+        for datos in (
+            {'destino': 'usuario', 'animal_id': self.animal.id},  # Saltaría la comprobación de personal de 'animal'
+            {'destino': 'animal', 'id': self.animal.id, 'animal_id': self.animal.id},
+            {'destino': 'usuario', 'id': self.animal.id},
+        ):
+            response = self.client.post(reverse('subida-firmar'), datos)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, datos)
+
+    @override_settings(SUBIDA_DIRECTA_BACKEND='cloudinary')
+    def test_cloudinary_firma_y_verificacion(self):
+        import cloudinary
+        import cloudinary.utils
+
+        self.user.is_staff = True
+        self.user.save()
+        firma = self.client.post(reverse('subida-firmar'), {'destino': 'animal', 'id': self.animal.id}).data
+        campos = firma['campos']
+        self.assertTrue(firma['url'].endswith('/image/upload'))
+        self.assertEqual(campos['format'], 'webp')
+        firmados = {k: v for k, v in campos.items() if k not in ('signature', 'api_key')}
+        self.assertEqual(campos['signature'], cloudinary.utils.api_sign_request(firmados, cloudinary.config().api_secret))
+
+        # Respuesta de Cloudinary a la subida, firmada con el secreto de la cuenta
+        version = '1712345678'
+        respuesta = {
+            'public_id': campos['public_id'],
+            'version': version,
+            'signature': cloudinary.utils.api_sign_request({'public_id': campos['public_id'], 'version': version}, cloudinary.config().api_secret),
+        }
+        confirmacion = self.client.post(reverse('subida-confirmar'), {'token': firma['token'], 'format': 'webp', **respuesta})
+        self.assertEqual(confirmacion.status_code, status.HTTP_200_OK)
+        self.animal.refresh_from_db()
+        self.assertEqual(self.animal.imagen.public_id, campos['public_id'])
+
+
+# Pruebas del reparto de lecturas entre primaria y réplicas. La "réplica" es la propia base de datos
+# de pruebas ('default'): lo que se comprueba es qué alias devuelve el router en cada caso. Sin
+# transacción de por medio, porque dentro de una transacción el router siempre lee de la primaria.
+@override_settings(REPLICAS_BD=['default'], DATABASE_ROUTERS=['appmustafa.db_router.RouterReplicas'])
+class ReplicasLecturaTests(APITransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(_caidas.clear)
+        self.user = User.objects.create_user(username='lectora', email='lectora@example.com', password='Lectora1234')
+        self.noticia = Noticia.objects.create(titulo='Noticia', contenido='Contenido', fecha_publicacion=date.today())
+        Animal.objects.create(nombre='Pelusa', fecha_nacimiento=date(2020, 1, 1), situacion='En acogida')
+
+    # Alias que el router devuelve para cada lectura de la petición (None = primaria)
+    def lecturas(self, metodo, url, datos=None):
+        elegidos = []
+        original = RouterReplicas.db_for_read
+
+        def db_for_read(router, model, **hints):
+            alias = original(router, model, **hints)
+            elegidos.append(alias)
+            return alias
+
+        with mock.patch.object(RouterReplicas, 'db_for_read', db_for_read):
+            response = getattr(self.client, metodo)(url, datos)
+        return response, set(elegidos)
+
+    def test_catalogo_en_la_replica(self):
+        for url in (reverse('animal-list'), reverse('async-noticia-list')):
+            response, elegidos = self.lecturas('get', url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(elegidos, {'default'})
+
+    def test_vistas_no_marcadas_en_la_primaria(self):
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.user).access_token)
+        response, elegidos = self.lecturas('get', reverse('user-profile'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(elegidos, {None})
+
+    def test_tras_escribir_se_lee_de_la_primaria(self):
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.user).access_token)
+        # Petición cross-site, como las del frontend (CORS con credenciales)
+        response = self.client.post(
+            reverse('comentario-list'), {'noticia': self.noticia.id, 'contenido': 'Hola'},
+            headers={'Origin': 'https://frontend.example.org', 'Sec-Fetch-Site': 'cross-site'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        cookie = response.cookies[ReplicaLecturaMiddleware.COOKIE_PRIMARIA]
+        # Con SameSite=Lax el navegador no la enviaría en las XHR cross-site del frontend
+        self.assertEqual(cookie['samesite'], 'None')
+        self.assertTrue(cookie['secure'])
+
+        _, elegidos = self.lecturas('get', reverse('comentario-list'), {'noticia': self.noticia.id})
+        self.assertEqual(elegidos, {None})
+
+    def test_replica_caida(self):
+        marcar_caida('default')
+        response, elegidos = self.lecturas('get', reverse('animal-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(elegidos, {None})
+
+
+# Prueba de humo del comando de prueba de carga (servidor local, correo en memoria y Cloudinary local)
+class PruebaCargaTests(APITransactionTestCase):
+
+    def setUp(self):
+        Animal.objects.create(nombre='Pelusa', fecha_nacimiento=date(2020, 1, 1), situacion='En acogida')
+        Noticia.objects.create(titulo='Noticia', contenido='Contenido', fecha_publicacion=date.today())
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+
+    def test_informa_por_paso_y_limpia_las_cuentas(self):
+        real = User.objects.create_user(username='carga_0', email='carga@example.com', password='Real12345', is_active=False)
+        salida = os.path.join(self.directorio, 'carga.json')
+        call_command(
+            'prueba_carga', usuarios=2, duracion=1, sin_limites=True,
+            escenarios='adoptar', salida=salida, stdout=StringIO(),
+        )
+        with open(salida, encoding='utf-8') as f:
+            resultados = json.load(f)
+
+        self.assertGreater(resultados['peticiones'], 0)
+        self.assertIn('login/token', resultados['pasos'])
+        for metricas in resultados['pasos'].values():
+            self.assertEqual(metricas['errores'], 0)
+            self.assertIsNotNone(metricas['p95_ms'])
+        self.assertEqual(resultados['pasos']['adoptar/solicitud']['estados'], {'201': 2})
+        # Borra solo sus cuentas: la que ya existía con el mismo prefijo sigue intacta
+        self.assertEqual(list(User.objects.filter(username__startswith='carga_')), [real])
+        real.refresh_from_db()
+        self.assertTrue(real.check_password('Real12345'))
+        self.assertFalse(real.is_active)
+
+
+# Portada precalculada (api/inicio/): se sirve sin consultas y se reconstruye al cambiar el catálogo
+class PortadaTests(APITestCase):
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        ajustes = override_settings(PORTADA_TAMANO=2, CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'portada': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directorio, 'TIMEOUT': 60},
+        })
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.user = User.objects.create_user(username='portada', email='portada@example.com', password='Portada1234')
+        self.pelusa = Animal.objects.create(nombre='Pelusa', fecha_nacimiento=date(2020, 1, 1), situacion='En acogida')
+        self.tizon = Animal.objects.create(nombre='Tizón', fecha_nacimiento=date(2018, 5, 3), situacion='En la protectora')
+        Noticia.objects.create(titulo='Antigua', contenido='Contenido', fecha_publicacion=date(2024, 1, 1))
+        Noticia.objects.create(titulo='Reciente', contenido='Contenido', fecha_publicacion=date(2025, 1, 1))
+
+    def test_sin_consultas_una_vez_construida(self):
+        self.assertEqual(self.client.get(reverse('inicio')).status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('inicio'))
+
+        datos = json.loads(response.content)
+        self.assertEqual([a['nombre'] for a in datos['animales']], ['Tizón', 'Pelusa'])
+        self.assertEqual(set(datos['animales'][0]), {'id', 'nombre', 'imagen'})
+        self.assertEqual([n['titulo'] for n in datos['noticias']], ['Reciente', 'Antigua'])
+
+    def test_se_reconstruye_al_cambiar_el_catalogo(self):
+        self.client.get(reverse('inicio'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            nuevo = Animal.objects.create(nombre='Canela', fecha_nacimiento=date(2022, 2, 2), situacion='En acogida')
+            Adopcion.objects.create(animal=self.tizon, usuario=self.user, contenido='adopciones/pdfs/tizon.pdf', aceptada='Aceptada')
+
+        with self.assertNumQueries(0):
+            datos = json.loads(self.client.get(reverse('inicio')).content)
+        self.assertEqual([a['id'] for a in datos['animales']], [nuevo.id, self.pelusa.id])
+
+    @override_settings(REPLICAS_BD=['replica_1'], DATABASE_ROUTERS=['appmustafa.db_router.RouterReplicas'])
+    def test_se_construye_desde_la_primaria(self):
+        activar_replica('replica_1')
+        self.addCleanup(desactivar_replica)
+        with mock.patch.object(RouterReplicas, 'db_for_read', return_value='replica_1') as db_for_read:
+            datos = json.loads(construir_portada())
+        db_for_read.assert_not_called()
+        self.assertEqual([a['nombre'] for a in datos['animales']], ['Tizón', 'Pelusa'])
+
+
+# Eventos de comentarios por SSE: publicación desde los hooks del modelo y reanudación con Last-Event-ID
+class EventosComentariosTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='sse', email='sse@example.com', password='Sse12345')
+        self.noticia = Noticia.objects.create(titulo='Noticia', contenido='Contenido', fecha_publicacion=date.today())
+        self.url = reverse('noticia-comentarios-eventos', args=[self.noticia.id])
+        # El canal vive en memoria del proceso y los ids de noticia se repiten entre pruebas
+        canal_comentarios.reiniciar()
+        self.addCleanup(canal_comentarios.reiniciar)
+
+    def seguir(self):
+        # Un cliente que se conecta al stream y se desconecta: la noticia queda con interés
+        async def conectar_y_salir():
+            suscripcion, _, _ = canal_comentarios.suscribir(self.noticia.id)
+            canal_comentarios.cancelar(self.noticia.id, suscripcion)
+
+        asyncio.run(conectar_y_salir())
+
+    @override_settings(SERVIDOR_ASGI=True)
+    def test_hooks_publican_cambios_al_confirmar(self):
+        self.seguir()
+        with self.captureOnCommitCallbacks(execute=True):
+            comentario = Comentario.objects.create(noticia=self.noticia, usuario=self.user, contenido='Hola')
+        with self.captureOnCommitCallbacks(execute=True):
+            comentario.contenido = 'Hola de nuevo'
+            comentario.save()
+        comentario_id = comentario.id
+        with self.captureOnCommitCallbacks(execute=True):
+            comentario.delete()
+
+        eventos = canal_comentarios.eventos(self.noticia.id)
+        self.assertEqual([e.tipo for e in eventos], ['creado', 'editado', 'eliminado'])
+        self.assertEqual(json.loads(eventos[1].datos)['contenido'], 'Hola de nuevo')
+        self.assertNotIn('respuestas', json.loads(eventos[1].datos))
+        self.assertEqual(json.loads(eventos[2].datos), {'id': comentario_id, 'parent': None})
+
+    def test_no_publica_sin_asgi_ni_sin_nadie_siguiendo_la_noticia(self):
+        self.seguir()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Comentario.objects.create(noticia=self.noticia, usuario=self.user, contenido='En WSGI')  # Sin consulta ni serialización extra
+        self.assertEqual(callbacks, [])
+        with self.settings(SERVIDOR_ASGI=True):
+            otra = Noticia.objects.create(titulo='Otra', contenido='Contenido', fecha_publicacion=date.today())
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                Comentario.objects.create(noticia=otra, usuario=self.user, contenido='Nadie la sigue')
+        self.assertEqual(callbacks, [])
+        self.assertEqual(canal_comentarios.eventos(self.noticia.id), [])
+        self.assertEqual(canal_comentarios.eventos(otra.id), [])
+
+    def test_solo_en_asgi(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+    async def test_reanuda_y_recibe_en_directo(self):
+        primero = canal_comentarios.publicar(self.noticia.id, 'creado', {'id': 1})
+        segundo = canal_comentarios.publicar(self.noticia.id, 'creado', {'id': 2})
+
+        response = await self.async_client.get(self.url, headers={'Last-Event-ID': str(primero.id)})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        flujo = aiter(response.streaming_content)
+        self.assertTrue((await anext(flujo)).startswith(b'retry:'))
+        self.assertEqual(await anext(flujo), segundo.formatear().encode())
+
+        tercero = canal_comentarios.publicar(self.noticia.id, 'eliminado', {'id': 2, 'parent': None})
+        self.assertEqual(await anext(flujo), tercero.formatear().encode())
+
+        # Al desconectarse el cliente, el servidor ASGI cancela la tarea que espera el siguiente evento
+        espera = asyncio.ensure_future(anext(flujo))
+        await asyncio.sleep(0)
+        espera.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await espera
+        self.assertEqual(canal_comentarios.suscriptores(self.noticia.id), 0)
+
+    @override_settings(EVENTOS_BUFFER=2)
+    async def test_pide_recargar_si_el_buffer_ya_no_tiene_lo_perdido(self):
+        primero = canal_comentarios.publicar(self.noticia.id, 'creado', {'id': 1})
+        for numero in (2, 3):
+            ultimo = canal_comentarios.publicar(self.noticia.id, 'creado', {'id': numero})
+
+        response = await self.async_client.get(self.url, {'ultimo_id': primero.id - 1})
+        flujo = aiter(response.streaming_content)
+        await anext(flujo)
+        self.assertEqual(await anext(flujo), f'id: {ultimo.id}\nevent: recargar\ndata: {{}}\n\n'.encode())
+        await flujo.aclose()
+
+
+# Importación masiva de animales desde el admin (CSV + ZIP de fotos)
+@override_settings(IMAGENES_NORMALIZAR=False)
+class ImportacionAnimalesTests(APITestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='Admin1234')
+        User.objects.create_user(username='suscrita', email='suscrita@example.com', password='Suscrita1234', recibir_novedades=True)
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:appmustafa_animal_importar')
+
+    def foto(self):
+        from PIL import Image
+        salida = BytesIO()
+        Image.new('RGB', (40, 30), (200, 120, 40)).save(salida, format='PNG')
+        return salida.getvalue()
+
+    def ficheros(self, filas, fotos):
+        csv_ = SimpleUploadedFile('animales.csv', ('nombre;fecha_nacimiento;situacion;imagen\n' + filas).encode('utf-8'))
+        zip_ = BytesIO()
+        with zipfile.ZipFile(zip_, 'w') as z:
+            for nombre, datos in fotos.items():
+                z.writestr(nombre, datos)
+        return {'csv': csv_, 'fotos': SimpleUploadedFile('fotos.zip', zip_.getvalue())}
+
+    @override_settings(IMPORTACION_EN_SEGUNDO_PLANO=False)
+    def test_importa_con_un_solo_aviso(self):
+        ficheros = self.ficheros(
+            'Pelusa;2020-01-01;En acogida;pelusa.png\nTizón;03/05/2018;En la protectora;\n',
+            {'fotos/pelusa.png': self.foto()},
+        )
+        with mock.patch('cloudinary.uploader.call_api', _call_api_local), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, ficheros)
+
+        self.assertRedirects(response, reverse('admin:appmustafa_animal_changelist'))
+        pelusa, tizon = Animal.objects.order_by('pk')
+        self.assertTrue(pelusa.imagen.public_id.startswith('animales/'))
+        self.assertEqual(tizon.fecha_nacimiento, date(2018, 5, 3))
+        self.assertIsNotNone(tizon.edad)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('2 nuevos animales', mail.outbox[0].subject)
+
+    def test_valida_todo_antes_de_crear_nada(self):
+        ficheros = self.ficheros(
+            'Pelusa;2020-01-01;En acogida;pelusa.png\n'
+            'Sin fecha;ayer;En acogida;\n'
+            'Futuro;2999-01-01;En acogida;\n'
+            'Roto;2020-01-01;En acogida;roto.png\n'
+            'Perdido;2020-01-01;En acogida;perdido.png\n',
+            {'pelusa.png': self.foto(), 'roto.png': b'no es una imagen'},
+        )
+        with mock.patch('cloudinary.uploader.call_api') as call_api:
+            response = self.client.post(self.url, ficheros)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        errores = response.context['errores']
+        self.assertEqual([error.split(':')[0] for error in errores], ['Fila 3', 'Fila 4', 'Fila 5', 'Fila 6'])
+        self.assertIn('no está en el ZIP', errores[3])
+        self.assertFalse(Animal.objects.exists())
+        call_api.assert_not_called()
+
+    def test_en_segundo_plano_y_aviso_al_terminar(self):
+        ficheros = self.ficheros('Pelusa;2020-01-01;En acogida;pelusa.png\n', {'pelusa.png': self.foto()})
+        with mock.patch('appmustafa.utils.importacion.threading.Thread') as hilo, \
+                mock.patch('cloudinary.uploader.call_api') as call_api, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, ficheros)
+
+        # La petición responde sin subir nada; el ZIP se ha copiado porque el subido se borra al acabar
+        self.assertRedirects(response, reverse('admin:appmustafa_animal_changelist'))
+        call_api.assert_not_called()
+        self.assertFalse(Animal.objects.exists())
+        tarea = hilo.call_args.kwargs['target']
+        mail.outbox = []
+        with mock.patch('cloudinary.uploader.call_api', _call_api_local), \
+                mock.patch('appmustafa.utils.importacion.connections.close_all'), self.captureOnCommitCallbacks(execute=True):
+            tarea()
+
+        self.assertTrue(Animal.objects.get(nombre='Pelusa').imagen.public_id.startswith('animales/'))
+        avisos = {correo.to[0]: correo.subject for correo in mail.outbox}
+        self.assertEqual(avisos['admin@example.com'], 'Importación de animales: terminada')
+        self.assertIn('suscrita@example.com', avisos)
+
+
+# Resúmenes de novedades: un correo por suscriptor con lo pendiente desde su marca de agua
+class ResumenNovedadesTests(APITestCase):
+
+    def setUp(self):
+        self.diaria = User.objects.create_user(
+            username='diaria', email='diaria@example.com', password='Diaria1234',
+            recibir_novedades=True, frecuencia_novedades='diaria',
+        )
+        self.semanal = User.objects.create_user(
+            username='semanal', email='semanal@example.com', password='Semanal1234',
+            recibir_novedades=True, frecuencia_novedades='semanal',
+        )
+        User.objects.create_user(
+            username='inmediata', email='inmediata@example.com', password='Inmediata1234', recibir_novedades=True,
+        )
+
+    def resumen(self, **opciones):
+        mail.outbox = []
+        call_command('enviar_resumen_novedades', stdout=StringIO(), **opciones)
+        return {correo.to[0]: correo for correo in mail.outbox}
+
+    def test_un_correo_por_suscriptor_y_repetir_no_reenvia(self):
+        Animal.objects.create(nombre='Pelusa', fecha_nacimiento=date(2020, 1, 1), situacion='En acogida')
+        Noticia.objects.create(titulo='Jornada de puertas abiertas', contenido='Contenido', fecha_publicacion=date.today())
+        # Solo el suscriptor inmediato recibe un correo por novedad
+        self.assertEqual({correo.to[0] for correo in mail.outbox}, {'inmediata@example.com'})
+
+        enviados = self.resumen()
+        self.assertEqual(set(enviados), {'diaria@example.com', 'semanal@example.com'})
+        cuerpo = enviados['diaria@example.com'].alternatives[0][0]
+        self.assertIn('Pelusa', cuerpo)
+        self.assertIn('Jornada de puertas abiertas', cuerpo)
+        self.diaria.refresh_from_db()
+        self.assertEqual(self.diaria.resumen_ultimo_evento, EventoNovedad.objects.latest('pk').pk)
+
+        self.assertEqual(self.resumen(), {})
+        # Aunque se fuerce, ya no hay nada pendiente por encima de la marca de agua
+        self.assertEqual(self.resumen(forzar=True), {})
+
+    def test_respeta_el_periodo_de_cada_frecuencia(self):
+        Animal.objects.create(nombre='Pelusa', fecha_nacimiento=date(2020, 1, 1), situacion='En acogida')
+        self.resumen()
+        hace_dos_dias = timezone.now() - timedelta(days=2)
+        User.objects.filter(pk__in=[self.diaria.pk, self.semanal.pk]).update(resumen_enviado_en=hace_dos_dias)
+        EventoNovedad.objects.update(fecha=hace_dos_dias)
+        Animal.objects.create(nombre='Tizón', fecha_nacimiento=date(2018, 5, 3), situacion='En la protectora')
+
+        enviados = self.resumen()
+        self.assertEqual(set(enviados), {'diaria@example.com'})
+        self.assertIn('Tizón', enviados['diaria@example.com'].alternatives[0][0])
+        self.assertNotIn('Pelusa', enviados['diaria@example.com'].alternatives[0][0])
+
+    def test_un_dia_sin_cron_no_pierde_novedades(self):
+        Animal.objects.create(nombre='Pelusa', fecha_nacimiento=date(2020, 1, 1), situacion='En acogida')
+        self.resumen(frecuencia='diaria')
+        User.objects.filter(pk=self.diaria.pk).update(resumen_enviado_en=timezone.now() - timedelta(days=3))
+        Animal.objects.create(nombre='Tizón', fecha_nacimiento=date(2018, 5, 3), situacion='En la protectora')
+        # La ejecución que tocaba hace dos días no llegó a hacerse
+        EventoNovedad.objects.filter(animal__nombre='Tizón').update(fecha=timezone.now() - timedelta(days=2))
+        Animal.objects.create(nombre='Luna', fecha_nacimiento=date(2021, 2, 2), situacion='En acogida')
+
+        cuerpo = self.resumen(frecuencia='diaria')['diaria@example.com'].alternatives[0][0]
+        self.assertIn('Tizón', cuerpo)
+        self.assertIn('Luna', cuerpo)
+        self.assertNotIn('Pelusa', cuerpo)
+
+
+# Baja de cuentas: desactivación inmediata y borrado por lotes en segundo plano
+class BajaCuentaTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='baja', email='baja@example.com', password='Baja12345', recibir_novedades=True)
+        self.otro = User.objects.create_user(username='otro', email='otro@example.com', password='Otro12345')
+        self.noticia = Noticia.objects.create(titulo='Noticia', contenido='Contenido', fecha_publicacion=date.today())
+
+    def test_desactiva_en_el_acto_y_deja_el_borrado_para_despues(self):
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.user).access_token)
+        with mock.patch('appmustafa.utils.bajas.lanzar_baja') as lanzar_baja, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse('eliminar-cuenta'))
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(response.cookies['access_token'].value, '')
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertFalse(self.user.recibir_novedades)
+        self.assertIsNotNone(self.user.baja_solicitada)
+        lanzar_baja.assert_called_once_with(self.user.pk)  # El hilo que hará el borrado, al confirmar
+        self.assertTrue(User.objects.filter(pk=self.user.pk).exists())
+        self.assertEqual(self.client.get(reverse('user-profile')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(BAJAS_EN_SEGUNDO_PLANO=False)
+    def test_comando_borra_por_lotes_y_los_pdf_en_bloque(self):
+        propio = Comentario.objects.create(noticia=self.noticia, usuario=self.user, contenido='Mío')
+        respuesta_ajena = Comentario.objects.create(noticia=self.noticia, usuario=self.otro, contenido='Respuesta', parent=propio)
+        Comentario.objects.create(noticia=self.noticia, usuario=self.otro, contenido='Más abajo', parent=respuesta_ajena)
+        ajeno = Comentario.objects.create(noticia=self.noticia, usuario=self.otro, contenido='Ajeno')
+        Comentario.objects.create(noticia=self.noticia, usuario=self.user, contenido='Respondo', parent=ajeno)
+        for numero in range(3):
+            animal = Animal.objects.create(nombre=f'Animal {numero}', fecha_nacimiento=date(2020, 1, 1), situacion='En acogida')
+            Adopcion.objects.create(animal=animal, usuario=self.user, contenido=f'media/adopciones/{self.user.pk}/{numero}.pdf')
+        self.client.cookies['access_token'] = str(RefreshToken.for_user(self.user).access_token)
+        self.client.delete(reverse('eliminar-cuenta'))
+
+        with mock.patch('cloudinary.api.delete_resources') as delete_resources, \
+                mock.patch('cloudinary.uploader.destroy') as destroy:
+            call_command('procesar_bajas', minutos=0, lote=2, stdout=StringIO())
+
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertEqual(list(Comentario.objects.values_list('contenido', flat=True)), ['Ajeno'])
+        self.assertFalse(Adopcion.objects.exists())
+        delete_resources.assert_called_once_with(
+            [f'media/adopciones/{self.user.pk}/{numero}.pdf' for numero in range(3)], resource_type='raw', invalidate=True,
+        )
+        destroy.assert_not_called()  # Ni un destroy por adopción ni por la foto por defecto
+
+
+class MediaHuerfanaTests(APITestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        self.user = User.objects.create_user(username='media', email='media@example.com', password='Media12345')
+        self.animal = Animal.objects.create(
+            nombre='Pelusa', fecha_nacimiento=date(2020, 1, 1), situacion='En acogida', imagen='animales/usada',
+        )
+        Adopcion.objects.create(animal=self.animal, usuario=self.user, contenido=f'media/adopciones/{self.user.pk}/usada.pdf')
+
+    def crear(self, public_id, horas=48):
+        ruta = os.path.join(self.media, public_id)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'wb') as f:
+            f.write(b'x')
+        antiguedad = timezone.now().timestamp() - horas * 3600
+        os.utime(ruta, (antiguedad, antiguedad))
+        return ruta
+
+    def test_local_dry_run_y_borrado(self):
+        usada = self.crear('animales/usada')
+        pdf = self.crear(f'media/adopciones/{self.user.pk}/usada.pdf')
+        huerfana = self.crear('animales/huerfana')
+        pdf_huerfano = self.crear(f'media/adopciones/{self.user.pk}/huerfano.pdf')
+        reciente = self.crear('noticias/reciente', horas=1)  # Puede ser una subida aún sin confirmar
+        fuera = self.crear('otros/ajeno')  # Fuera de las carpetas de la aplicación
+
+        with self.settings(MEDIA_ROOT=self.media):
+            salida = StringIO()
+            call_command('limpiar_media_huerfana', origen='local', dry_run=True, pausa=0, stdout=salida)
+            self.assertIn('2 huérfanos encontrados', salida.getvalue())
+            self.assertTrue(os.path.exists(huerfana) and os.path.exists(pdf_huerfano))
+
+            call_command('limpiar_media_huerfana', origen='local', pausa=0, stdout=StringIO())
+
+        self.assertFalse(os.path.exists(huerfana) or os.path.exists(pdf_huerfano))
+        for ruta in (usada, pdf, reciente, fuera):
+            self.assertTrue(os.path.exists(ruta))
+
+    def test_cloudinary_pagina_borra_por_lotes_y_respeta_la_cuota(self):
+        antiguo = (timezone.now() - timedelta(days=3)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        paginas = {
+            None: {'resources': [{'public_id': 'animales/usada', 'created_at': antiguo}], 'next_cursor': 'c1'},
+            'c1': {'resources': [{'public_id': f'animales/h{n}', 'created_at': antiguo} for n in range(150)]},
+        }
+
+        def resources(**kwargs):
+            if kwargs['prefix'] == 'animales/':
+                return paginas[kwargs.get('next_cursor')]
+            return {'resources': []}
+
+        with mock.patch('cloudinary.api.resources', side_effect=resources) as listado, \
+                mock.patch('cloudinary.api.delete_resources', return_value={}) as delete_resources:
+            call_command('limpiar_media_huerfana', origen='cloudinary', pausa=0, stdout=StringIO())
+
+        self.assertEqual(listado.call_count, 6)  # Dos páginas de animales y una por cada otra carpeta
+        lotes = [llamada.args[0] for llamada in delete_resources.call_args_list]
+        self.assertEqual([len(lote) for lote in lotes], [100, 50])
+        self.assertNotIn('animales/usada', lotes[0] + lotes[1])
+
+        class Respuesta(dict):
+            rate_limit_remaining = 10
+
+        with mock.patch('cloudinary.api.resources', return_value=Respuesta(resources=[])) as listado, \
+                mock.patch('cloudinary.api.delete_resources') as delete_resources:
+            salida = StringIO()
+            call_command('limpiar_media_huerfana', origen='cloudinary', pausa=0, reserva=50, stdout=salida)
+        self.assertEqual(listado.call_count, 1)
+        delete_resources.assert_not_called()
+        self.assertIn('Se para aquí', salida.getvalue())
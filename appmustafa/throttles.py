@@ -1,13 +1,24 @@
 from rest_framework.throttling import UserRateThrottle
+from .utils.metricas import THROTTLE_RECHAZOS_TOTAL
+
+# Base común que contabiliza en las métricas cada petición rechazada por throttling
+class ThrottleConMetricas(UserRateThrottle):
+    def throttle_failure(self):
+        THROTTLE_RECHAZOS_TOTAL.labels(scope=self.scope).inc()
+        return super().throttle_failure()
 
 # Limita la cantidad de comentarios que un usuario puede crear
-class CrearComentarioThrottle(UserRateThrottle):
+class CrearComentarioThrottle(ThrottleConMetricas):
     scope = "comentario_creacion"
 
 # Limita cuántas solicitudes de adopción puede hacer un usuario
-class CrearAdopcionThrottle(UserRateThrottle):
+class CrearAdopcionThrottle(ThrottleConMetricas):
     scope = "adopcion_creacion"
 
 # Restringe la cantidad de intentos de inicio de sesión para evitar abusos
-class LoginThrottle(UserRateThrottle):
+class LoginThrottle(ThrottleConMetricas):
     scope = "login"
+
+# Límite general por usuario (por ejemplo, para solicitudes de reseteo de contraseña)
+class UsuarioRateThrottle(ThrottleConMetricas):
+    scope = "user"
@@ -8,9 +8,12 @@ from .views import (
     CookieTokenObtainPairView, CookieTokenRefreshView,
     protected_view, ProfileView,
     PasswordResetConfirmAPIView, RequestPasswordResetAPIView,
-    LogoutView, contacto_view, EliminarCuentaView
+    LogoutView, contacto_view, EliminarCuentaView, ExportacionView,
+    FirmarSubidaView, ConfirmarSubidaView, subida_local
 )
 
+from . import async_views
+
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -56,6 +59,27 @@ urlpatterns = [
     # Ruta para eliminar la cuenta del usuario autenticado
     path('usuarios/eliminar/', EliminarCuentaView.as_view(), name='eliminar-cuenta'),
 
+    # Exportación en streaming para el personal: ?formato=csv (por defecto) o jsonl
+    path('exportar/<str:recurso>/', ExportacionView.as_view(), name='exportar'),
+
+    # Subidas directas al almacenamiento: firma de parámetros, confirmación y sustituto local (desarrollo)
+    path('subidas/firmar/', FirmarSubidaView.as_view(), name='subida-firmar'),
+    path('subidas/confirmar/', ConfirmarSubidaView.as_view(), name='subida-confirmar'),
+    path('subidas/local/<str:token>/', subida_local, name='subida-local'),
+
+    # Lecturas públicas asíncronas (perfil ASGI): mismo JSON que los ViewSets equivalentes
+    path('async/animales/', async_views.animales_list, name='async-animal-list'),
+    path('async/animales/<int:pk>/', async_views.animales_detail, name='async-animal-detail'),
+    path('async/noticias/', async_views.noticias_list, name='async-noticia-list'),
+    path('async/noticias/<int:pk>/', async_views.noticias_detail, name='async-noticia-detail'),
+    path('async/comentarios/', async_views.comentarios_noticia, name='async-comentario-list'),
+
+    # Cambios de los comentarios de una noticia en tiempo real (Server-Sent Events, solo perfil ASGI)
+    path('noticias/<int:pk>/comentarios/eventos/', async_views.comentarios_eventos, name='noticia-comentarios-eventos'),
+
+    # Portada precalculada: últimos animales disponibles y últimas noticias en una sola petición
+    path('inicio/', async_views.inicio, name='inicio'),
+
     # Incluye todas las rutas generadas automáticamente por el router para los ViewSets
     path('', include(router.urls)),
 ]
@@ -0,0 +1,110 @@
+import logging
+import threading
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import Adopcion, Comentario, CustomUser
+from .portada import programar_reconstruccion
+
+logger = logging.getLogger(__name__)
+
+# Límite de public_ids por llamada a delete_resources de la API de Cloudinary
+LOTE_CLOUDINARY = 100
+
+
+def solicitar_baja(usuario):
+    """
+    Desactiva la cuenta en el acto (ya no puede autenticarse ni recibe
+    correos) y, al confirmar la transacción, borra sus datos en segundo plano.
+    """
+    usuario.is_active = False
+    usuario.recibir_novedades = False
+    usuario.baja_solicitada = timezone.now()
+    usuario.save(update_fields=['is_active', 'recibir_novedades', 'baja_solicitada'])
+    if settings.BAJAS_EN_SEGUNDO_PLANO:
+        transaction.on_commit(lambda: lanzar_baja(usuario.pk))
+
+
+def lanzar_baja(usuario_id):
+    def tarea():
+        try:
+            procesar_baja(usuario_id)
+        except Exception:
+            # El comando procesar_bajas la reintenta: la cuenta sigue marcada con baja_solicitada
+            logger.exception("No se pudo completar la baja del usuario %s", usuario_id)
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=tarea, name=f'baja-{usuario_id}', daemon=True).start()
+
+
+def procesar_baja(usuario_id, lote=None):
+    """
+    Borra comentarios (con las respuestas que cuelgan de ellos, como hacía
+    el CASCADE) y adopciones del usuario por lotes, con DELETE directos que
+    no cargan cada fila ni disparan sus señales, y después el propio usuario.
+    Los PDF de las adopciones se borran de Cloudinary en bloque al final.
+    Se puede repetir sin problema si se corta a medias.
+    """
+    close_old_connections()
+    lote = lote or settings.BAJAS_LOTE
+    usuario = CustomUser.objects.filter(pk=usuario_id, baja_solicitada__isnull=False).first()
+    if usuario is None:
+        return None
+
+    comentarios = borrar_comentarios(usuario_id, lote)
+    adopciones, pdfs, aceptadas = borrar_adopciones(usuario_id, lote)
+    if aceptadas:
+        # Sus animales vuelven a estar disponibles
+        programar_reconstruccion()
+    # Ya sin hijos, el borrado del usuario es barato (foto de perfil y auditoría vía sus señales)
+    usuario.delete()
+    borrar_pdfs(pdfs)
+    logger.info("Baja del usuario %s: %s comentarios y %s adopciones borrados", usuario_id, comentarios, adopciones)
+    return {'comentarios': comentarios, 'adopciones': adopciones, 'pdfs': len(pdfs)}
+
+
+def borrar_comentarios(usuario_id, lote):
+    borrados = 0
+    while True:
+        propios = list(Comentario.objects.filter(usuario_id=usuario_id).order_by('pk').only('pk', 'path')[:lote])
+        if not propios:
+            return borrados
+        # Los comentarios del lote y todo lo que cuelga de ellos (por su path), de las hojas hacia arriba
+        hilo = Q(pk__in=[c.pk for c in propios]) | reduce(or_, (Q(path__startswith=c.prefijo_respuestas) for c in propios))
+        ids = list(Comentario.objects.filter(hilo).order_by('-depth').values_list('pk', flat=True))
+        for inicio in range(0, len(ids), lote):
+            with transaction.atomic():
+                borrados += Comentario.objects.filter(pk__in=ids[inicio:inicio + lote])._raw_delete(DEFAULT_DB_ALIAS)
+
+
+def borrar_adopciones(usuario_id, lote):
+    borradas, pdfs, aceptadas = 0, [], False
+    while True:
+        filas = list(Adopcion.objects.filter(usuario_id=usuario_id).order_by('pk').values_list('pk', 'contenido', 'aceptada')[:lote])
+        if not filas:
+            return borradas, pdfs, aceptadas
+        with transaction.atomic():
+            borradas += Adopcion.objects.filter(pk__in=[pk for pk, _, _ in filas])._raw_delete(DEFAULT_DB_ALIAS)
+        pdfs.extend(contenido for _, contenido, _ in filas if contenido)
+        aceptadas = aceptadas or any(estado == 'Aceptada' for _, _, estado in filas)
+
+
+def borrar_pdfs(nombres):
+    """Borra los PDF de Cloudinary (recursos raw; el public_id es el nombre guardado) de 100 en 100."""
+    if not nombres:
+        return
+    import cloudinary.api
+
+    for inicio in range(0, len(nombres), LOTE_CLOUDINARY):
+        trozo = nombres[inicio:inicio + LOTE_CLOUDINARY]
+        try:
+            cloudinary.api.delete_resources(trozo, resource_type='raw', invalidate=True)
+        except Exception:
+            # Quedan huérfanos en Cloudinary, pero la baja en la base de datos ya está hecha
+            logger.exception("No se pudieron borrar %s PDF de adopciones de Cloudinary: %s", len(trozo), trozo)
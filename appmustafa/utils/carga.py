@@ -0,0 +1,283 @@
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from http.cookies import SimpleCookie
+from unittest import mock
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.test.utils import override_settings
+
+from .rendimiento import resumen_latencias
+
+# Peso de cada escenario al elegir qué hace un usuario virtual en cada vuelta
+ESCENARIOS = {
+    'catalogo': 50,   # Navegación anónima por animales y noticias
+    'hilos': 25,      # Lectura de una noticia y sus comentarios
+    'login': 5,       # Inicio de sesión (CookieTokenObtainPairView)
+    'comentar': 15,   # Comentario en una noticia (autenticado)
+    'adoptar': 5,     # Solicitud de adopción con PDF (autenticado)
+}
+
+PDF_PRUEBA = b'%PDF-1.4\n1 0 obj << /Type /Catalog >> endobj\ntrailer << /Root 1 0 R >>\n%%EOF\n'
+
+
+# ----------------------- Servidor y dobles locales -----------------------
+
+@contextmanager
+def servidor_local():
+    """Sirve la aplicación WSGI en 127.0.0.1 (puerto libre) con un hilo por petición."""
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+    from django.core.wsgi import get_wsgi_application
+
+    class ManejadorSilencioso(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadedWSGIServer(('127.0.0.1', 0), ManejadorSilencioso, allow_reuse_address=True)
+    servidor.set_app(get_wsgi_application())
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    try:
+        yield f'http://127.0.0.1:{servidor.server_port}'
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def _call_api_local(action, params, http_headers=None, return_error=False, unsigned=False, file=None, timeout=None, **options):
+    """Respuesta mínima de la API de subida de Cloudinary, sin salir a la red."""
+    carpeta = options.get('folder')
+    public_id = params.get('public_id') or options.get('public_id') or uuid.uuid4().hex
+    if carpeta and '/' not in public_id:
+        public_id = f'{carpeta}/{public_id}'
+    return {'public_id': public_id, 'version': int(time.time()), 'type': 'upload', 'resource_type': options.get('resource_type', 'image'), 'result': 'ok'}
+
+
+@contextmanager
+def dobles_locales(sin_limites=False):
+    """
+    Sustitutos locales para la prueba de carga en este proceso: correo en
+    memoria, llamadas a Cloudinary resueltas localmente y, opcionalmente, sin
+    throttling (para medir la aplicación y no los límites de uso).
+    """
+    import cloudinary.uploader
+    from django.core import mail
+
+    with ExitStack() as pila:
+        pila.enter_context(override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, '127.0.0.1'],
+        ))
+        pila.enter_context(mock.patch.object(cloudinary.uploader, 'call_api', _call_api_local))
+        if sin_limites:
+            from rest_framework.throttling import SimpleRateThrottle
+            pila.enter_context(mock.patch.object(SimpleRateThrottle, 'allow_request', lambda self, request, view: True))
+        try:
+            yield
+        finally:
+            mail.outbox = []
+
+
+# ----------------------- Cliente HTTP -----------------------
+
+class ClienteVirtual:
+    """Cliente HTTP mínimo (urllib) con sus propias cookies, como un navegador."""
+
+    def __init__(self, base, timeout=30):
+        self.base = base.rstrip('/')
+        self.timeout = timeout
+        self.cookies = {}
+
+    def peticion(self, metodo, ruta, json_=None, formulario=None, archivos=None):
+        cabeceras = {'Accept': 'application/json'}
+        cuerpo = None
+        if json_ is not None:
+            cuerpo = json.dumps(json_).encode('utf-8')
+            cabeceras['Content-Type'] = 'application/json'
+        elif formulario is not None or archivos:
+            cuerpo, cabeceras['Content-Type'] = multipart(formulario or {}, archivos or {})
+        if self.cookies:
+            # Las cookies de sesión se marcan Secure; en la prueba local se envían igualmente por HTTP
+            cabeceras['Cookie'] = '; '.join(f'{nombre}={valor}' for nombre, valor in self.cookies.items())
+
+        request = Request(self.base + ruta, data=cuerpo, headers=cabeceras, method=metodo)
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                contenido = response.read()
+                estado = response.status
+                self.guardar_cookies(response.headers.get_all('Set-Cookie') or [])
+        except HTTPError as error:
+            contenido = error.read()
+            estado = error.code
+        return estado, contenido
+
+    def guardar_cookies(self, cabeceras):
+        for cabecera in cabeceras:
+            cookie = SimpleCookie()
+            cookie.load(cabecera)
+            for nombre, morsel in cookie.items():
+                if morsel['max-age'] == '0' or not morsel.value:
+                    self.cookies.pop(nombre, None)
+                else:
+                    self.cookies[nombre] = morsel.value
+
+
+def multipart(campos, archivos):
+    limite = uuid.uuid4().hex
+    partes = []
+    for nombre, valor in campos.items():
+        partes.append(
+            f'--{limite}\r\nContent-Disposition: form-data; name="{nombre}"\r\n\r\n{valor}\r\n'.encode('utf-8')
+        )
+    for nombre, (fichero, datos, content_type) in archivos.items():
+        partes.append(
+            f'--{limite}\r\nContent-Disposition: form-data; name="{nombre}"; filename="{fichero}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode('utf-8') + datos + b'\r\n'
+        )
+    partes.append(f'--{limite}--\r\n'.encode('utf-8'))
+    return b''.join(partes), f'multipart/form-data; boundary={limite}'
+
+
+# ----------------------- Resultados -----------------------
+
+class Estadisticas:
+    """Latencias y códigos de respuesta por paso de escenario, compartidos entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = defaultdict(list)
+        self.estados = defaultdict(Counter)
+
+    def registrar(self, paso, latencia_ms, estado):
+        with self._lock:
+            self.latencias[paso].append(latencia_ms)
+            self.estados[paso][estado] += 1
+
+    def resumen(self, duracion):
+        pasos = {}
+        for paso in sorted(self.latencias):
+            latencias = self.latencias[paso]
+            estados = self.estados[paso]
+            pasos[paso] = {
+                'peticiones': len(latencias),
+                'rps': round(len(latencias) / duracion, 2) if duracion else None,
+                **resumen_latencias(latencias),
+                'errores': sum(total for estado, total in estados.items() if estado == 0 or estado >= 500),
+                'estados': {str(estado): total for estado, total in sorted(estados.items())},
+            }
+        total = sum(len(latencias) for latencias in self.latencias.values())
+        return {
+            'duracion_s': round(duracion, 3),
+            'peticiones': total,
+            'rps': round(total / duracion, 2) if duracion else None,
+            'pasos': pasos,
+        }
+
+
+# ----------------------- Usuarios virtuales -----------------------
+
+class UsuarioVirtual(threading.Thread):
+    """
+    Repite escenarios elegidos al azar (según ``ESCENARIOS``) hasta ``fin``
+    (time.monotonic). Cada usuario tiene su cuenta y sus cookies.
+    """
+
+    def __init__(self, base, cuenta, password, datos, estadisticas, fin, escenarios, pausa=0.0, semilla=None):
+        super().__init__(daemon=True)
+        self.cliente = ClienteVirtual(base)
+        self.cuenta = cuenta
+        self.password = password
+        self.datos = datos
+        self.estadisticas = estadisticas
+        self.fin = fin
+        self.escenarios = escenarios
+        self.pausa = pausa
+        self.azar = random.Random(semilla)
+        self.adoptados = set()
+
+    def run(self):
+        nombres = list(self.escenarios)
+        pesos = [ESCENARIOS[nombre] for nombre in nombres]
+        while time.monotonic() < self.fin:
+            escenario = self.azar.choices(nombres, weights=pesos)[0]
+            getattr(self, f'escenario_{escenario}')()
+            if self.pausa:
+                time.sleep(self.azar.uniform(0, self.pausa))
+
+    def paso(self, nombre, metodo, ruta, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            estado, contenido = self.cliente.peticion(metodo, ruta, **kwargs)
+        except (URLError, OSError):
+            estado, contenido = 0, b''
+        self.estadisticas.registrar(nombre, (time.perf_counter() - inicio) * 1000, estado)
+        return estado, contenido
+
+    def escenario_catalogo(self):
+        self.paso('catalogo/animales', 'GET', '/api/animales/')
+        self.paso('catalogo/animal', 'GET', f"/api/animales/{self.azar.choice(self.datos['animales'])}/")
+        self.paso('catalogo/noticias', 'GET', '/api/noticias/')
+
+    def escenario_hilos(self):
+        noticia = self.azar.choice(self.datos['noticias'])
+        self.paso('hilos/noticia', 'GET', f'/api/noticias/{noticia}/')
+        self.paso('hilos/comentarios', 'GET', f'/api/comentarios/?noticia={noticia}')
+
+    def escenario_login(self):
+        self.cliente.cookies.clear()
+        self.iniciar_sesion()
+
+    def iniciar_sesion(self):
+        if 'access_token' in self.cliente.cookies:
+            return True
+        estado, _ = self.paso('login/token', 'POST', '/api/token/', json_={'username': self.cuenta.username, 'password': self.password})
+        return estado == 200
+
+    def escenario_comentar(self):
+        if not self.iniciar_sesion():
+            return
+        noticia = self.azar.choice(self.datos['noticias'])
+        self.paso('comentar/crear', 'POST', '/api/comentarios/', json_={'noticia': noticia, 'contenido': 'Comentario de la prueba de carga'})
+        self.paso('comentar/hilo', 'GET', f'/api/comentarios/?noticia={noticia}')
+
+    def escenario_adoptar(self):
+        pendientes = [animal for animal in self.datos['animales'] if animal not in self.adoptados]
+        if not pendientes:
+            # Ya ha pedido todos los animales: sigue mirando el catálogo
+            return self.escenario_catalogo()
+        if not self.iniciar_sesion():
+            return
+        animal = self.azar.choice(pendientes)
+        estado, _ = self.paso(
+            'adoptar/solicitud', 'POST', '/api/adopciones/',
+            formulario={'animal_id': animal, 'usuario': self.cuenta.pk},
+            archivos={'contenido': ('solicitud.pdf', PDF_PRUEBA, 'application/pdf')},
+        )
+        if estado == 201:
+            self.adoptados.add(animal)
+        self.paso('adoptar/mis_adopciones', 'GET', '/api/adopciones/')
+
+
+def ejecutar_carga(base, cuentas, password, datos, duracion, escenarios, pausa=0.0, semilla=None):
+    """Lanza un usuario virtual por cuenta durante ``duracion`` segundos y devuelve el resumen."""
+    estadisticas = Estadisticas()
+    inicio = time.monotonic()
+    fin = inicio + duracion
+    usuarios = [
+        UsuarioVirtual(
+            base, cuenta, password, datos, estadisticas, fin, escenarios, pausa,
+            semilla=None if semilla is None else semilla + numero,
+        )
+        for numero, cuenta in enumerate(cuentas)
+    ]
+    for usuario in usuarios:
+        usuario.start()
+    for usuario in usuarios:
+        usuario.join()
+    return estadisticas.resumen(time.monotonic() - inicio)
@@ -0,0 +1,24 @@
+import cloudinary.uploader
+from cloudinary_storage.storage import RawMediaCloudinaryStorage
+
+# Tamaño de cada trozo enviado a Cloudinary (el mínimo que admite upload_large es 5 MB)
+TAMANO_TROZO = 6 * 1024 * 1024
+
+
+class RawMediaCloudinaryStorageStreaming(RawMediaCloudinaryStorage):
+    """
+    ``RawMediaCloudinaryStorage`` que sube el fichero por trozos con
+    ``upload_large`` en lugar de leerlo entero en memoria para un único POST.
+    """
+
+    def _upload(self, name, content):
+        options = {
+            'use_filename': True,
+            'resource_type': self._get_resource_type(name),
+            'tags': self.TAG,
+            'chunk_size': TAMANO_TROZO,
+        }
+        folder = name.rpartition('/')[0]
+        if folder:
+            options['folder'] = folder
+        return cloudinary.uploader.upload_large(content, **options)
@@ -5,6 +5,7 @@ from email.mime.image import MIMEImage
 from django.conf import settings
 from urllib.request import urlopen
 import mimetypes
+from appmustafa.utils.metricas import EMAILS_TOTAL, EMAILS_DURACION, medir
 
 def enviar_email_html(destinatario, asunto, plantilla, contexto, imagenes_inline=None):
     """
@@ -49,4 +50,5 @@ def enviar_email_html(destinatario, asunto, plantilla, contexto, imagenes_inline
             except Exception as e:
                 print(f"[Email] No se pudo adjuntar imagen '{cid}': {e}")
 
-    email.send(fail_silently=False)
+    with medir(EMAILS_TOTAL, EMAILS_DURACION, plantilla=plantilla):
+        email.send(fail_silently=False)
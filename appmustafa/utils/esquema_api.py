@@ -0,0 +1,44 @@
+from pathlib import Path
+
+from django.conf import settings
+
+# Versión de la API; forma parte del nombre de los ficheros del esquema pregenerado
+VERSION_API = 'v1'
+
+# Formatos de ?format= que piden el esquema (los de los renderers de drf_yasg): extensión y content type
+FORMATOS_ESQUEMA = {
+    'openapi': ('json', 'application/openapi+json'),
+    'json': ('json', 'application/json'),
+    'yaml': ('yaml', 'application/yaml'),
+}
+
+
+def info_api():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title="API AnimalesMasquefa",
+        default_version=VERSION_API,
+        description="Solo para admins 👑",
+        contact=openapi.Contact(email="admin@masquefa.com"),
+        license=openapi.License(name="MIT"),
+    )
+
+
+def ruta_esquema(extension):
+    return Path(settings.ESQUEMA_API_DIR) / f"openapi-{VERSION_API}.{extension}"
+
+
+def generar_esquema(request=None):
+    """Introspecciona todos los ViewSets y serializers y devuelve el objeto ``Swagger``."""
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    return OpenAPISchemaGenerator(info_api(), VERSION_API).get_schema(request=request, public=True)
+
+
+def codificar_esquema(esquema, extension):
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+
+    if extension == 'yaml':
+        return OpenAPICodecYaml(validators=[]).encode(esquema)
+    return OpenAPICodecJson(validators=[], pretty=True).encode(esquema)
@@ -0,0 +1,125 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Los ids de evento parten de la hora de arranque (ms) para que, tras reiniciar el proceso, un
+# Last-Event-ID antiguo siga siendo menor que los nuevos y se detecte el hueco
+PRIMER_ID = int(time.time() * 1000)
+_contador = itertools.count(PRIMER_ID)
+
+
+class Evento:
+    __slots__ = ('id', 'tipo', 'datos')
+
+    def __init__(self, id, tipo, datos):
+        self.id = id
+        self.tipo = tipo
+        self.datos = datos
+
+    def formatear(self):
+        """Bloque text/event-stream del evento."""
+        return f'id: {self.id}\nevent: {self.tipo}\ndata: {self.datos}\n\n'
+
+
+class Suscripcion:
+    """Cola asíncrona de un cliente conectado; se alimenta desde cualquier hilo."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.cola = asyncio.Queue()
+
+    def entregar(self, evento):
+        try:
+            self.loop.call_soon_threadsafe(self.cola.put_nowait, evento)
+        except RuntimeError:
+            # El bucle del cliente ya se cerró; se da de baja al terminar su respuesta
+            pass
+
+
+class CanalComentarios:
+    """
+    Pub/sub en memoria del proceso para los cambios de comentarios de cada
+    noticia. Guarda los últimos ``EVENTOS_BUFFER`` eventos de cada noticia
+    (buffer circular) para que un cliente que se reconecta con
+    ``Last-Event-ID`` reciba lo que se perdió.
+
+    Solo llegan los cambios hechos en este mismo proceso: el stream y las
+    escrituras de comentarios tienen que atenderse en el mismo proceso. Solo
+    se guardan eventos de las noticias que alguien ha seguido desde que
+    arrancó el proceso (``tiene_interes``).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self._buffers = {}
+            self._descartados = {}  # Id del último evento que salió del buffer de cada noticia
+            self._suscripciones = {}
+            self._interesadas = set()  # Noticias con alguna suscripción, aunque ya se haya cerrado
+
+    def tiene_interes(self, noticia_id):
+        # Tras una desconexión se sigue publicando para que la reconexión reciba lo que se perdió
+        return noticia_id in self._interesadas
+
+    def eventos(self, noticia_id):
+        with self._lock:
+            return list(self._buffers.get(noticia_id, ()))
+
+    def suscriptores(self, noticia_id):
+        with self._lock:
+            return len(self._suscripciones.get(noticia_id, ()))
+
+    def publicar(self, noticia_id, tipo, datos):
+        contenido = json.dumps(datos, cls=DjangoJSONEncoder, ensure_ascii=False)
+        with self._lock:
+            evento = Evento(next(_contador), tipo, contenido)
+            buffer = self._buffers.get(noticia_id)
+            if buffer is None:
+                buffer = self._buffers[noticia_id] = deque(maxlen=settings.EVENTOS_BUFFER)
+            if len(buffer) == buffer.maxlen:
+                self._descartados[noticia_id] = buffer[0].id
+            buffer.append(evento)
+            # Dentro del lock para que cada cliente reciba los eventos en orden de id
+            for suscripcion in self._suscripciones.get(noticia_id, ()):
+                suscripcion.entregar(evento)
+        return evento
+
+    def suscribir(self, noticia_id, ultimo_id=None):
+        """
+        Da de alta una suscripción en el bucle actual. Devuelve la suscripción,
+        los eventos posteriores a ``ultimo_id`` que siguen en el buffer y, si
+        se han perdido eventos que ya no están, el id con el que avisar al
+        cliente de que recargue el hilo (``None`` si no falta nada).
+        """
+        suscripcion = Suscripcion(asyncio.get_running_loop())
+        with self._lock:
+            self._suscripciones.setdefault(noticia_id, set()).add(suscripcion)
+            self._interesadas.add(noticia_id)
+            buffer = list(self._buffers.get(noticia_id, ()))
+            descartado = self._descartados.get(noticia_id, 0)
+        if ultimo_id is None:
+            return suscripcion, [], None
+        # El id es de antes de arrancar este proceso, o algún evento posterior ya salió del buffer
+        if ultimo_id < PRIMER_ID - 1 or descartado > ultimo_id:
+            return suscripcion, [], buffer[-1].id if buffer else PRIMER_ID - 1
+        return suscripcion, [evento for evento in buffer if evento.id > ultimo_id], None
+
+    def cancelar(self, noticia_id, suscripcion):
+        with self._lock:
+            suscripciones = self._suscripciones.get(noticia_id)
+            if suscripciones is not None:
+                suscripciones.discard(suscripcion)
+                if not suscripciones:
+                    del self._suscripciones[noticia_id]
+
+
+canal_comentarios = CanalComentarios()
@@ -0,0 +1,122 @@
+import csv
+import json
+from operator import attrgetter
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from ..models import Adopcion, Comentario, CustomUser
+
+# Filas que se leen de la base de datos por viaje (y que se escriben juntas en la respuesta).
+# En PostgreSQL, .iterator() usa un cursor de servidor, así que la memoria no depende del total.
+TAMANO_BLOQUE = 2000
+
+# Columnas de cada exportación: (cabecera, atributo del objeto; admite rutas con puntos)
+EXPORTACIONES = {
+    'adopciones': {
+        'queryset': lambda: Adopcion.objects.select_related('animal', 'usuario').order_by('pk'),
+        'columnas': [
+            ('id', 'id'),
+            ('animal_id', 'animal_id'),
+            ('animal', 'animal.nombre'),
+            ('usuario_id', 'usuario_id'),
+            ('usuario', 'usuario.username'),
+            ('email', 'usuario.email'),
+            ('fecha_hora', 'fecha_hora'),
+            ('estado', 'aceptada'),
+            ('contenido', 'contenido.name'),
+        ],
+    },
+    'comentarios': {
+        'queryset': lambda: Comentario.objects.select_related('noticia', 'usuario').order_by('pk'),
+        'columnas': [
+            ('id', 'id'),
+            ('noticia_id', 'noticia_id'),
+            ('noticia', 'noticia.titulo'),
+            ('usuario_id', 'usuario_id'),
+            ('usuario', 'usuario.username'),
+            ('parent_id', 'parent_id'),
+            ('fecha_hora', 'fecha_hora'),
+            ('contenido', 'contenido'),
+        ],
+    },
+    'usuarios': {
+        'queryset': lambda: CustomUser.objects.order_by('pk'),
+        'columnas': [
+            ('id', 'id'),
+            ('username', 'username'),
+            ('email', 'email'),
+            ('first_name', 'first_name'),
+            ('last_name', 'last_name'),
+            ('is_staff', 'is_staff'),
+            ('is_active', 'is_active'),
+            ('recibir_novedades', 'recibir_novedades'),
+            ('frecuencia_novedades', 'frecuencia_novedades'),
+            ('date_joined', 'date_joined'),
+            ('last_login', 'last_login'),
+        ],
+    },
+}
+
+FORMATOS_EXPORTACION = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+class _Eco:
+    """Pseudo-fichero para csv.writer: devuelve la línea en lugar de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def _filas(queryset, columnas):
+    extractores = [attrgetter(atributo) for _, atributo in columnas]
+    for objeto in queryset.iterator(chunk_size=TAMANO_BLOQUE):
+        yield [extractor(objeto) for extractor in extractores]
+
+
+def _por_bloques(lineas):
+    bloque = []
+    for linea in lineas:
+        bloque.append(linea)
+        if len(bloque) >= TAMANO_BLOQUE:
+            yield ''.join(bloque)
+            bloque = []
+    if bloque:
+        yield ''.join(bloque)
+
+
+def lineas_csv(queryset, columnas):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow([cabecera for cabecera, _ in columnas])
+    for fila in _filas(queryset, columnas):
+        yield escritor.writerow(['' if valor is None else valor for valor in fila])
+
+
+def lineas_jsonl(queryset, columnas):
+    cabeceras = [cabecera for cabecera, _ in columnas]
+    for fila in _filas(queryset, columnas):
+        yield json.dumps(dict(zip(cabeceras, fila)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def respuesta_exportacion(recurso, formato, queryset=None):
+    """
+    Devuelve una ``StreamingHttpResponse`` que va generando el CSV o JSONL de
+    ``recurso`` según se envía, sin cargar el queryset entero en memoria.
+    ``queryset`` permite exportar solo una selección (acciones del admin).
+    """
+    exportacion = EXPORTACIONES[recurso]
+    base = exportacion['queryset']()
+    # La selección del admin llega sin select_related: se reaplica sobre el queryset base
+    queryset = base if queryset is None else base.filter(pk__in=queryset.values('pk'))
+    generador = lineas_csv if formato == 'csv' else lineas_jsonl
+
+    response = StreamingHttpResponse(
+        _por_bloques(generador(queryset, exportacion['columnas'])),
+        content_type=FORMATOS_EXPORTACION[formato],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{recurso}-{timezone.now():%Y%m%d-%H%M}.{formato}"'
+    return response
@@ -0,0 +1,115 @@
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as TimeoutFuturo
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile, UploadedFile
+
+logger = logging.getLogger(__name__)
+
+# Formatos de salida admitidos: (formato de Pillow, extensión, content type)
+FORMATOS_IMAGEN = {
+    'WEBP': ('WEBP', '.webp', 'image/webp'),
+    'JPEG': ('JPEG', '.jpg', 'image/jpeg'),
+}
+
+
+def normalizar_bytes(datos, lado_maximo, formato, calidad):
+    """
+    Decodifica la imagen una sola vez, la gira según su orientación EXIF, la
+    reduce para que su lado mayor no pase de ``lado_maximo`` y la vuelve a
+    codificar. Se ejecuta en los procesos del pool. Devuelve ``None`` si los
+    bytes no son una imagen que Pillow sepa leer.
+    """
+    # Pillow solo se carga en los procesos que normalizan imágenes
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        imagen = Image.open(io.BytesIO(datos))
+        # En JPEG, draft() decodifica directamente a una escala reducida cercana al tamaño final
+        imagen.draft('RGB', (lado_maximo, lado_maximo))
+        imagen = ImageOps.exif_transpose(imagen)
+    except (UnidentifiedImageError, OSError):
+        return None
+
+    imagen.thumbnail((lado_maximo, lado_maximo), Image.Resampling.LANCZOS)
+    if formato == 'JPEG' or imagen.mode not in ('RGB', 'RGBA'):
+        imagen = imagen.convert('RGBA' if formato == 'WEBP' and 'A' in imagen.getbands() else 'RGB')
+
+    opciones = {'optimize': True, 'progressive': True} if formato == 'JPEG' else {'method': 4}
+    salida = io.BytesIO()
+    imagen.save(salida, format=formato, quality=calidad, **opciones)
+    return salida.getvalue()
+
+
+class PoolImagenes:
+    """
+    Pool de procesos, creado en su primer uso, donde se normalizan las
+    imágenes para no ocupar la CPU del hilo de la petición. Tras un fork
+    (workers de gunicorn) se crea uno nuevo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def enviar(self, *args):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # spawn: los procesos hijos no heredan hilos ni conexiones del proceso web
+                self._executor = ProcessPoolExecutor(
+                    max_workers=settings.IMAGENES_PROCESOS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+                self._pid = os.getpid()
+            return self._executor.submit(normalizar_bytes, *args)
+
+    def cerrar(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = PoolImagenes()
+
+
+def normalizar_imagen(archivo):
+    """
+    Devuelve una versión normalizada de ``archivo`` (un ``UploadedFile``)
+    lista para subir, o el propio ``archivo`` si no se puede procesar a
+    tiempo (``IMAGENES_TIMEOUT``), no es una imagen o el resultado no es más
+    pequeño que el original.
+    """
+    formato, extension, content_type = FORMATOS_IMAGEN[settings.IMAGENES_FORMATO]
+
+    archivo.seek(0)
+    datos = archivo.read()
+    archivo.seek(0)
+
+    futuro = _pool.enviar(datos, settings.IMAGENES_LADO_MAXIMO, formato, settings.IMAGENES_CALIDAD)
+    try:
+        normalizada = futuro.result(timeout=settings.IMAGENES_TIMEOUT)
+    except TimeoutFuturo:
+        futuro.cancel()
+        logger.warning("Normalización de %s cancelada por tiempo; se sube el original", archivo.name)
+        return archivo
+    except Exception:
+        logger.exception("No se pudo normalizar %s; se sube el original", archivo.name)
+        return archivo
+
+    if normalizada is None or len(normalizada) >= len(datos):
+        return archivo
+    return SimpleUploadedFile(Path(archivo.name).stem + extension, normalizada, content_type=content_type)
+
+
+def normalizar_campo(instance, campo):
+    """Sustituye el fichero recién subido de ``campo`` por su versión normalizada."""
+    valor = getattr(instance, campo)
+    if settings.IMAGENES_NORMALIZAR and isinstance(valor, UploadedFile):
+        setattr(instance, campo, normalizar_imagen(valor))
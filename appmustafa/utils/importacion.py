@@ -0,0 +1,304 @@
+import csv
+import logging
+import mimetypes
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import PurePosixPath
+
+import cloudinary.uploader
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections, transaction
+
+from ..models import Animal, EventoNovedad
+from ..signals import DEFAULT_IMAGEN_ANIMAL
+from .email import enviar_email_html
+from .imagenes import normalizar_imagen
+from .portada import programar_reconstruccion
+
+logger = logging.getLogger(__name__)
+
+# Columnas del CSV; "imagen" es el nombre de la foto dentro del ZIP (opcional: sin ella se usa la imagen por defecto)
+COLUMNAS = ('nombre', 'fecha_nacimiento', 'situacion', 'imagen')
+OBLIGATORIAS = ('nombre', 'fecha_nacimiento', 'situacion')
+FORMATOS_FECHA = ('%Y-%m-%d', '%d/%m/%Y')
+EXTENSIONES_IMAGEN = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
+
+
+class ImportacionNoValida(Exception):
+    """El CSV o el ZIP tienen errores; ``errores`` los recoge todos, no solo el primero."""
+
+    def __init__(self, errores):
+        super().__init__('; '.join(errores))
+        self.errores = errores
+
+
+# ----------------------- Validación -----------------------
+
+def leer_csv(archivo):
+    try:
+        texto = archivo.read().decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise ImportacionNoValida(["El CSV debe estar en UTF-8."])
+    try:
+        dialecto = csv.Sniffer().sniff(texto.split('\n', 1)[0], delimiters=',;')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.DictReader(texto.splitlines(), dialect=dialecto)
+    faltan = [columna for columna in OBLIGATORIAS if columna not in (lector.fieldnames or [])]
+    if faltan:
+        raise ImportacionNoValida([f"Faltan columnas en el CSV: {', '.join(faltan)}."])
+    return lector
+
+
+def indice_zip(archivo):
+    """Abre el ZIP y devuelve el ZipFile y sus ficheros por nombre (sin carpetas)."""
+    try:
+        zip_ = zipfile.ZipFile(archivo)
+    except zipfile.BadZipFile:
+        raise ImportacionNoValida(["El fichero de fotos no es un ZIP válido."])
+    fotos, repetidas = {}, set()
+    for info in zip_.infolist():
+        if info.is_dir() or info.filename.startswith('__MACOSX/'):
+            continue
+        nombre = PurePosixPath(info.filename).name
+        if nombre in fotos:
+            repetidas.add(nombre)
+        fotos[nombre] = info
+    return zip_, fotos, repetidas
+
+
+def comprobar_foto(zip_, info):
+    """Mensaje de error de la foto, o ``None`` si se puede subir."""
+    from PIL import Image, UnidentifiedImageError
+
+    if PurePosixPath(info.filename).suffix.lower() not in EXTENSIONES_IMAGEN:
+        return "no es una imagen (jpg, png, webp o gif)"
+    if info.file_size > settings.SUBIDA_MAX_BYTES:
+        return f"supera {settings.SUBIDA_MAX_BYTES // (1024 * 1024)} MB"
+    try:
+        with zip_.open(info) as f:
+            Image.open(f).verify()
+    except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError, zipfile.BadZipFile):
+        return "no se puede leer como imagen"
+    return None
+
+
+def leer_fecha(valor):
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            continue
+    return None
+
+
+def validar_importacion(archivo_csv, archivo_zip=None):
+    """
+    Comprueba todo el CSV y todas las fotos antes de crear nada. Devuelve
+    los animales (sin guardar) con la foto de cada uno (``ZipInfo`` o
+    ``None``) y el ZIP abierto; si hay errores lanza ``ImportacionNoValida``
+    con todos ellos.
+    """
+    lector = leer_csv(archivo_csv)
+    zip_, fotos, repetidas = indice_zip(archivo_zip) if archivo_zip else (None, {}, set())
+    comprobadas = {}
+    errores = []
+    filas = []
+
+    for numero, fila in enumerate(lector, start=2):  # La línea 1 es la cabecera
+        if len(filas) >= settings.IMPORTACION_MAX_FILAS:
+            errores.append(f"El CSV supera el máximo de {settings.IMPORTACION_MAX_FILAS} animales.")
+            break
+        valores = {columna: (fila.get(columna) or '').strip() for columna in COLUMNAS}
+        errores_fila = []
+
+        fecha = leer_fecha(valores['fecha_nacimiento'])
+        if fecha is None:
+            errores_fila.append(f"fecha_nacimiento «{valores['fecha_nacimiento']}» no es AAAA-MM-DD ni DD/MM/AAAA")
+        animal = Animal(nombre=valores['nombre'], fecha_nacimiento=fecha, situacion=valores['situacion'])
+        try:
+            if fecha is None:
+                # Animal.clean() compara la fecha: sin ella solo se validan los demás campos
+                animal.clean_fields(exclude=['imagen', 'fecha_nacimiento'])
+            else:
+                animal.full_clean(exclude=['imagen'])
+        except ValidationError as error:
+            for campo, mensajes in error.message_dict.items():
+                prefijo = '' if campo == '__all__' else f'{campo}: '
+                errores_fila.extend(prefijo + mensaje for mensaje in mensajes)
+
+        foto = None
+        if valores['imagen']:
+            nombre = valores['imagen']
+            if zip_ is None:
+                errores_fila.append(f"la foto «{nombre}» necesita el ZIP de fotos")
+            elif nombre not in fotos:
+                errores_fila.append(f"la foto «{nombre}» no está en el ZIP")
+            elif nombre in repetidas:
+                errores_fila.append(f"hay varias fotos «{nombre}» en el ZIP")
+            else:
+                foto = fotos[nombre]
+                if nombre not in comprobadas:
+                    comprobadas[nombre] = comprobar_foto(zip_, foto)
+                if comprobadas[nombre]:
+                    errores_fila.append(f"la foto «{nombre}» {comprobadas[nombre]}")
+
+        if errores_fila:
+            errores.append(f"Fila {numero}: {'; '.join(errores_fila)}.")
+        else:
+            # bulk_create no pasa por Animal.save()
+            animal.edad = animal.calcular_edad()
+            filas.append((animal, foto))
+
+    if not filas and not errores:
+        errores.append("El CSV no tiene ningún animal.")
+    if errores:
+        raise ImportacionNoValida(errores)
+    return filas, zip_
+
+
+# ----------------------- Importación -----------------------
+
+def lanzar_importacion(filas, archivo_zip, usuario):
+    """
+    Sube las fotos y crea los animales en un hilo, fuera de la petición del
+    admin: con cientos de fotos superaría los 30 s de gunicorn y del router
+    de Heroku. El ZIP subido se borra al terminar la petición, así que antes
+    se copia a un temporal. Al acabar se avisa por correo a ``usuario``.
+    """
+    ruta = None
+    if archivo_zip is not None:
+        archivo_zip.seek(0)
+        with tempfile.NamedTemporaryFile(prefix='importacion-', suffix='.zip', delete=False) as copia:
+            shutil.copyfileobj(archivo_zip, copia)
+        ruta = copia.name
+
+    def tarea():
+        try:
+            with zipfile.ZipFile(ruta) if ruta else nullcontext() as zip_:
+                animales = importar_animales(filas, zip_)
+        except Exception as error:
+            # importar_animales ya ha borrado las fotos subidas
+            logger.exception("Falló la importación de %s animales", len(filas))
+            avisar_importacion(usuario, len(filas), error=error)
+        else:
+            avisar_importacion(usuario, len(filas), animales=animales)
+        finally:
+            if ruta:
+                os.unlink(ruta)
+            connections.close_all()
+
+    transaction.on_commit(
+        lambda: threading.Thread(target=tarea, name='importacion-animales', daemon=True).start()
+    )
+
+
+def avisar_importacion(usuario, total, animales=None, error=None):
+    if not usuario.email:
+        return
+    enviar_email_html(
+        destinatario=usuario.email,
+        asunto=f"Importación de animales: {'terminada' if error is None else 'fallida'}",
+        plantilla="email/importacion_animales.html",
+        contexto={
+            'usuario': usuario,
+            'total': total,
+            'animales': animales or [],
+            'error': error,
+        },
+    )
+
+
+def subir_foto(zip_, info):
+    """Normaliza y sube una foto del ZIP con las opciones del campo ``Animal.imagen``."""
+    nombre = PurePosixPath(info.filename).name
+    with zip_.open(info) as f:
+        archivo = SimpleUploadedFile(nombre, f.read(), content_type=mimetypes.guess_type(nombre)[0])
+    if settings.IMAGENES_NORMALIZAR:
+        archivo = normalizar_imagen(archivo)
+    campo = Animal._meta.get_field('imagen')
+    return cloudinary.uploader.upload_resource(
+        archivo, type=campo.type, resource_type=campo.resource_type, **campo.options
+    )
+
+
+def borrar_fotos(recursos):
+    for recurso in recursos:
+        try:
+            cloudinary.uploader.destroy(recurso.public_id, invalidate=True)
+        except Exception:
+            logger.exception("No se pudo borrar la foto %s de una importación fallida", recurso.public_id)
+
+
+def importar_animales(filas, zip_):
+    """
+    Sube las fotos en paralelo (``IMPORTACION_SUBIDAS_CONCURRENTES``), crea
+    todos los animales con un solo ``bulk_create`` y envía un único aviso
+    a los suscriptores. Si algo falla se borran las fotos ya subidas.
+    """
+    recursos = {}
+    with ThreadPoolExecutor(max_workers=settings.IMPORTACION_SUBIDAS_CONCURRENTES) as pool:
+        futuros = {
+            pool.submit(subir_foto, zip_, foto): posicion
+            for posicion, (_, foto) in enumerate(filas) if foto is not None
+        }
+        wait(futuros)
+    fallo = None
+    for futuro, posicion in futuros.items():
+        if futuro.exception() is None:
+            recursos[posicion] = futuro.result()
+        elif fallo is None:
+            fallo = futuro.exception()
+    if fallo is not None:
+        borrar_fotos(recursos.values())
+        raise fallo
+
+    animales = []
+    for posicion, (animal, _) in enumerate(filas):
+        if posicion in recursos:
+            animal.imagen = recursos[posicion]
+        animales.append(animal)
+    try:
+        with transaction.atomic():
+            animales = Animal.objects.bulk_create(animales)
+            EventoNovedad.objects.bulk_create(EventoNovedad(animal=animal) for animal in animales)
+    except Exception:
+        borrar_fotos(recursos.values())
+        raise
+
+    # bulk_create no envía post_save: ni la portada ni el aviso por animal de notificar_nuevo_animal
+    programar_reconstruccion()
+    transaction.on_commit(lambda: anunciar_animales(animales))
+    return animales
+
+
+def anunciar_animales(animales):
+    """Un solo correo por suscriptor inmediato con todos los animales importados (el resto los recibe en su resumen)."""
+    resumen = [
+        {
+            'animal': animal,
+            'imagen_url': f"{settings.CLOUDINARY_BASE_URL}{getattr(animal.imagen, 'public_id', DEFAULT_IMAGEN_ANIMAL)}.jpg",
+        }
+        for animal in animales
+    ]
+    usuarios = get_user_model().objects.filter(recibir_novedades=True, frecuencia_novedades='inmediata', is_active=True)
+    for user in usuarios.iterator():
+        enviar_email_html(
+            destinatario=user.email,
+            asunto=f"🐾 {len(animales)} nuevos animales disponibles para adopción",
+            plantilla="email/nuevos_animales.html",
+            contexto={
+                'usuario': user,
+                'animales': resumen,
+                'animales_url': f"{settings.FRONTEND_URL}/animales",
+            },
+        )
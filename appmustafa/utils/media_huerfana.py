@@ -0,0 +1,163 @@
+import logging
+import os
+import time
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+
+from ..models import Adopcion, Animal, CustomUser, Noticia
+from ..signals import DEFAULT_IMAGEN_ANIMAL, DEFAULT_IMAGEN_NOTICIA, DEFAULT_IMAGEN_USUARIO
+
+logger = logging.getLogger(__name__)
+
+# Carpetas donde sube la aplicación: (resource_type, prefijo). Solo se revisa lo que hay dentro de ellas
+CARPETAS = [
+    ('image', 'animales/'),
+    ('image', 'noticias/'),
+    ('image', 'usuarios/perfiles/'),
+    ('raw', 'media/adopciones/'),  # RawMediaCloudinaryStorage y subidas directas
+    ('raw', 'adopciones/'),        # seed_real_data
+]
+
+# Campos que guardan ficheros: (modelo, campo)
+CAMPOS_MEDIA = [
+    (Animal, 'imagen'),
+    (Noticia, 'imagen'),
+    (CustomUser, 'foto_perfil'),
+    (Adopcion, 'contenido'),
+]
+
+PREFIJO_STORAGE_RAW = 'media/'
+LOTE_BORRADO = 100  # Máximo de public_ids por llamada a delete_resources
+TAMANO_PAGINA = 500  # Máximo de recursos por página del listado de Cloudinary
+
+
+def referencias(tamano_bloque=2000):
+    """
+    Conjunto con el public_id de cada fichero referenciado en la base de
+    datos. Cada tabla se lee una sola vez, por bloques, y solo la columna del
+    fichero.
+    """
+    referenciados = {DEFAULT_IMAGEN_ANIMAL, DEFAULT_IMAGEN_NOTICIA, DEFAULT_IMAGEN_USUARIO}
+    for modelo, campo in CAMPOS_MEDIA:
+        for valor in modelo.objects.values_list(campo, flat=True).iterator(chunk_size=tamano_bloque):
+            if not valor:
+                continue
+            public_id = getattr(valor, 'public_id', valor)  # CloudinaryResource o nombre del FileField
+            referenciados.add(public_id)
+            if modelo is Adopcion and not public_id.startswith(PREFIJO_STORAGE_RAW):
+                # El storage raw antepone su prefijo al public_id si el nombre guardado no lo tiene
+                referenciados.add(PREFIJO_STORAGE_RAW + public_id)
+    return referenciados
+
+
+class CuotaAgotada(Exception):
+    def __init__(self, restantes):
+        super().__init__(f"Quedan {restantes} llamadas de la API de administración de Cloudinary.")
+        self.restantes = restantes
+
+
+class OrigenCloudinary:
+    """
+    Listado y borrado en Cloudinary por la API de administración, que tiene
+    cuota por hora: se espera ``pausa`` segundos entre llamadas y se para
+    (``CuotaAgotada``) cuando quedan ``reserva`` llamadas o menos, para no
+    dejar sin cuota a la aplicación.
+    """
+
+    nombre = 'cloudinary'
+
+    def __init__(self, pausa=0.5, reserva=50):
+        import cloudinary.api
+
+        self.api = cloudinary.api
+        self.pausa = pausa
+        self.reserva = reserva
+        self.llamadas = 0
+
+    def llamar(self, funcion, *args, **kwargs):
+        if self.llamadas and self.pausa:
+            time.sleep(self.pausa)
+        respuesta = funcion(*args, **kwargs)
+        self.llamadas += 1
+        restantes = getattr(respuesta, 'rate_limit_remaining', None)
+        if restantes is not None and restantes <= self.reserva:
+            raise CuotaAgotada(restantes)
+        return respuesta
+
+    def listar(self, resource_type, prefijo):
+        """Genera (public_id, fecha de subida) página a página."""
+        cursor = None
+        while True:
+            opciones = {'next_cursor': cursor} if cursor else {}
+            respuesta = self.llamar(
+                self.api.resources, type='upload', resource_type=resource_type,
+                prefix=prefijo, max_results=TAMANO_PAGINA, **opciones,
+            )
+            for recurso in respuesta.get('resources', []):
+                yield recurso['public_id'], datetime.fromisoformat(recurso['created_at'].replace('Z', '+00:00'))
+            cursor = respuesta.get('next_cursor')
+            if not cursor:
+                return
+
+    def borrar(self, resource_type, public_ids):
+        self.llamar(self.api.delete_resources, public_ids, resource_type=resource_type, type='upload', invalidate=True)
+
+
+class OrigenLocal:
+    """Los mismos ficheros en ``MEDIA_ROOT`` (subidas directas en local): el public_id es la ruta relativa."""
+
+    nombre = 'local'
+
+    def __init__(self, pausa=0.0):
+        self.raiz = Path(settings.MEDIA_ROOT)
+        self.pausa = pausa
+
+    def listar(self, resource_type, prefijo):
+        carpeta = self.raiz / prefijo
+        if not carpeta.is_dir():
+            return
+        for directorio, _, ficheros in os.walk(carpeta):
+            for nombre in ficheros:
+                if nombre.endswith('.tmp'):  # Subida local en curso
+                    continue
+                ruta = Path(directorio, nombre)
+                fecha = datetime.fromtimestamp(ruta.stat().st_mtime, tz=dt_timezone.utc)
+                yield ruta.relative_to(self.raiz).as_posix(), fecha
+
+    def borrar(self, resource_type, public_ids):
+        for public_id in public_ids:
+            (self.raiz / public_id).unlink(missing_ok=True)
+        if self.pausa:
+            time.sleep(self.pausa)
+
+
+def buscar_huerfanos(origen, referenciados, gracia):
+    """
+    Recorre cada carpeta de ``CARPETAS`` y devuelve ``{(resource_type, prefijo): [public_id, ...]}``
+    con los ficheros que no están en ``referenciados`` y se subieron hace más de ``gracia``
+    (los recientes pueden ser subidas que aún no se han guardado en su modelo).
+    """
+    limite = datetime.now(dt_timezone.utc) - gracia
+    huerfanos = {}
+    for resource_type, prefijo in CARPETAS:
+        huerfanos[(resource_type, prefijo)] = [
+            public_id for public_id, fecha in origen.listar(resource_type, prefijo)
+            if public_id not in referenciados and fecha < limite
+        ]
+    return huerfanos
+
+
+def borrar_huerfanos(origen, resource_type, public_ids, maximo=None):
+    """Borra por lotes de ``LOTE_BORRADO``; devuelve cuántos se han borrado."""
+    if maximo is not None:
+        public_ids = public_ids[:maximo]
+    borrados = 0
+    for inicio in range(0, len(public_ids), LOTE_BORRADO):
+        lote = public_ids[inicio:inicio + LOTE_BORRADO]
+        origen.borrar(resource_type, lote)
+        borrados += len(lote)
+        logger.info("Borrados %s ficheros huérfanos (%s) de %s", len(lote), resource_type, origen.nombre)
+    return borrados
+
@@ -0,0 +1,102 @@
+import functools
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+# Con varios workers de gunicorn, cada proceso escribe sus métricas en PROMETHEUS_MULTIPROC_DIR
+# (ver gunicorn.conf.py) y el endpoint /metrics las agrega al leerlas.
+
+PETICIONES_DURACION = Histogram(
+    'appmustafa_peticion_duracion_segundos',
+    'Latencia de las peticiones HTTP por vista, acción y código de estado',
+    ['vista', 'accion', 'metodo', 'estado'],
+)
+
+EMAILS_TOTAL = Counter(
+    'appmustafa_emails_total',
+    'Emails enviados con enviar_email_html',
+    ['plantilla', 'resultado'],
+)
+EMAILS_DURACION = Histogram(
+    'appmustafa_email_duracion_segundos',
+    'Duración del envío de emails con enviar_email_html',
+    ['plantilla'],
+)
+EMAILS_BANDEJA_SALIDA_TOTAL = Counter(
+    'appmustafa_emails_bandeja_salida_total',
+    'Emails guardados en la bandeja de salida porque el servidor SMTP no estaba disponible',
+)
+
+CLOUDINARY_LLAMADAS_TOTAL = Counter(
+    'appmustafa_cloudinary_llamadas_total',
+    'Llamadas a la API de subida de Cloudinary',
+    ['accion', 'resultado'],
+)
+CLOUDINARY_DURACION = Histogram(
+    'appmustafa_cloudinary_duracion_segundos',
+    'Duración de las llamadas a la API de subida de Cloudinary',
+    ['accion'],
+)
+
+THROTTLE_RECHAZOS_TOTAL = Counter(
+    'appmustafa_throttle_rechazos_total',
+    'Peticiones rechazadas por throttling',
+    ['scope'],
+)
+
+
+@contextmanager
+def medir(contador, histograma, **etiquetas):
+    """
+    Mide la duración del bloque en ``histograma`` y lo cuenta en ``contador``
+    con ``resultado`` igual a "ok" o "error" según termine o lance excepción.
+    """
+    inicio = time.perf_counter()
+    resultado = 'ok'
+    try:
+        yield
+    except Exception:
+        resultado = 'error'
+        raise
+    finally:
+        histograma.labels(**etiquetas).observe(time.perf_counter() - inicio)
+        contador.labels(resultado=resultado, **etiquetas).inc()
+
+
+def instrumentar_cloudinary():
+    """
+    Envuelve ``cloudinary.uploader.call_api``, por donde pasan todas las
+    subidas y borrados (campos CloudinaryField, storages y señales), para
+    medir cada llamada. Es idempotente.
+    """
+    import cloudinary.uploader
+
+    original = cloudinary.uploader.call_api
+    if getattr(original, 'instrumentada', False):
+        return
+
+    @functools.wraps(original)
+    def call_api(action, *args, **kwargs):
+        with medir(CLOUDINARY_LLAMADAS_TOTAL, CLOUDINARY_DURACION, accion=action):
+            return original(action, *args, **kwargs)
+
+    call_api.instrumentada = True
+    cloudinary.uploader.call_api = call_api
+
+
+def exportar_metricas():
+    """
+    Devuelve las métricas en formato de texto de Prometheus junto con su
+    content type, agregando las de todos los workers si hay directorio
+    multiproceso configurado.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        registro = REGISTRY
+    return generate_latest(registro), CONTENT_TYPE_LATEST
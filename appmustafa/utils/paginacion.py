@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+
+def conteo_estimado(queryset):
+    """
+    Número aproximado de filas de la tabla de ``queryset`` según las
+    estadísticas de PostgreSQL (``pg_class.reltuples``). Devuelve ``None`` si
+    el queryset está filtrado, la base de datos no es PostgreSQL o la tabla
+    aún no tiene estadísticas.
+    """
+    if not isinstance(queryset, QuerySet) or queryset.query.where or queryset.query.distinct:
+        return None
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+            [connection.ops.quote_name(queryset.model._meta.db_table)],
+        )
+        fila = cursor.fetchone()
+    if fila is None or fila[0] < 0:
+        return None
+    return fila[0]
+
+
+class PaginadorEstimado(Paginator):
+    """
+    Paginador para los listados del admin de tablas grandes: sin filtros, y a
+    partir de ``ADMIN_CONTEO_ESTIMADO_DESDE`` filas, usa el conteo estimado en
+    lugar de un ``COUNT(*)`` que recorre toda la tabla en cada página.
+    """
+
+    @cached_property
+    def count(self):
+        estimado = conteo_estimado(self.object_list)
+        if estimado is not None and estimado >= settings.ADMIN_CONTEO_ESTIMADO_DESDE:
+            return estimado
+        return super().count
@@ -0,0 +1,131 @@
+import cProfile
+import io
+import json
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+# Modos de perfilado admitidos en la cabecera X-Perfilar
+MODOS_PERFILADO = {'cpu', 'memoria'}
+
+# Nombres válidos para los ficheros de perfil (evita rutas fuera del directorio)
+NOMBRE_FICHERO_RE = re.compile(r'^[\w-]+\.(json|prof|cpu\.txt|memoria\.txt)$')
+
+# Solo se perfila una petición a la vez por proceso (cProfile y tracemalloc son globales)
+_lock_perfilado = threading.Lock()
+
+
+def directorio_perfiles():
+    directorio = Path(settings.PERFILES_DIR)
+    directorio.mkdir(parents=True, exist_ok=True)
+    return directorio
+
+
+def perfilar(get_response, request, modos, usuario):
+    """
+    Ejecuta la petición bajo cProfile y/o tracemalloc y guarda el resultado en
+    ``PERFILES_DIR``. Devuelve la respuesta y el identificador del perfil, o
+    ``None`` si ya había otra petición perfilándose en este proceso.
+    """
+    if not _lock_perfilado.acquire(blocking=False):
+        return get_response(request), None
+
+    try:
+        profiler = cProfile.Profile() if 'cpu' in modos else None
+        # Si tracemalloc ya estaba activo (PYTHONTRACEMALLOC), no se detiene al terminar
+        memoria_propia = 'memoria' in modos and not tracemalloc.is_tracing()
+        if memoria_propia:
+            tracemalloc.start(10)
+        inicio = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            if profiler:
+                profiler.disable()
+            duracion = time.perf_counter() - inicio
+            snapshot = None
+            if 'memoria' in modos:
+                snapshot = tracemalloc.take_snapshot()
+            if memoria_propia:
+                tracemalloc.stop()
+
+        identificador = guardar_perfil(request, usuario, response, duracion, profiler, snapshot)
+        return response, identificador
+    finally:
+        _lock_perfilado.release()
+
+
+def guardar_perfil(request, usuario, response, duracion, profiler, snapshot):
+    directorio = directorio_perfiles()
+    identificador = f"{timezone.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:4]}"
+    resolver_match = getattr(request, 'resolver_match', None)
+    ficheros = []
+
+    if profiler is not None:
+        profiler.dump_stats(directorio / f"{identificador}.prof")
+        resumen = io.StringIO()
+        pstats.Stats(profiler, stream=resumen).sort_stats('cumulative').print_stats(40)
+        (directorio / f"{identificador}.cpu.txt").write_text(resumen.getvalue(), encoding='utf-8')
+        ficheros += [f"{identificador}.prof", f"{identificador}.cpu.txt"]
+
+    if snapshot is not None:
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ])
+        lineas = [str(estadistica) for estadistica in snapshot.statistics('lineno')[:30]]
+        (directorio / f"{identificador}.memoria.txt").write_text('\n'.join(lineas), encoding='utf-8')
+        ficheros.append(f"{identificador}.memoria.txt")
+
+    metadatos = {
+        'id': identificador,
+        'fecha': timezone.now().isoformat(),
+        'metodo': request.method,
+        'ruta': request.get_full_path(),
+        'vista': resolver_match.view_name if resolver_match else None,
+        'usuario': usuario.username,
+        'estado': response.status_code,
+        'duracion_ms': round(duracion * 1000, 3),
+        'ficheros': ficheros,
+    }
+    (directorio / f"{identificador}.json").write_text(json.dumps(metadatos, ensure_ascii=False), encoding='utf-8')
+
+    podar_perfiles(directorio)
+    return identificador
+
+
+# Mantiene solo los PERFILES_MAX perfiles más recientes
+def podar_perfiles(directorio):
+    metadatos = sorted(directorio.glob('*.json'), key=lambda f: f.name, reverse=True)
+    for antiguo in metadatos[settings.PERFILES_MAX:]:
+        identificador = antiguo.name[:-len('.json')]
+        for fichero in directorio.glob(f"{identificador}.*"):
+            fichero.unlink(missing_ok=True)
+
+
+def listar_perfiles():
+    """Devuelve los metadatos de los perfiles guardados, del más reciente al más antiguo."""
+    perfiles = []
+    for fichero in sorted(directorio_perfiles().glob('*.json'), key=lambda f: f.name, reverse=True):
+        try:
+            perfiles.append(json.loads(fichero.read_text(encoding='utf-8')))
+        except (OSError, ValueError):
+            continue
+    return perfiles
+
+
+def ruta_fichero_perfil(nombre):
+    """Ruta de un fichero de perfil por su nombre, o None si no es válido o no existe."""
+    if not NOMBRE_FICHERO_RE.match(nombre):
+        return None
+    ruta = directorio_perfiles() / nombre
+    return ruta if ruta.is_file() else None
@@ -0,0 +1,59 @@
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CLAVE = 'portada:v1'
+
+
+def construir_portada():
+    """
+    JSON (bytes) de api/inicio/: los últimos ``PORTADA_TAMANO`` animales sin
+    adopción aceptada y las últimas noticias, con los campos resumidos.
+    Siempre desde la primaria: una réplica con retraso quedaría guardada.
+    """
+    from appmustafa.models import Animal, Noticia
+    from appmustafa.serializers import AnimalSlimSerializer, NoticiaSlimSerializer
+
+    tamano = settings.PORTADA_TAMANO
+    animales = Animal.objects.using(DEFAULT_DB_ALIAS).exclude(adopciones__aceptada='Aceptada').order_by('-pk')[:tamano]
+    noticias = Noticia.objects.using(DEFAULT_DB_ALIAS).order_by('-fecha_publicacion', '-pk')[:tamano]
+    datos = {
+        'animales': AnimalSlimSerializer(animales, many=True).data,
+        'noticias': NoticiaSlimSerializer(noticias, many=True).data,
+        'generado': timezone.now(),
+    }
+    return json.dumps(datos, cls=DjangoJSONEncoder, ensure_ascii=False).encode('utf-8')
+
+
+def reconstruir_portada():
+    contenido = construir_portada()
+    caches['portada'].set(CLAVE, contenido)
+    return contenido
+
+
+def portada_json():
+    """El JSON precalculado; si aún no existe (o se perdió la caché) se construye ahora."""
+    contenido = caches['portada'].get(CLAVE)
+    if contenido is None:
+        contenido = reconstruir_portada()
+    return contenido
+
+
+def programar_reconstruccion():
+    """Reconstruye la portada cuando se confirme la transacción en curso."""
+    def reconstruir():
+        try:
+            reconstruir_portada()
+        except Exception:
+            # La siguiente petición la construirá; que no falle la escritura que la provocó
+            logger.exception("No se pudo reconstruir la portada")
+            caches['portada'].delete(CLAVE)
+
+    transaction.on_commit(reconstruir)
@@ -0,0 +1,28 @@
+import math
+
+
+def percentil(valores, p):
+    """
+    Devuelve el percentil ``p`` (0-100) de una lista de valores usando el
+    método del rango más cercano. Devuelve None si la lista está vacía.
+    """
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    rango = max(1, math.ceil(p / 100 * len(ordenados)))
+    return ordenados[rango - 1]
+
+
+def resumen_latencias(latencias_ms):
+    """
+    Resume una lista de latencias (en milisegundos) en p50/p95/p99 y media,
+    redondeadas a tres decimales.
+    """
+    if not latencias_ms:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'media_ms': None}
+    return {
+        'p50_ms': round(percentil(latencias_ms, 50), 3),
+        'p95_ms': round(percentil(latencias_ms, 95), 3),
+        'p99_ms': round(percentil(latencias_ms, 99), 3),
+        'media_ms': round(sum(latencias_ms) / len(latencias_ms), 3),
+    }
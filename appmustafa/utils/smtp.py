@@ -0,0 +1,306 @@
+import base64
+import json
+import logging
+import os
+import smtplib
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+
+from django.conf import settings
+from django.core.mail.backends.smtp import EmailBackend
+from django.core.mail.message import sanitize_address
+from django.utils import timezone
+
+from .metricas import EMAILS_BANDEJA_SALIDA_TOTAL
+
+logger = logging.getLogger(__name__)
+
+# Errores que indican que el servidor no está disponible (no que el mensaje sea inválido)
+ERRORES_CONEXION = (OSError, smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, smtplib.SMTPHeloError)
+
+# Rechazos definitivos de un mensaje concreto: no abren el circuito y se propagan como antes
+ERRORES_MENSAJE = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+class CircuitoSMTP:
+    """
+    Circuit breaker del servidor de correo. Tras ``EMAIL_CIRCUITO_FALLOS``
+    fallos seguidos se abre y, durante ``EMAIL_CIRCUITO_ESPERA`` segundos, no
+    se intenta conectar. Pasado ese tiempo deja pasar un único intento
+    (semiabierto): si funciona se cierra y si falla vuelve a abrirse.
+    """
+
+    CERRADO, ABIERTO, SEMIABIERTO = 'cerrado', 'abierto', 'semiabierto'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.estado = self.CERRADO
+        self.fallos = 0
+        self.abierto_desde = 0.0
+
+    def permite(self):
+        with self._lock:
+            if self.estado == self.CERRADO:
+                return True
+            if self.estado == self.ABIERTO and time.monotonic() - self.abierto_desde >= settings.EMAIL_CIRCUITO_ESPERA:
+                self.estado = self.SEMIABIERTO
+                return True
+            return False
+
+    def exito(self):
+        with self._lock:
+            recuperado = self.estado != self.CERRADO
+            self.reiniciar()
+        return recuperado
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            if self.estado == self.SEMIABIERTO or self.fallos >= settings.EMAIL_CIRCUITO_FALLOS:
+                if self.estado != self.ABIERTO:
+                    logger.warning("Circuito SMTP abierto tras %s fallos; el correo se guarda en la bandeja de salida", self.fallos)
+                self.estado = self.ABIERTO
+                self.abierto_desde = time.monotonic()
+
+
+class PoolSMTP:
+    """
+    Conexiones SMTP abiertas y reutilizadas dentro del proceso. Las que llevan
+    más de ``EMAIL_POOL_INACTIVIDAD`` segundos sin usarse se cierran; las que
+    llevan más de ``EMAIL_POOL_COMPROBAR`` se comprueban con NOOP antes de
+    reutilizarse. Tras un fork (workers de gunicorn) el pool empieza vacío.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._libres = deque()
+        self._pid = os.getpid()
+
+    def obtener(self, backend):
+        while True:
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._libres.clear()
+                    self._pid = os.getpid()
+                if not self._libres:
+                    break
+                conexion, ultimo_uso = self._libres.pop()
+            inactiva = time.monotonic() - ultimo_uso
+            if inactiva > settings.EMAIL_POOL_INACTIVIDAD:
+                cerrar_conexion(conexion)
+                continue
+            if inactiva > settings.EMAIL_POOL_COMPROBAR and not conexion_viva(conexion):
+                cerrar_conexion(conexion)
+                continue
+            return conexion
+        return abrir_conexion(backend)
+
+    def devolver(self, conexion):
+        with self._lock:
+            if self._pid == os.getpid() and len(self._libres) < settings.EMAIL_POOL_MAX:
+                self._libres.append((conexion, time.monotonic()))
+                return
+        cerrar_conexion(conexion)
+
+    def vaciar(self):
+        with self._lock:
+            libres, self._libres = list(self._libres), deque()
+        for conexion, _ in libres:
+            cerrar_conexion(conexion)
+
+
+def abrir_conexion(backend):
+    # Reutiliza la lógica de Django (timeout, TLS/SSL y login) sin dejar la conexión en el backend
+    backend.connection = None
+    EmailBackend.open(backend)
+    conexion, backend.connection = backend.connection, None
+    if conexion is None:  # open() se traga el error con fail_silently
+        raise smtplib.SMTPServerDisconnected("No se pudo conectar con el servidor SMTP")
+    return conexion
+
+
+def conexion_viva(conexion):
+    try:
+        return conexion.noop()[0] == 250
+    except ERRORES_CONEXION + (smtplib.SMTPException,):
+        return False
+
+
+def cerrar_conexion(conexion):
+    try:
+        conexion.quit()
+    except Exception:
+        conexion.close()
+
+
+_circuito = CircuitoSMTP()
+_pool = PoolSMTP()
+_lock_vaciado = threading.Lock()
+
+SUFIJO_ENVIANDO = '.enviando'
+RECLAMO_CADUCA = 600  # Segundos tras los que un mensaje reclamado se da por abandonado
+
+
+# ----------------------- Bandeja de salida -----------------------
+
+def directorio_bandeja():
+    directorio = Path(settings.EMAIL_BANDEJA_SALIDA_DIR)
+    directorio.mkdir(parents=True, exist_ok=True)
+    return directorio
+
+
+def guardar_en_bandeja(remitente, destinatarios, datos):
+    """Guarda el mensaje ya codificado para enviarlo más tarde (enviar_bandeja_salida)."""
+    directorio = directorio_bandeja()
+    nombre = f"{timezone.now():%Y%m%d-%H%M%S-%f}-{uuid.uuid4().hex[:8]}.json"
+    temporal = directorio / (nombre + '.tmp')
+    temporal.write_text(json.dumps({
+        'remitente': remitente,
+        'destinatarios': destinatarios,
+        'mensaje': base64.b64encode(datos).decode('ascii'),
+    }), encoding='utf-8')
+    os.replace(temporal, directorio / nombre)
+    EMAILS_BANDEJA_SALIDA_TOTAL.inc()
+
+
+def reclamar(fichero):
+    """
+    Marca el mensaje como en envío renombrándolo (atómico en el mismo
+    directorio): solo un proceso lo consigue, así que ningún otro worker ni el
+    comando enviar_bandeja_salida lo envía a la vez. ``None`` si ya lo tiene otro.
+    """
+    reclamado = fichero.with_suffix(SUFIJO_ENVIANDO)
+    try:
+        os.rename(fichero, reclamado)
+    except FileNotFoundError:
+        return None
+    os.utime(reclamado)  # Hora del reclamo, para liberar los que deje un proceso caído
+    return reclamado
+
+
+def liberar_reclamos_caducados(directorio):
+    """Devuelve a la bandeja los mensajes reclamados por un proceso que murió a mitad de envío."""
+    limite = time.time() - RECLAMO_CADUCA
+    for reclamado in directorio.glob('*' + SUFIJO_ENVIANDO):
+        try:
+            if reclamado.stat().st_mtime < limite:
+                os.rename(reclamado, reclamado.with_suffix('.json'))
+        except FileNotFoundError:
+            continue
+
+
+def vaciar_bandeja(maximo=None):
+    """
+    Envía los mensajes pendientes de la bandeja de salida en orden de llegada.
+    Se detiene en cuanto el servidor vuelve a fallar. Devuelve (enviados, pendientes).
+    Cada mensaje se reclama antes de enviarlo, así que varios procesos pueden
+    vaciar la misma bandeja sin duplicar correos.
+    """
+    if not _lock_vaciado.acquire(blocking=False):
+        return 0, len(list(directorio_bandeja().glob('*.json')))
+    try:
+        backend = SMTPPoolBackend(fail_silently=False)
+        directorio = directorio_bandeja()
+        liberar_reclamos_caducados(directorio)
+        enviados = 0
+        ficheros = sorted(directorio.glob('*.json'))
+        for fichero in ficheros[:maximo]:
+            reclamado = reclamar(fichero)
+            if reclamado is None:
+                continue  # Lo está enviando (o ya lo envió) otro proceso
+            try:
+                pendiente = json.loads(reclamado.read_text(encoding='utf-8'))
+                backend.entregar(pendiente['remitente'], pendiente['destinatarios'], base64.b64decode(pendiente['mensaje']))
+            except ERRORES_MENSAJE:
+                # Un rechazo definitivo no se va a arreglar reintentando
+                logger.exception("Mensaje de la bandeja de salida rechazado: %s", fichero.name)
+                os.rename(reclamado, fichero.with_suffix('.rechazado'))
+                continue
+            except ERRORES_CONEXION + (smtplib.SMTPException, ServidorNoDisponible):
+                os.rename(reclamado, fichero)
+                break
+            except BaseException:
+                os.rename(reclamado, fichero)
+                raise
+            reclamado.unlink(missing_ok=True)
+            enviados += 1
+        return enviados, len(list(directorio.glob('*.json')))
+    finally:
+        _lock_vaciado.release()
+
+
+class ServidorNoDisponible(Exception):
+    """El circuito está abierto: no se intenta conectar con el servidor."""
+
+
+# ----------------------- Backend -----------------------
+
+class SMTPPoolBackend(EmailBackend):
+    """
+    Backend SMTP para enviar correo desde las peticiones sin bloquearlas:
+    reutiliza conexiones del pool del proceso, usa timeouts estrictos
+    (``EMAIL_TIMEOUT``) y, si el servidor falla o el circuito está abierto,
+    guarda el mensaje en la bandeja de salida en lugar de lanzar un error.
+    Los rechazos de un mensaje concreto (destinatario inválido...) se siguen
+    propagando como con el backend SMTP de Django.
+    """
+
+    # Las conexiones las gestiona el pool; open/close del backend no hacen nada
+    def open(self):
+        return False
+
+    def close(self):
+        pass
+
+    def send_messages(self, email_messages):
+        enviados = 0
+        for email_message in email_messages or []:
+            if not email_message.recipients():
+                continue
+            encoding = email_message.encoding or settings.DEFAULT_CHARSET
+            remitente = sanitize_address(email_message.from_email, encoding)
+            destinatarios = [sanitize_address(addr, encoding) for addr in email_message.recipients()]
+            datos = email_message.message().as_bytes(linesep="\r\n")
+            try:
+                self.entregar(remitente, destinatarios, datos)
+            except ERRORES_MENSAJE:
+                if not self.fail_silently:
+                    raise
+                continue
+            except ERRORES_CONEXION + (smtplib.SMTPException, ServidorNoDisponible):
+                guardar_en_bandeja(remitente, destinatarios, datos)
+            enviados += 1
+        return enviados
+
+    def entregar(self, remitente, destinatarios, datos):
+        if not _circuito.permite():
+            raise ServidorNoDisponible()
+
+        responde = False
+        try:
+            conexion = _pool.obtener(self)
+            try:
+                conexion.sendmail(remitente, destinatarios, datos)
+            except ERRORES_MENSAJE:
+                # El servidor responde: la conexión sigue siendo válida
+                responde = True
+                _pool.devolver(conexion)
+                raise
+            except BaseException:
+                cerrar_conexion(conexion)
+                raise
+            responde = True
+            _pool.devolver(conexion)
+        finally:
+            # Cualquier resultado saca al circuito de semiabierto: si no, no volvería a dejar pasar nada
+            if not responde:
+                _circuito.fallo()
+            elif _circuito.exito():
+                # El servidor se ha recuperado: se vacía la bandeja de salida en segundo plano
+                threading.Thread(target=vaciar_bandeja, daemon=True).start()
@@ -0,0 +1,104 @@
+import re
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .imagenes import FORMATOS_IMAGEN
+
+SAL_TOKEN = 'appmustafa.subida_directa'
+
+# Campo de cada destino, carpeta donde se sube y tipo de recurso en Cloudinary
+DESTINOS = {
+    'animal': {'campo': 'imagen', 'carpeta': 'animales', 'resource_type': 'image'},
+    'usuario': {'campo': 'foto_perfil', 'carpeta': 'usuarios/perfiles', 'resource_type': 'image'},
+    # Misma ruta que pone RawMediaCloudinaryStorage (prefijo media/ + pdf_upload_path)
+    'adopcion': {'campo': 'contenido', 'carpeta': 'media/adopciones/{usuario}', 'resource_type': 'raw', 'extension': '.pdf'},
+}
+
+FORMATO_VALIDO = re.compile(r'^[a-z0-9]{2,5}$')
+
+
+class SubidaNoValida(Exception):
+    """El token o la firma de una subida directa no son válidos."""
+
+
+def nuevo_public_id(destino, usuario):
+    config = DESTINOS[destino]
+    carpeta = config['carpeta'].format(usuario=usuario.pk)
+    return f"{carpeta}/{uuid.uuid4().hex}{config.get('extension', '')}"
+
+
+def crear_token(destino, usuario, public_id, objeto_id=None, animal_id=None):
+    return signing.dumps(
+        {'d': destino, 'u': usuario.pk, 'p': public_id, 'o': objeto_id, 'a': animal_id},
+        salt=SAL_TOKEN,
+    )
+
+
+def leer_token(token):
+    try:
+        return signing.loads(token, salt=SAL_TOKEN, max_age=settings.SUBIDA_DIRECTA_VALIDEZ)
+    except signing.SignatureExpired:
+        raise SubidaNoValida("La autorización de subida ha caducado.")
+    except signing.BadSignature:
+        raise SubidaNoValida("La autorización de subida no es válida.")
+
+
+def parametros_subida(destino, public_id, token, request):
+    """
+    Datos que el cliente necesita para subir el fichero directamente al
+    almacenamiento: URL, método HTTP y campos del formulario firmados.
+    """
+    if settings.SUBIDA_DIRECTA_BACKEND == 'local':
+        return {
+            'url': request.build_absolute_uri(reverse('subida-local', args=[token])),
+            'metodo': 'PUT',
+            'campos': {},
+        }
+
+    import cloudinary
+    import cloudinary.utils
+
+    config = cloudinary.config()
+    resource_type = DESTINOS[destino]['resource_type']
+    parametros = {'public_id': public_id, 'timestamp': int(time.time())}
+    if resource_type == 'image' and settings.IMAGENES_NORMALIZAR:
+        # Cloudinary aplica la misma normalización que normalizar_imagen antes de guardar la imagen
+        lado = settings.IMAGENES_LADO_MAXIMO
+        parametros['transformation'] = f'c_limit,w_{lado},h_{lado},q_{settings.IMAGENES_CALIDAD}'
+        parametros['format'] = FORMATOS_IMAGEN[settings.IMAGENES_FORMATO][1].lstrip('.')
+    firma = cloudinary.utils.api_sign_request(parametros, config.api_secret)
+    return {
+        'url': cloudinary.utils.cloudinary_api_url('upload', resource_type=resource_type),
+        'metodo': 'POST',
+        'campos': {**parametros, 'signature': firma, 'api_key': config.api_key},
+    }
+
+
+def firma_local(public_id, version):
+    return salted_hmac(SAL_TOKEN, f'{public_id}:{version}').hexdigest()
+
+
+def verificar_respuesta(public_id, version, signature):
+    """Comprueba la firma con la que el almacenamiento respondió a la subida."""
+    if settings.SUBIDA_DIRECTA_BACKEND == 'local':
+        valida = constant_time_compare(signature, firma_local(public_id, version))
+    else:
+        import cloudinary.utils
+        valida = cloudinary.utils.verify_api_response_signature(public_id, version, signature)
+    if not valida:
+        raise SubidaNoValida("La firma de la subida no es válida.")
+
+
+def ruta_local(public_id):
+    """Fichero de ``MEDIA_ROOT`` donde el sustituto local guarda una subida."""
+    raiz = Path(settings.MEDIA_ROOT).resolve()
+    ruta = (raiz / public_id).resolve()
+    if raiz not in ruta.parents:
+        raise SubidaNoValida("Ruta de subida no válida.")
+    return ruta
@@ -0,0 +1,36 @@
+import logging
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+logger = logging.getLogger(__name__)
+
+
+class LimiteSubidaHandler(FileUploadHandler):
+    """
+    Primer handler de subida: descarta un fichero en cuanto supera
+    ``SUBIDA_MAX_BYTES`` mientras se recibe, sin esperar a tenerlo entero en
+    memoria o en disco. El resto del cuerpo de ese fichero se ignora y el
+    campo llega vacío a la validación.
+
+    Una vista puede poner un límite propio (por ejemplo, la importación de
+    animales con su ZIP de fotos) sustituyendo los handlers de la petición.
+    """
+
+    def __init__(self, request=None, limite=None):
+        super().__init__(request)
+        self.limite = limite or settings.SUBIDA_MAX_BYTES
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.recibidos = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.recibidos += len(raw_data)
+        if self.recibidos > self.limite:
+            logger.warning("Subida de %s descartada: supera %s bytes", self.file_name, self.limite)
+            raise SkipFile()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
@@ -1,11 +1,12 @@
 from rest_framework import viewsets
-from .models import Animal, Noticia, Comentario, Adopcion
+from .models import Animal, Noticia, Comentario, Adopcion, MAGIA_PDF
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from .serializers import (
     AnimalSerializer, UsuarioSerializer, NoticiaSerializer,
     ComentarioSerializer, AdopcionSerializer,
-    PasswordResetRequestSerializer, PasswordResetConfirmSerializer
+    PasswordResetRequestSerializer, PasswordResetConfirmSerializer,
+    FirmarSubidaSerializer, ConfirmarSubidaSerializer
 )
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
@@ -26,7 +27,7 @@ from django.conf import settings
 from django.core.mail import send_mail
 from django.contrib.auth import get_user_model
 from .throttles import CrearComentarioThrottle
-from .throttles import UserRateThrottle, CrearAdopcionThrottle
+from .throttles import UsuarioRateThrottle, CrearAdopcionThrottle
 from rest_framework.exceptions import Throttled
 from django.template.loader import render_to_string
 from django.core.mail import EmailMultiAlternatives
@@ -34,6 +35,22 @@ from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from .permissions import IsAdminOrReadOnly
 from rest_framework.exceptions import PermissionDenied
 from rest_framework import mixins, viewsets
+from django.http import HttpResponse
+from rest_framework.authentication import SessionAuthentication
+from .authentication import CookieJWTAuthentication
+from .permissions import IsStaffOIPPermitida
+from .serializacion_rapida import ListadoRapidoMixin
+from .utils.metricas import exportar_metricas
+from .utils.exportacion import EXPORTACIONES, FORMATOS_EXPORTACION, respuesta_exportacion
+from .utils import subida_directa
+from .utils.bajas import solicitar_baja
+from .utils.subida_directa import DESTINOS, SubidaNoValida
+from cloudinary import CloudinaryResource
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+import os
+import time
 
 # Obtener el modelo de usuario configurado en el proyecto
 User = get_user_model()
@@ -43,23 +60,26 @@ token_generator = PasswordResetTokenGenerator()
 
 
 # ViewSet para manejar operaciones CRUD de Animales
-class AnimalViewSet(viewsets.ModelViewSet):
+class AnimalViewSet(ListadoRapidoMixin, viewsets.ModelViewSet):
     # Consulta todos los animales, ordenados por fecha de nacimiento descendente (más recientes primero)
     queryset = Animal.objects.all().order_by('-fecha_nacimiento')
     # Serializador que define cómo se representan los objetos Animal en JSON
     serializer_class = AnimalSerializer
     # Solo administradores pueden crear/modificar; usuarios no autenticados solo pueden leer
     permission_classes = [IsAdminOrReadOnly]
+    # Las lecturas (GET/HEAD) pueden ir a una réplica (ver ReplicaLecturaMiddleware)
+    usar_replica = True
 
 
 # ViewSet para manejar noticias
-class NoticiaViewSet(viewsets.ModelViewSet):
+class NoticiaViewSet(ListadoRapidoMixin, viewsets.ModelViewSet):
     # Consulta todas las noticias ordenadas por fecha de publicación descendente (más recientes primero)
     queryset = Noticia.objects.all().order_by('-fecha_publicacion')
     # Serializador para noticias
     serializer_class = NoticiaSerializer
     # Permisos iguales que para animales: solo admins pueden modificar
     permission_classes = [IsAdminOrReadOnly]
+    usar_replica = True
 
 
 # ViewSet para manejar comentarios
@@ -70,6 +90,8 @@ class ComentarioViewSet(viewsets.ModelViewSet):
     serializer_class = ComentarioSerializer
     # Permisos: usuarios autenticados pueden crear, modificar o eliminar; otros solo pueden leer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    # Tras comentar, la cookie de ReplicaLecturaMiddleware hace que el autor lea de la primaria
+    usar_replica = True
 
     # Definir throttling (limitación de tasa) para evitar spam de comentarios
     def get_throttles(self):
@@ -81,6 +103,8 @@ class ComentarioViewSet(viewsets.ModelViewSet):
 
     # Filtrar comentarios por noticia si se pasa parámetro 'noticia' en la query
     def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return super().get_queryset()
         noticia_id = self.request.query_params.get('noticia')
         if noticia_id:
             # Retornar solo comentarios asociados a esa noticia, ordenados por fecha descendente
@@ -106,7 +130,7 @@ class ComentarioViewSet(viewsets.ModelViewSet):
 
 
 # ViewSet para manejo de solicitudes de adopción
-class AdopcionViewSet(viewsets.ModelViewSet):
+class AdopcionViewSet(ListadoRapidoMixin, viewsets.ModelViewSet):
     # Consulta todas las adopciones
     queryset = Adopcion.objects.all()
     # Serializador para adopciones
@@ -116,6 +140,9 @@ class AdopcionViewSet(viewsets.ModelViewSet):
 
     # Filtrado para obtener adopciones por usuario
     def get_queryset(self):
+        # drf_yasg instancia la vista sin usuario al generar el esquema
+        if getattr(self, 'swagger_fake_view', False):
+            return Adopcion.objects.none()
         user = self.request.user
         return (
             Adopcion.objects
@@ -299,7 +326,7 @@ class ProfileView(APIView):
 
 # Vista para solicitar el reseteo de contraseña
 class RequestPasswordResetAPIView(generics.GenericAPIView):
-    throttle_classes = [UserRateThrottle]  # Limita la cantidad de solicitudes para evitar abusos
+    throttle_classes = [UsuarioRateThrottle]  # Limita la cantidad de solicitudes para evitar abusos
     permission_classes = [AllowAny]  # Permite acceso público (no requiere autenticación)
     serializer_class = PasswordResetRequestSerializer    
 
@@ -428,8 +455,174 @@ class EliminarCuentaView(APIView):
     permission_classes = [IsAuthenticated]  # Solo usuarios autenticados
 
     def delete(self, request):
-        user = request.user
-        # Borra el usuario de la base de datos
-        user.delete()
-        # Responde con mensaje y código 204 No Content
-        return Response({"mensaje": "Cuenta eliminada correctamente."}, status=status.HTTP_204_NO_CONTENT)
+        # Desactiva la cuenta en el acto; comentarios, adopciones y ficheros se borran en segundo plano
+        solicitar_baja(request.user)
+        # Responde con mensaje y código 204 No Content, cerrando también la sesión
+        response = Response({"mensaje": "Cuenta eliminada correctamente."}, status=status.HTTP_204_NO_CONTENT)
+        response.delete_cookie(key='access_token', path='/', samesite='None')
+        response.delete_cookie(key='refresh_token', path='/', samesite='None')
+        return response
+
+
+# Vista que expone las métricas de Prometheus (solo staff o IPs permitidas)
+class MetricasView(APIView):
+    # Además del JWT en cookie, se acepta la sesión del admin para poder consultarlas desde el navegador
+    authentication_classes = [CookieJWTAuthentication, SessionAuthentication]
+    permission_classes = [IsStaffOIPPermitida]
+
+    def get(self, request):
+        contenido, content_type = exportar_metricas()
+        return HttpResponse(contenido, content_type=content_type)
+
+
+# Exportación en streaming (CSV o JSONL) de adopciones, comentarios y usuarios para el personal
+class ExportacionView(APIView):
+    authentication_classes = [CookieJWTAuthentication, SessionAuthentication]
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, recurso):
+        formato = request.query_params.get('formato', 'csv')
+        if recurso not in EXPORTACIONES:
+            return Response({"error": f"No se puede exportar '{recurso}'."}, status=status.HTTP_404_NOT_FOUND)
+        if formato not in FORMATOS_EXPORTACION:
+            return Response({"error": "Formato no válido. Usa csv o jsonl."}, status=status.HTTP_400_BAD_REQUEST)
+        return respuesta_exportacion(recurso, formato)
+
+
+# ------------------------- SUBIDAS DIRECTAS -------------------------
+
+# Serializador con el que se devuelve cada destino una vez adjuntado el fichero
+SERIALIZADORES_DESTINO = {'animal': AnimalSerializer, 'usuario': UsuarioSerializer, 'adopcion': AdopcionSerializer}
+
+
+# Objeto al que se adjunta la subida, comprobando que el usuario puede modificarlo
+def objeto_destino(destino, usuario, objeto_id=None):
+    if destino == 'animal':
+        if not usuario.is_staff:
+            raise PermissionDenied("Solo el personal puede cambiar la imagen de un animal.")
+        return get_object_or_404(Animal, pk=objeto_id)
+    if destino == 'usuario':
+        return usuario
+    adopcion = get_object_or_404(Adopcion, pk=objeto_id)
+    if adopcion.usuario_id != usuario.pk:
+        raise PermissionDenied("No puedes modificar esta adopción.")
+    return adopcion
+
+
+# Comprueba que el usuario puede pedir adoptar el animal (mismas reglas que AdopcionViewSet)
+def comprobar_nueva_adopcion(usuario, animal_id):
+    animal = get_object_or_404(Animal, pk=animal_id)
+    if Adopcion.objects.filter(animal=animal, usuario=usuario).exists():
+        raise PermissionDenied("Ya has solicitado adoptar este animal antes.")
+    return animal
+
+
+# Autoriza una subida directa de imagen o PDF al almacenamiento (Cloudinary o el sustituto local):
+# el worker solo firma los parámetros y el fichero nunca pasa por él
+class FirmarSubidaView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get_throttles(self):
+        # Una nueva solicitud de adopción cuenta igual que un POST a /adopciones/
+        if self.request.method == 'POST' and 'animal_id' in self.request.data:
+            return [CrearAdopcionThrottle()]
+        return super().get_throttles()
+
+    def post(self, request):
+        serializer = FirmarSubidaSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        destino = datos['destino']
+
+        if 'animal_id' in datos:
+            comprobar_nueva_adopcion(request.user, datos['animal_id'])
+            objeto_id = None
+        else:
+            objeto_id = objeto_destino(destino, request.user, datos.get('id')).pk
+
+        public_id = subida_directa.nuevo_public_id(destino, request.user)
+        token = subida_directa.crear_token(destino, request.user, public_id, objeto_id, datos.get('animal_id'))
+        return Response({
+            **subida_directa.parametros_subida(destino, public_id, token, request),
+            'token': token,
+            'expira_en': settings.SUBIDA_DIRECTA_VALIDEZ,
+        })
+
+
+# Adjunta al modelo el fichero ya subido, tras verificar la firma de la respuesta del almacenamiento
+class ConfirmarSubidaView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = ConfirmarSubidaSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        try:
+            token = subida_directa.leer_token(datos['token'])
+            if token['u'] != request.user.pk or token['p'] != datos['public_id']:
+                raise SubidaNoValida("La subida no corresponde a esta autorización.")
+            subida_directa.verificar_respuesta(datos['public_id'], datos['version'], datos['signature'])
+        except SubidaNoValida as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        destino = token['d']
+        config = DESTINOS[destino]
+        if config['resource_type'] == 'image':
+            formato = datos.get('format', '')
+            if not subida_directa.FORMATO_VALIDO.match(formato):
+                return Response({"error": "Indica el formato de la imagen subida."}, status=status.HTTP_400_BAD_REQUEST)
+            valor = CloudinaryResource(datos['public_id'], version=datos['version'], format=formato, type='upload', resource_type='image')
+        else:
+            valor = datos['public_id']
+
+        contexto = {'request': request}
+        if token['a'] is not None:
+            animal = comprobar_nueva_adopcion(request.user, token['a'])
+            adopcion = Adopcion.objects.create(animal=animal, usuario=request.user, contenido=valor)
+            return Response(AdopcionSerializer(adopcion, context=contexto).data, status=status.HTTP_201_CREATED)
+
+        objeto = objeto_destino(destino, request.user, token['o'])
+        setattr(objeto, config['campo'], valor)
+        objeto.save(update_fields=[config['campo']])
+        return Response(SERIALIZADORES_DESTINO[destino](objeto, context=contexto).data)
+
+
+# Sustituto local del almacenamiento para desarrollo (SUBIDA_DIRECTA_BACKEND = 'local'): recibe el
+# fichero por PUT en MEDIA_ROOT y responde, como Cloudinary, con public_id, version y una firma
+@csrf_exempt
+def subida_local(request, token):
+    if settings.SUBIDA_DIRECTA_BACKEND != 'local':
+        raise Http404()
+    if request.method != 'PUT':
+        return HttpResponseNotAllowed(['PUT'])
+    try:
+        datos = subida_directa.leer_token(token)
+        ruta = subida_directa.ruta_local(datos['p'])
+    except SubidaNoValida as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    temporal = ruta.with_name(ruta.name + '.tmp')
+    escritos, error = 0, None
+    with open(temporal, 'wb') as fichero:
+        while trozo := request.read(64 * 1024):
+            if escritos == 0 and DESTINOS[datos['d']]['resource_type'] == 'raw' and MAGIA_PDF not in trozo[:1024]:
+                error = ("El archivo no es un PDF válido.", 400)
+                break
+            escritos += len(trozo)
+            if escritos > settings.SUBIDA_MAX_BYTES:
+                error = ("El archivo es demasiado grande.", 413)
+                break
+            fichero.write(trozo)
+    if error:
+        temporal.unlink()
+        return JsonResponse({"error": error[0]}, status=error[1])
+    os.replace(temporal, ruta)
+
+    version = str(int(time.time()))
+    return JsonResponse({
+        'public_id': datos['p'],
+        'version': version,
+        'signature': subida_directa.firma_local(datos['p'], version),
+        'bytes': escritos,
+    })
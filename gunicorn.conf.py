@@ -0,0 +1,24 @@
+# Configuración de gunicorn (se carga automáticamente desde el directorio de trabajo)
+import os
+import shutil
+
+# Directorio compartido donde cada worker escribe sus métricas de Prometheus;
+# /metrics agrega lo que hay en él. Debe fijarse antes de que los workers importen la app.
+prometheus_multiproc_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus_multiproc')
+
+
+# Al arrancar el máster se limpian las métricas de ejecuciones anteriores
+def on_starting(server):
+    shutil.rmtree(prometheus_multiproc_dir, ignore_errors=True)
+    os.makedirs(prometheus_multiproc_dir, exist_ok=True)
+
+
+# Cuando un worker muere (o se recicla) se marcan sus ficheros para no duplicar métricas
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+# La app se importa una sola vez en el máster y los workers se crean con fork: arrancar o
+# reciclar un worker ya no repite django.setup() ni la carga del URLconf.
+preload_app = True